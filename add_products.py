@@ -5,6 +5,8 @@ Script para adicionar produtos ao banco hospital_presidente_dutra
 """
 import sqlite3
 import os
+from catalog_importer import ImportacaoErro, importar
+from database_manager import db_manager
 
 # Lista de produtos a serem adicionados
 PRODUTOS = [
@@ -73,40 +75,20 @@ def adicionar_produtos():
         return False
     
     conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    
-    # Verificar se a tabela produtos existe
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='produtos'")
-    if not cur.fetchone():
-        print("Erro: Tabela 'produtos' não existe!")
-        conn.close()
+    try:
+        # Garante as colunas/índices usados pelo importador
+        db_manager.upgrade_unit_schema(conn)
+        resultado = importar(conn, 'produtos', ['nome'], ([nome] for nome in PRODUTOS))
+    except (ImportacaoErro, sqlite3.OperationalError) as e:
+        print(f"Erro: {e}")
         return False
-    
-    # Contador de produtos adicionados
-    adicionados = 0
-    ja_existem = 0
-    
-    for produto in PRODUTOS:
-        # Verificar se produto já existe
-        cur.execute("SELECT id FROM produtos WHERE nome = ?", (produto,))
-        if cur.fetchone():
-            print(f"  - {produto} (já existe)")
-            ja_existem += 1
-        else:
-            # Inserir produto com quantidade 0
-            cur.execute("""
-                INSERT INTO produtos (nome, quantidade, ativo)
-                VALUES (?, 0, 1)
-            """, (produto,))
-            print(f"  + {produto}")
-            adicionados += 1
-    
-    conn.commit()
-    conn.close()
+    finally:
+        conn.close()
     
     print(f"\nConcluído!")
-    print(f"  Produtos adicionados: {adicionados}")
-    print(f"  Produtos já existentes: {ja_existem}")
+    print(f"  Produtos adicionados: {resultado['inseridos']}")
+    print(f"  Produtos atualizados: {resultado['atualizados']}")
+    print(f"  Produtos já existentes: {resultado['ignorados']}")
     print(f"  Total: {len(PRODUTOS)}")
     
     return True
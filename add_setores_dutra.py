@@ -5,6 +5,8 @@ Script para adicionar setores ao banco hospital_presidente_dutra
 """
 import sqlite3
 import os
+from catalog_importer import ImportacaoErro, importar
+from database_manager import db_manager
 
 # Lista de setores a serem adicionados
 SETORES = [
@@ -58,40 +60,20 @@ def adicionar_setores():
         return False
     
     conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    
-    # Verificar se a tabela setores existe
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='setores'")
-    if not cur.fetchone():
-        print("Erro: Tabela 'setores' não existe!")
-        conn.close()
+    try:
+        # Garante as colunas/índices usados pelo importador
+        db_manager.upgrade_unit_schema(conn)
+        resultado = importar(conn, 'setores', ['nome'], ([nome] for nome in SETORES))
+    except (ImportacaoErro, sqlite3.OperationalError) as e:
+        print(f"Erro: {e}")
         return False
-    
-    # Contador de setores adicionados
-    adicionados = 0
-    ja_existem = 0
-    
-    for setor in SETORES:
-        # Verificar se setor já existe
-        cur.execute("SELECT id FROM setores WHERE nome = ?", (setor,))
-        if cur.fetchone():
-            print(f"  - {setor} (já existe)")
-            ja_existem += 1
-        else:
-            # Inserir setor
-            cur.execute("""
-                INSERT INTO setores (nome, ativo)
-                VALUES (?, 1)
-            """, (setor,))
-            print(f"  + {setor}")
-            adicionados += 1
-    
-    conn.commit()
-    conn.close()
+    finally:
+        conn.close()
     
     print(f"\nConcluído!")
-    print(f"  Setores adicionados: {adicionados}")
-    print(f"  Setores já existentes: {ja_existem}")
+    print(f"  Setores adicionados: {resultado['inseridos']}")
+    print(f"  Setores atualizados: {resultado['atualizados']}")
+    print(f"  Setores já existentes: {resultado['ignorados']}")
     print(f"  Total: {len(SETORES)}")
     
     return True
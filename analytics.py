@@ -0,0 +1,364 @@
+# Base Analítica Consolidada (todas as unidades)
+# Esquema estrela em instance/analytics.db: fato_movimentacao com as
+# dimensões unidade, produto, setor e data. A carga é incremental: de cada
+# unidade são lidas apenas as movimentações com id acima da marca d'água
+# (etl_controle) e as exclusões registradas em movimentacoes_excluidas; os
+# produtos só são relidos quando o contador do cadastro (produtos_cadastro:
+# nome, categoria, SKU, inclusões e exclusões) muda, não a cada saldo alterado.
+# A leitura das unidades roda em paralelo; a gravação na base analítica é
+# feita por unidade, numa transação que também avança a marca d'água.
+# Os relatórios da rede consultam somente esta base.
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+
+from database_manager import CADASTRO_PRODUTOS, db_manager, get_versao_dados, normalizar_busca
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+ANALYTICS_DB = os.path.join(BASE_DIR, 'instance', 'analytics.db')
+
+# Unidades lidas ao mesmo tempo
+ETL_PARALELISMO = 4
+
+SETOR_NAO_INFORMADO = 'Não informado'
+DIAS_SEMANA = ('Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo')
+
+_lock_carga = threading.Lock()
+
+
+def conectar():
+    """Conexão com a base analítica (tabelas criadas se necessário)."""
+    os.makedirs(os.path.dirname(ANALYTICS_DB), exist_ok=True)
+    conn = sqlite3.connect(ANALYTICS_DB, timeout=30.0, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS dim_unidade (
+            unidade_key INTEGER PRIMARY KEY,
+            unidade_id TEXT UNIQUE NOT NULL,
+            nome TEXT
+        );
+        CREATE TABLE IF NOT EXISTS dim_produto (
+            produto_key INTEGER PRIMARY KEY,
+            unidade_id TEXT NOT NULL,
+            produto_id INTEGER NOT NULL,
+            item TEXT NOT NULL, -- SKU global do catálogo ou nome normalizado
+            nome TEXT,
+            categoria TEXT,
+            UNIQUE (unidade_id, produto_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_dim_produto_item ON dim_produto(item);
+        CREATE TABLE IF NOT EXISTS dim_setor (
+            setor_key INTEGER PRIMARY KEY,
+            chave TEXT UNIQUE NOT NULL, -- nome normalizado
+            nome TEXT
+        );
+        CREATE TABLE IF NOT EXISTS dim_data (
+            data_key INTEGER PRIMARY KEY, -- AAAAMMDD
+            data TEXT NOT NULL,
+            ano INTEGER,
+            mes INTEGER,
+            dia INTEGER,
+            ano_mes TEXT,
+            semana TEXT, -- segunda-feira da semana
+            dia_semana TEXT
+        );
+        CREATE TABLE IF NOT EXISTS fato_movimentacao (
+            unidade_key INTEGER NOT NULL,
+            movimentacao_id INTEGER NOT NULL,
+            produto_key INTEGER,
+            setor_key INTEGER,
+            data_key INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (unidade_key, movimentacao_id)
+        ) WITHOUT ROWID;
+        -- Índice de cobertura das consultas por período (a chave primária
+        -- unidade_key/movimentacao_id já faz parte de todo índice)
+        CREATE INDEX IF NOT EXISTS idx_fato_tipo_data
+            ON fato_movimentacao(tipo, data_key, produto_key, setor_key, quantidade);
+        CREATE INDEX IF NOT EXISTS idx_fato_produto_data ON fato_movimentacao(produto_key, data_key);
+        CREATE TABLE IF NOT EXISTS etl_controle (
+            unidade_id TEXT PRIMARY KEY,
+            ultima_movimentacao INTEGER NOT NULL DEFAULT 0,
+            ultima_exclusao INTEGER NOT NULL DEFAULT 0,
+            versao_produtos INTEGER NOT NULL DEFAULT -1,
+            linhas_carregadas INTEGER NOT NULL DEFAULT 0,
+            data_carga DATETIME
+        );
+    ''')
+    return conn
+
+
+def _unidades_ativas():
+    central = db_manager.get_connection(None, use_cache=False)
+    try:
+        return [(row['id'], row['nome']) for row in
+                central.execute('SELECT id, nome FROM unidades WHERE ativa = 1 ORDER BY id')]
+    finally:
+        central.close()
+
+
+def _extrair(unit_id, controle):
+    """Lê da unidade o que mudou desde a última carga (roda em thread própria)."""
+    conn = db_manager.get_connection(unit_id, use_cache=False)
+    try:
+        versao_produtos = get_versao_dados(conn, (CADASTRO_PRODUTOS,))[CADASTRO_PRODUTOS]
+        produtos = None
+        if versao_produtos != controle['versao_produtos']:
+            produtos = conn.execute('''
+                SELECT id, nome, nome_busca, categoria, sku_global FROM produtos
+            ''').fetchall()
+
+        movimentacoes = conn.execute('''
+            SELECT id, produto_id, tipo, quantidade, date(data_movimentacao) AS data, destino
+            FROM movimentacoes
+            WHERE id > ?
+            ORDER BY id
+        ''', (controle['ultima_movimentacao'],)).fetchall()
+        exclusoes = conn.execute('''
+            SELECT id, movimentacao_id FROM movimentacoes_excluidas WHERE id > ? ORDER BY id
+        ''', (controle['ultima_exclusao'],)).fetchall()
+    finally:
+        conn.close()
+    return {
+        'versao_produtos': versao_produtos,
+        'produtos': produtos,
+        'movimentacoes': movimentacoes,
+        'exclusoes': exclusoes,
+    }
+
+
+def _linha_data(texto):
+    dia = date.fromisoformat(texto)
+    semana = dia - timedelta(days=dia.weekday())
+    return (int(dia.strftime('%Y%m%d')), texto, dia.year, dia.month, dia.day,
+            dia.strftime('%Y-%m'), semana.isoformat(), DIAS_SEMANA[dia.weekday()])
+
+
+def _carregar(analytics, unit_id, nome, extraido):
+    """Grava na base analítica o que foi extraído da unidade (uma transação)."""
+    movimentacoes = extraido['movimentacoes']
+    try:
+        analytics.execute('BEGIN IMMEDIATE')
+        analytics.execute('''
+            INSERT INTO dim_unidade (unidade_id, nome) VALUES (?, ?)
+            ON CONFLICT(unidade_id) DO UPDATE SET nome = excluded.nome
+        ''', (unit_id, nome))
+        unidade_key = analytics.execute('SELECT unidade_key FROM dim_unidade WHERE unidade_id = ?',
+                                        (unit_id,)).fetchone()[0]
+
+        if extraido['produtos'] is not None:
+            analytics.executemany('''
+                INSERT INTO dim_produto (unidade_id, produto_id, item, nome, categoria) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(unidade_id, produto_id) DO UPDATE
+                SET item = excluded.item, nome = excluded.nome, categoria = excluded.categoria
+            ''', [(unit_id, p['id'], p['sku_global'] or 'nome:' + (p['nome_busca'] or normalizar_busca(p['nome'])),
+                   p['nome'], p['categoria']) for p in extraido['produtos']])
+
+        fatos = []
+        if movimentacoes:
+            produtos = dict(analytics.execute('SELECT produto_id, produto_key FROM dim_produto WHERE unidade_id = ?',
+                                              (unit_id,)).fetchall())
+
+            setores = {}
+            for m in movimentacoes:
+                if m['tipo'] == 'saida':
+                    nome_setor = (m['destino'] or '').strip() or SETOR_NAO_INFORMADO
+                    setores.setdefault(normalizar_busca(nome_setor), nome_setor)
+            analytics.executemany('INSERT OR IGNORE INTO dim_setor (chave, nome) VALUES (?, ?)', setores.items())
+            chaves_setor = dict(analytics.execute('SELECT chave, setor_key FROM dim_setor').fetchall())
+
+            datas = {m['data'] for m in movimentacoes if m['data']}
+            analytics.executemany('INSERT OR IGNORE INTO dim_data VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                  [_linha_data(d) for d in datas])
+
+            for m in movimentacoes:
+                if not m['data']:
+                    continue
+                setor_key = None
+                if m['tipo'] == 'saida':
+                    setor_key = chaves_setor[normalizar_busca((m['destino'] or '').strip() or SETOR_NAO_INFORMADO)]
+                fatos.append((unidade_key, m['id'], produtos.get(m['produto_id']), setor_key,
+                              int(m['data'].replace('-', '')), m['tipo'], m['quantidade']))
+            analytics.executemany('INSERT OR REPLACE INTO fato_movimentacao VALUES (?, ?, ?, ?, ?, ?, ?)', fatos)
+
+        if extraido['exclusoes']:
+            analytics.executemany('DELETE FROM fato_movimentacao WHERE unidade_key = ? AND movimentacao_id = ?',
+                                  [(unidade_key, e['movimentacao_id']) for e in extraido['exclusoes']])
+
+        analytics.execute('''
+            INSERT INTO etl_controle (unidade_id, ultima_movimentacao, ultima_exclusao, versao_produtos,
+                                      linhas_carregadas, data_carga)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(unidade_id) DO UPDATE SET
+                ultima_movimentacao = MAX(ultima_movimentacao, excluded.ultima_movimentacao),
+                ultima_exclusao = MAX(ultima_exclusao, excluded.ultima_exclusao),
+                versao_produtos = excluded.versao_produtos,
+                linhas_carregadas = linhas_carregadas + excluded.linhas_carregadas,
+                data_carga = excluded.data_carga
+        ''', (unit_id,
+              movimentacoes[-1]['id'] if movimentacoes else 0,
+              extraido['exclusoes'][-1]['id'] if extraido['exclusoes'] else 0,
+              extraido['versao_produtos'], len(fatos)))
+        analytics.commit()
+    except Exception:
+        analytics.rollback()
+        raise
+    return {'movimentacoes': len(fatos), 'exclusoes': len(extraido['exclusoes']),
+            'produtos': len(extraido['produtos']) if extraido['produtos'] is not None else 0}
+
+
+def atualizar(unidades=None, progresso=None):
+    """Carga incremental de todas as unidades ativas (ou das informadas).
+
+    `progresso(percentual, mensagem)` é chamado a cada unidade concluída.
+    Retorna {unit_id: resultado}; falhas em uma unidade não interrompem as
+    demais e aparecem como {'erro': mensagem}.
+    """
+    with _lock_carga:
+        analytics = conectar()
+        try:
+            nomes = dict(_unidades_ativas())
+            if unidades is not None:
+                nomes = {u: nomes.get(u, u) for u in unidades}
+            controles = {row['unidade_id']: dict(row) for row in analytics.execute('SELECT * FROM etl_controle')}
+            padrao = {'ultima_movimentacao': 0, 'ultima_exclusao': 0, 'versao_produtos': -1}
+
+            resultados = {}
+            if not nomes:
+                return resultados
+            with ThreadPoolExecutor(max_workers=min(ETL_PARALELISMO, len(nomes)),
+                                    thread_name_prefix='analytics') as pool:
+                futuros = {pool.submit(_extrair, unit_id, controles.get(unit_id, padrao)): unit_id
+                           for unit_id in nomes}
+                for posicao, futuro in enumerate(as_completed(futuros), start=1):
+                    unit_id = futuros[futuro]
+                    inicio = time.perf_counter()
+                    try:
+                        resultados[unit_id] = _carregar(analytics, unit_id, nomes[unit_id], futuro.result())
+                        resultados[unit_id]['segundos'] = round(time.perf_counter() - inicio, 3)
+                    except Exception as e:
+                        resultados[unit_id] = {'erro': str(e)}
+                    if progresso:
+                        progresso(posicao * 100 / len(futuros), f'{posicao} de {len(futuros)} unidades')
+            return resultados
+        finally:
+            analytics.close()
+
+
+# ========================
+# CONSULTAS DA REDE
+# ========================
+
+_FILTRO = 'f.data_key BETWEEN :inicio AND :fim'
+
+CONSULTAS = {
+    'consumo_item': {
+        'titulo': 'Consumo por item na rede',
+        'colunas': [('nome', 'Item'), ('total', 'Saídas'), ('unidades', 'Unidades'),
+                    ('movimentacoes', 'Movimentações'), ('percentual', '% do total')],
+        'sql': f'''
+            SELECT MAX(p.nome) AS nome, SUM(f.quantidade) AS total, COUNT(DISTINCT f.unidade_key) AS unidades,
+                   COUNT(*) AS movimentacoes, ROUND(SUM(f.quantidade) * 100.0 / SUM(SUM(f.quantidade)) OVER (), 2) AS percentual
+            FROM fato_movimentacao f
+            JOIN dim_produto p ON p.produto_key = f.produto_key
+            WHERE f.tipo = 'saida' AND {_FILTRO}
+            GROUP BY p.item
+            ORDER BY total DESC
+            LIMIT :limite
+        ''',
+    },
+    'consumo_unidade': {
+        'titulo': 'Movimentação por unidade',
+        'colunas': [('nome', 'Unidade'), ('entradas', 'Entradas'), ('saidas', 'Saídas'),
+                    ('produtos', 'Produtos movimentados'), ('movimentacoes', 'Movimentações')],
+        'sql': f'''
+            SELECT u.nome,
+                   SUM(CASE WHEN f.tipo = 'entrada' THEN f.quantidade ELSE 0 END) AS entradas,
+                   SUM(CASE WHEN f.tipo = 'saida' THEN f.quantidade ELSE 0 END) AS saidas,
+                   COUNT(DISTINCT f.produto_key) AS produtos, COUNT(*) AS movimentacoes
+            FROM fato_movimentacao f
+            JOIN dim_unidade u ON u.unidade_key = f.unidade_key
+            WHERE {_FILTRO}
+            GROUP BY u.unidade_key
+            ORDER BY saidas DESC
+            LIMIT :limite
+        ''',
+    },
+    'consumo_mensal': {
+        'titulo': 'Consumo mensal da rede',
+        'colunas': [('ano_mes', 'Mês'), ('total', 'Saídas'), ('unidades', 'Unidades'), ('itens', 'Itens')],
+        'sql': f'''
+            SELECT d.ano_mes, SUM(f.quantidade) AS total, COUNT(DISTINCT f.unidade_key) AS unidades,
+                   COUNT(DISTINCT p.item) AS itens
+            FROM fato_movimentacao f
+            JOIN dim_data d ON d.data_key = f.data_key
+            LEFT JOIN dim_produto p ON p.produto_key = f.produto_key
+            WHERE f.tipo = 'saida' AND {_FILTRO}
+            GROUP BY d.ano_mes
+            ORDER BY d.ano_mes
+            LIMIT :limite
+        ''',
+    },
+    'consumo_setor': {
+        'titulo': 'Consumo por setor na rede',
+        'colunas': [('nome', 'Setor'), ('total', 'Saídas'), ('unidades', 'Unidades'), ('movimentacoes', 'Movimentações')],
+        'sql': f'''
+            SELECT s.nome, SUM(f.quantidade) AS total, COUNT(DISTINCT f.unidade_key) AS unidades,
+                   COUNT(*) AS movimentacoes
+            FROM fato_movimentacao f
+            JOIN dim_setor s ON s.setor_key = f.setor_key
+            WHERE f.tipo = 'saida' AND {_FILTRO}
+            GROUP BY s.setor_key
+            ORDER BY total DESC
+            LIMIT :limite
+        ''',
+    },
+}
+
+
+def consultar(conn, consulta, parametros):
+    """Executa uma consulta da rede. Retorna dict com titulo, colunas, linhas e parametros."""
+    if consulta not in CONSULTAS:
+        raise ValueError(f'Consulta inválida: {consulta}')
+    hoje = datetime.now(timezone.utc).date()
+    try:
+        fim = date.fromisoformat(parametros.get('data_fim') or hoje.isoformat())
+        inicio = date.fromisoformat(parametros.get('data_inicio') or (fim - timedelta(days=29)).isoformat())
+    except ValueError:
+        raise ValueError('Datas inválidas: use o formato AAAA-MM-DD.')
+    if inicio > fim:
+        inicio, fim = fim, inicio
+    try:
+        limite = max(1, min(int(parametros.get('limite') or 50), 1000))
+    except (TypeError, ValueError):
+        limite = 50
+
+    definicao = CONSULTAS[consulta]
+    linhas = conn.execute(definicao['sql'], {
+        'inicio': int(inicio.strftime('%Y%m%d')),
+        'fim': int(fim.strftime('%Y%m%d')),
+        'limite': limite,
+    }).fetchall()
+    return {
+        'consulta': consulta,
+        'titulo': definicao['titulo'],
+        'colunas': definicao['colunas'],
+        'linhas': [tuple(row) for row in linhas],
+        'parametros': {'inicio': inicio.isoformat(), 'fim': fim.isoformat(), 'limite': limite},
+    }
+
+
+def situacao_carga(conn):
+    """Última carga de cada unidade (para exibir a atualidade dos dados)."""
+    return conn.execute('''
+        SELECT c.unidade_id, u.nome, c.ultima_movimentacao, c.linhas_carregadas, c.data_carga
+        FROM etl_controle c
+        LEFT JOIN dim_unidade u ON u.unidade_id = c.unidade_id
+        ORDER BY c.unidade_id
+    ''').fetchall()
@@ -13,7 +13,10 @@ load_dotenv()
 
 from database_manager import db_manager
 from models import db, Usuario, Unidade
-from extensions import csrf, limiter
+from extensions import csrf, limiter, RATELIMIT_STORAGE_PADRAO
+from server_sessions import ArmazenamentoSessoes
+from backup_scheduler import agendador_backups
+from replication import replicador
 
 # ========================
 # CONFIGURAÇÃO DO APP
@@ -54,15 +57,54 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'         # Mitiga CSRF de terceiros
 app.config['SESSION_COOKIE_SECURE'] = os.getenv('SESSION_COOKIE_SECURE', 'False') == 'True'
 app.config['PERMANENT_SESSION_LIFETIME'] = int(os.getenv('PERMANENT_SESSION_LIFETIME', 3600))
 
+# ── Sessões no servidor (opcional) ─────────────────────────────────────────────
+# 'cookie' (padrão): sessão assinada no próprio cookie
+# 'sqlite': cookie só com o id; dados em instance/sessions.db (server_sessions.py)
+app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'cookie')
+if app.config['SESSION_BACKEND'] == 'sqlite':
+    app.session_interface = ArmazenamentoSessoes()
+
 # ── WTF / CSRF ─────────────────────────────────────────────────────────────────
 app.config['WTF_CSRF_ENABLED'] = True
 app.config['WTF_CSRF_TIME_LIMIT'] = 3600
 
+# ── Rate limit ─────────────────────────────────────────────────────────────────
+# Contadores compartilhados entre os workers (limiter_storage.py)
+app.config['RATELIMIT_STORAGE_URI'] = os.getenv('RATELIMIT_STORAGE_URI', RATELIMIT_STORAGE_PADRAO)
+
+# ── Backup agendado ────────────────────────────────────────────────────────────
+# Backup incremental de todos os bancos (backup_scheduler.py); 0 desativa
+app.config['BACKUP_INTERVALO_HORAS'] = float(os.getenv('BACKUP_INTERVALO_HORAS', 24))
+app.config['BACKUP_HORARIO_PICO'] = os.getenv('BACKUP_HORARIO_PICO', '07:00-19:00')
+app.config['BACKUP_PARALELISMO'] = int(os.getenv('BACKUP_PARALELISMO', 2))
+app.config['BACKUP_RETENCAO_DIARIOS'] = int(os.getenv('BACKUP_RETENCAO_DIARIOS', 7))
+app.config['BACKUP_RETENCAO_SEMANAIS'] = int(os.getenv('BACKUP_RETENCAO_SEMANAIS', 4))
+agendador_backups.configurar(app.config)
+agendador_backups.iniciar()
+
+# ── Replicação standby (opcional) ──────────────────────────────────────────────
+# Cópia incremental dos bancos em outro disco/montagem (replication.py)
+app.config['REPLICA_DIR'] = os.getenv('REPLICA_DIR', '')
+app.config['REPLICACAO_INTERVALO'] = int(os.getenv('REPLICACAO_INTERVALO', 30))
+replicador.configurar(app.config['REPLICA_DIR'], app.config['REPLICACAO_INTERVALO'])
+replicador.iniciar()
+
 # Inicializar extensões
 db.init_app(app)
 csrf.init_app(app)
 limiter.init_app(app)
 
+# ── Schema do banco central ────────────────────────────────────────────────────
+# Colunas e triggers novos em bancos existentes, antes da primeira consulta do ORM
+def atualizar_schema_central():
+    conn = db_manager.get_connection(None, use_cache=False)
+    try:
+        db_manager.upgrade_central_schema(conn)
+    finally:
+        conn.close()
+
+atualizar_schema_central()
+
 # ── Template Filters ───────────────────────────────────────────────────────────
 @app.template_filter('nl2br')
 def nl2br_filter(s):
@@ -118,6 +160,9 @@ from routes.settings import settings_bp
 from routes.suggestions import suggestions_bp
 from routes.system import system_bp
 from routes.reports import reports_bp
+from routes.api import api_bp
+from routes.catalog import catalog_bp
+from routes.helpers import obter_permissoes, SEM_PERMISSAO
 
 # Registrar blueprints (url_prefix definido em cada blueprint)
 app.register_blueprint(auth_bp)
@@ -132,6 +177,8 @@ app.register_blueprint(settings_bp)
 app.register_blueprint(suggestions_bp)
 app.register_blueprint(system_bp)
 app.register_blueprint(reports_bp)
+app.register_blueprint(api_bp)
+app.register_blueprint(catalog_bp)
 
 
 # ========================
@@ -181,7 +228,9 @@ ROUTE_MAPPING = {
     'read_notification': 'system.read_notification',
     'mark_all_notifications_as_read': 'system.mark_all_notifications_as_read',
     'perfil': 'users.perfil',
-    'relatorio_geral': 'reports.relatorio_geral'
+    'relatorio_geral': 'reports.relatorio_geral',
+    'relatorio_periodo': 'reports.relatorio_periodo',
+    'relatorio_rede': 'reports.relatorio_rede'
 }
 
 from flask import url_for as original_url_for
@@ -191,7 +240,6 @@ def override_url_for():
     """Override url_for to add blueprint prefix automatically"""
     from functools import wraps
     from database_config import get_all_units
-    from models import Notificacao
     
     @wraps(original_url_for)
     def new_url_for(endpoint=None, **values):
@@ -200,23 +248,28 @@ def override_url_for():
             endpoint = ROUTE_MAPPING[endpoint]
         return original_url_for(endpoint, **values)
     
-    # Inject notifications
-    unread_count = 0
-    notifications = []
-    if 'user_id' in session:
-        user_id = session['user_id']
+    # Badge de notificações: contador desnormalizado no usuário (uma leitura
+    # por chave primária, reaproveitada em todos os render_template da
+    # requisição). A lista do menu é carregada sob demanda pelo JavaScript.
+    if 'user_id' in session and 'notificacoes_nao_lidas' not in g:
         try:
-            unread_count = Notificacao.query.filter_by(usuario_id=user_id, lida=False).count()
-            notifications = Notificacao.query.filter_by(usuario_id=user_id).order_by(Notificacao.data_criacao.desc()).limit(5).all()
+            g.notificacoes_nao_lidas = db.session.query(Usuario.notificacoes_nao_lidas).filter_by(
+                id=session['user_id']).scalar() or 0
         except Exception:
             # A tabela pode não existir na primeira execução
-            pass
+            g.notificacoes_nao_lidas = 0
+
+    # Permissões compiladas (menus e cadastro), em cache por versão do usuário
+    try:
+        permissoes = obter_permissoes()
+    except Exception:
+        permissoes = SEM_PERMISSAO
 
     return dict(
         url_for=new_url_for, 
         get_all_units=get_all_units,
-        unread_notifications=unread_count,
-        notifications=notifications
+        unread_notifications=g.get('notificacoes_nao_lidas', 0),
+        permissoes=permissoes
     )
 
 
@@ -232,6 +285,7 @@ if __name__ == '__main__':
         # Ex: flask db upgrade (com Flask-Migrate) ou python scripts/migrate.py
         with app.app_context():
             db.create_all()
+            atualizar_schema_central()
             
             # Migração automática para adicionar coluna ultimo_login se não existir
             try:
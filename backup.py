@@ -0,0 +1,144 @@
+# Backup Consistente dos Bancos SQLite
+# Cada banco da pasta instance é copiado com a API de backup do SQLite
+# (sqlite3.Connection.backup), que lê um instantâneo consistente incluindo o
+# conteúdo ainda no -wal. Bancos em WAL são copiados em uma transação de
+# leitura só (não bloqueia os escritores); os demais, em passos de
+# PAGINAS_POR_PASSO páginas com uma pausa entre eles.
+# O ZIP é gerado em blocos (gerar_zip) e pode ir direto para a resposta HTTP,
+# sem arquivo ZIP temporário: a memória usada fica limitada ao tamanho do
+# bloco. Só o instantâneo de cada banco passa por um arquivo temporário,
+# apagado assim que é compactado.
+import os
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from collections import deque
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+INSTANCE_DIR = os.path.join(BASE_DIR, 'instance')
+
+# Páginas copiadas por passo da API de backup (bancos fora do WAL) e pausa (s) entre passos
+PAGINAS_POR_PASSO = 256
+PAUSA_ENTRE_PASSOS = 0.005
+# Recomeços tolerados na cópia em passos (cada escrita de outra conexão recomeça do início)
+MAX_RECOMECOS = 20
+# Tamanho dos blocos lidos/enviados
+TAMANHO_BLOCO = 256 * 1024
+
+# Pastas da instance que não entram no backup (cópias antigas, resultados de tarefas e o
+# banco modelo das unidades, reconstruído sozinho)
+PASTAS_IGNORADAS = {'backups', 'tarefas', 'modelos'}
+# Bancos auxiliares recriados sozinhos (fila de tarefas, sessões, rate limit)
+BANCOS_IGNORADOS = {'tarefas.db', 'sessions.db', 'ratelimit.db'}
+SUFIXOS_SQLITE = ('-wal', '-shm', '-journal')
+
+
+def copiar_banco(origem, destino, progresso=None):
+    """Copia um banco SQLite em uso para `destino` com a API de backup.
+
+    `progresso(copiadas, total)` é chamado a cada passo. Em bancos fora do
+    WAL, levanta sqlite3.OperationalError se a cópia recomeçar mais de
+    MAX_RECOMECOS vezes por escritas concorrentes.
+    """
+    fonte = sqlite3.connect(origem, timeout=30.0)
+    try:
+        alvo = sqlite3.connect(destino)
+        try:
+            estado = {'copiadas': 0, 'recomecos': 0}
+
+            def a_cada_passo(status, restantes, total):
+                copiadas = total - restantes
+                if copiadas < estado['copiadas']:
+                    estado['recomecos'] += 1
+                    if estado['recomecos'] > MAX_RECOMECOS:
+                        raise sqlite3.OperationalError(
+                            f'Cópia de {os.path.basename(origem)} recomeçou {MAX_RECOMECOS} vezes '
+                            'por escritas concorrentes')
+                estado['copiadas'] = copiadas
+                if progresso:
+                    progresso(copiadas, total)
+            # Em WAL a leitura não bloqueia os escritores: copiar tudo em uma
+            # única transação de leitura evita que cada commit de outra
+            # conexão reinicie a cópia (com escrita contínua ela não
+            # terminaria). Em modo rollback, passos curtos liberam o banco.
+            wal = fonte.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+            fonte.backup(alvo, pages=-1 if wal else PAGINAS_POR_PASSO, progress=a_cada_passo,
+                         sleep=PAUSA_ENTRE_PASSOS)
+            # O instantâneo sai como arquivo único, sem depender de -wal
+            alvo.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            alvo.close()
+    finally:
+        fonte.close()
+
+
+def arquivos_do_backup(instance_dir=INSTANCE_DIR):
+    """Lista (caminho, nome no zip, é_banco) do conteúdo da instance."""
+    arquivos = []
+    for raiz, dirs, nomes in os.walk(instance_dir):
+        if raiz == instance_dir:
+            dirs[:] = [d for d in dirs if d not in PASTAS_IGNORADAS]
+        for nome in sorted(nomes):
+            if nome.endswith(SUFIXOS_SQLITE) or (raiz == instance_dir and nome in BANCOS_IGNORADOS):
+                continue
+            caminho = os.path.join(raiz, nome)
+            arquivos.append((caminho, os.path.relpath(caminho, instance_dir), nome.endswith('.db')))
+    return arquivos
+
+
+class _SaidaEmBlocos:
+    """Destino não posicionável do ZipFile: acumula o que foi escrito até
+    ser recolhido pelo gerador."""
+
+    def __init__(self):
+        self._blocos = deque()
+
+    def write(self, dados):
+        self._blocos.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def recolher(self):
+        while self._blocos:
+            yield self._blocos.popleft()
+
+
+def gerar_zip(arquivos=None, progresso=None):
+    """Gera o ZIP do backup em blocos de bytes (para Response ou arquivo).
+
+    `progresso(posicao, total, nome)` é chamado após cada arquivo.
+    """
+    if arquivos is None:
+        arquivos = arquivos_do_backup()
+    saida = _SaidaEmBlocos()
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for posicao, (caminho, nome, banco) in enumerate(arquivos, start=1):
+            instantaneo = None
+            try:
+                if banco:
+                    fd, instantaneo = tempfile.mkstemp(suffix='.db', prefix='backup_')
+                    os.close(fd)
+                    copiar_banco(caminho, instantaneo)
+                with open(instantaneo or caminho, 'rb') as fonte, \
+                        zipf.open(nome, 'w', force_zip64=True) as destino:
+                    while True:
+                        bloco = fonte.read(TAMANHO_BLOCO)
+                        if not bloco:
+                            break
+                        destino.write(bloco)
+                        yield from saida.recolher()
+            finally:
+                if instantaneo:
+                    os.remove(instantaneo)
+            yield from saida.recolher()
+            if progresso:
+                progresso(posicao, len(arquivos), nome)
+    yield from saida.recolher()
+
+
+def remover_temp_backups_legado(base_dir=BASE_DIR):
+    """Apaga a pasta temp_backups/ deixada pelo backup antigo (ZIPs nunca removidos)."""
+    shutil.rmtree(os.path.join(base_dir, 'temp_backups'), ignore_errors=True)
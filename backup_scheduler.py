@@ -0,0 +1,271 @@
+# Backup Agendado
+# Uma thread por processo verifica a cada minuto se o backup incremental
+# (backup_store.py) do banco central e de todas as unidades está vencido.
+# Com vários workers, só quem obtiver o lease da tabela `agendamentos`
+# (instance/tarefas.db) dispara a rodada; o lease é renovado a cada banco
+# concluído e expira sozinho se o processo morrer, deixando outro assumir.
+#
+# A rodada vira uma tarefa 'backup_incremental' (histórico e duração na
+# tabela `tarefas`) e roda em um pool limitado: no horário de pico nenhuma
+# rodada começa, e a que estiver em andamento passa a copiar um banco por
+# vez, com intervalo maior entre os inícios, para não disputar o disco com
+# o uso do sistema. Ao final aplica a retenção (N diários e M semanais).
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from jobs import TAREFAS_DB
+
+logger = logging.getLogger(__name__)
+
+NOME_AGENDAMENTO = 'backup_incremental'
+# Intervalo (s) entre verificações do agendamento e espera inicial
+INTERVALO_VERIFICACAO = 60
+# Validade (s) do lease; renovado a cada banco salvo
+DURACAO_LEASE = 600
+
+
+def ler_horario_pico(valor):
+    """'07:00-19:00' -> (time, time); vazio -> None. Pode virar a meia-noite."""
+    if not valor or not valor.strip():
+        return None
+    inicio, fim = (datetime.strptime(parte.strip(), '%H:%M').time() for parte in valor.split('-', 1))
+    return inicio, fim
+
+
+class Lease:
+    """Execução única entre processos: quem grava seu `dono` na linha `nome`
+    da tabela agendamentos (instance/tarefas.db) antes de `lease_expira`
+    vencer é o único que executa."""
+
+    def __init__(self, nome, duracao=DURACAO_LEASE):
+        self.nome = nome
+        self.duracao = duracao
+        self.dono = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+    def _conectar(self):
+        os.makedirs(os.path.dirname(TAREFAS_DB), exist_ok=True)
+        conn = sqlite3.connect(TAREFAS_DB, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS agendamentos (
+                nome TEXT PRIMARY KEY,
+                dono TEXT,
+                lease_expira REAL,
+                ultima_execucao REAL,
+                tarefa_id TEXT
+            )
+        ''')
+        conn.execute('INSERT OR IGNORE INTO agendamentos (nome) VALUES (?)', (self.nome,))
+        return conn
+
+    def estado(self):
+        conn = self._conectar()
+        try:
+            estado = dict(conn.execute('SELECT * FROM agendamentos WHERE nome = ?', (self.nome,)).fetchone())
+        finally:
+            conn.close()
+        estado['em_andamento'] = bool(estado['lease_expira'] and estado['lease_expira'] > time.time())
+        return estado
+
+    def adquirir(self, vencido_desde=None):
+        """Toma o lease se estiver livre (e, com `vencido_desde`, se a última
+        execução for anterior). Retorna True se conseguiu."""
+        agora = time.time()
+        conn = self._conectar()
+        try:
+            cursor = conn.execute('''
+                UPDATE agendamentos SET dono = ?1, lease_expira = ?2
+                WHERE nome = ?3 AND (lease_expira IS NULL OR lease_expira < ?4)
+                  AND (?5 IS NULL OR ultima_execucao IS NULL OR ultima_execucao <= ?5)
+            ''', (self.dono, agora + self.duracao, self.nome, agora, vencido_desde))
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def renovar(self):
+        """Estende o lease. Retorna False se ele foi perdido para outro processo."""
+        conn = self._conectar()
+        try:
+            return conn.execute('UPDATE agendamentos SET lease_expira = ? WHERE nome = ? AND dono = ?',
+                                (time.time() + self.duracao, self.nome, self.dono)).rowcount == 1
+        finally:
+            conn.close()
+
+    def liberar(self, ultima_execucao=None):
+        """Solta o lease, registrando a última execução quando informada."""
+        conn = self._conectar()
+        try:
+            conn.execute('''
+                UPDATE agendamentos SET lease_expira = NULL, ultima_execucao = COALESCE(?, ultima_execucao)
+                WHERE nome = ? AND dono = ?
+            ''', (ultima_execucao, self.nome, self.dono))
+        finally:
+            conn.close()
+
+    def registrar_tarefa(self, tarefa_id):
+        conn = self._conectar()
+        try:
+            conn.execute('UPDATE agendamentos SET tarefa_id = ? WHERE nome = ?', (tarefa_id, self.nome))
+        finally:
+            conn.close()
+
+
+class AgendadorBackups:
+    """Dispara o backup incremental na cadência configurada (um processo por vez)"""
+
+    def __init__(self):
+        self.intervalo_horas = 24
+        self.horario_pico = None
+        self.paralelismo = 2
+        self.espacamento = 5
+        self.espacamento_pico = 60
+        self.retencao = {'diarios': 7, 'semanais': 4}
+        self.lease = Lease(NOME_AGENDAMENTO)
+        self._thread = None
+        self._parar = threading.Event()
+
+    def configurar(self, config):
+        """Lê as chaves BACKUP_* do app.config."""
+        self.intervalo_horas = float(config.get('BACKUP_INTERVALO_HORAS', self.intervalo_horas))
+        self.horario_pico = ler_horario_pico(config.get('BACKUP_HORARIO_PICO'))
+        self.paralelismo = max(1, int(config.get('BACKUP_PARALELISMO', self.paralelismo)))
+        self.retencao = {
+            'diarios': int(config.get('BACKUP_RETENCAO_DIARIOS', self.retencao['diarios'])),
+            'semanais': int(config.get('BACKUP_RETENCAO_SEMANAIS', self.retencao['semanais'])),
+        }
+
+    # ── Lease (tarefas.db) ─────────────────────────────────────────────────
+    def estado(self):
+        estado = self.lease.estado()
+        estado['proxima_execucao'] = (estado['ultima_execucao'] or time.time()) + self.intervalo_horas * 3600 \
+            if self.intervalo_horas > 0 else None
+        return estado
+
+    def liberar_lease(self, inicio):
+        """Fim da rodada: registra o início como última execução e solta o lease."""
+        self.lease.liberar(inicio)
+
+    # ── Disparo ────────────────────────────────────────────────────────────
+    def em_pico(self, momento=None):
+        if not self.horario_pico:
+            return False
+        agora = (momento or datetime.now()).time()
+        inicio, fim = self.horario_pico
+        if inicio <= fim:
+            return inicio <= agora < fim
+        return agora >= inicio or agora < fim
+
+    def _enfileirar(self, usuario_id=None):
+        from jobs import gerenciador_tarefas
+        try:
+            tarefa_id = gerenciador_tarefas.enviar('backup_incremental', {'lease': True}, usuario_id=usuario_id)
+        except Exception:
+            self.lease.liberar()
+            raise
+        self.lease.registrar_tarefa(tarefa_id)
+        return tarefa_id
+
+    def verificar(self):
+        """Dispara a rodada se estiver vencida, fora do pico e sem outra em andamento."""
+        if self.intervalo_horas <= 0 or self.em_pico():
+            return None
+        if not self.lease.adquirir(vencido_desde=time.time() - self.intervalo_horas * 3600):
+            return None
+        return self._enfileirar()
+
+    def executar_agora(self, usuario_id=None):
+        """Rodada manual (admin). Retorna o id da tarefa ou None se já houver uma."""
+        if not self.lease.adquirir(vencido_desde=time.time()):
+            return None
+        return self._enfileirar(usuario_id)
+
+    def _laco(self):
+        while not self._parar.wait(INTERVALO_VERIFICACAO):
+            try:
+                tarefa_id = self.verificar()
+                if tarefa_id:
+                    logger.info('Backup agendado iniciado (tarefa %s)', tarefa_id)
+            except Exception:
+                logger.exception('Falha ao verificar o backup agendado')
+
+    def iniciar(self):
+        if self._thread is None and self.intervalo_horas > 0:
+            self._thread = threading.Thread(target=self._laco, name='agendador-backup', daemon=True)
+            self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    # ── Rodada ─────────────────────────────────────────────────────────────
+    def executar(self, contexto, bancos=None, retencao=True):
+        """Salva os bancos no pool limitado e escalonado, depois aplica a retenção.
+
+        Roda dentro da tarefa; o andamento e o cancelamento passam pelo
+        contexto só nesta thread. Retorna as linhas do resumo.
+        """
+        from backup_store import armazem_backups, bancos_para_backup, caminho_do_banco
+
+        def tamanho(banco):
+            caminho = caminho_do_banco(banco)
+            return os.path.getsize(caminho) if caminho and os.path.exists(caminho) else 0
+
+        # Maiores primeiro: o pool termina mais equilibrado
+        bancos = sorted(bancos or bancos_para_backup(), key=tamanho, reverse=True)
+
+        def salvar(banco):
+            try:
+                return banco, armazem_backups.salvar(banco), None
+            except Exception as e:
+                logger.exception('Falha no backup de %s', banco)
+                return banco, None, str(e)
+
+        pendentes = deque(bancos)
+        ativos = set()
+        resultados = []
+        proximo_inicio = 0.0
+        pool = ThreadPoolExecutor(max_workers=self.paralelismo, thread_name_prefix='backup')
+        try:
+            while pendentes or ativos:
+                pico = self.em_pico()
+                limite = 1 if pico else self.paralelismo
+                agora = time.monotonic()
+                if pendentes and len(ativos) < limite and agora >= proximo_inicio:
+                    ativos.add(pool.submit(salvar, pendentes.popleft()))
+                    proximo_inicio = agora + (self.espacamento_pico if pico else self.espacamento)
+                    continue
+
+                espera = max(0.1, proximo_inicio - agora) if pendentes and len(ativos) < limite else 30
+                if not ativos:
+                    time.sleep(espera)
+                    continue
+                feitos, ativos = wait(ativos, timeout=espera, return_when=FIRST_COMPLETED)
+                for futuro in feitos:
+                    resultados.append(futuro.result())
+                    self.lease.renovar()
+                    contexto.progresso(len(resultados) * 95 / len(bancos),
+                                       f'{len(resultados)} de {len(bancos)} bancos salvos')
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        erros = [f'{banco} ({erro})' for banco, _, erro in resultados if erro]
+        linhas = [f"{banco} {s['duracao']}s" for banco, s, _ in resultados if s]
+        if erros:
+            linhas.append(f"Falha em: {', '.join(erros)}")
+        if retencao:
+            contexto.progresso(97, 'Aplicando retenção')
+            snapshots, objetos = armazem_backups.aplicar_retencao(**self.retencao)
+            linhas.append(f'Retenção: {snapshots} snapshots e {objetos} blocos removidos')
+        if erros and len(erros) == len(bancos):
+            raise RuntimeError('; '.join(linhas))
+        return linhas
+
+
+# Instância global do agendador
+agendador_backups = AgendadorBackups()
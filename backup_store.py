@@ -0,0 +1,390 @@
+# Armazém Incremental de Backups (instance/backups/armazem)
+# Cada backup tira um instantâneo consistente do banco (backup.copiar_banco),
+# corta o arquivo em blocos de TAMANHO_BLOCO bytes (múltiplo da página do
+# SQLite, então uma página alterada muda só o seu bloco) e grava apenas os
+# blocos cujo SHA-256 ainda não está no armazém. Um snapshot é a lista
+# ordenada dos hashes; blocos iguais entre snapshots e entre unidades são
+# gravados uma vez só.
+#
+#   armazem/catalogo.db          snapshots, blocos de cada snapshot, objetos
+#   armazem/objetos/ab/abcd...   conteúdo do bloco (zlib), nome = SHA-256
+#
+# A retenção (aplicar_retencao) mantém os últimos N snapshots e o mais novo
+# de cada dia/semana recente; objetos sem referência são apagados depois.
+# Gravação de referências e coleta de lixo usam transações IMMEDIATE do
+# catálogo, então um backup nunca reaproveita um objeto que está sendo apagado.
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from backup import INSTANCE_DIR, copiar_banco
+
+ARMAZEM_DIR = os.path.join(INSTANCE_DIR, 'backups', 'armazem')
+
+# Bloco de 16 KiB = 4 páginas de 4 KiB: blocos menores gravam menos por
+# alteração, maiores geram menos arquivos (ver scripts/benchmark_backup.py)
+TAMANHO_BLOCO = 16 * 1024
+# Blocos gravados por transação do catálogo
+BLOCOS_POR_TRANSACAO = 256
+NIVEL_COMPRESSAO = 1
+# Snapshots interrompidos (processo morto no meio) são descartados depois disso
+VALIDADE_INCOMPLETO = timedelta(hours=6)
+
+# Retenção padrão: últimos N, mais novo de cada um dos D dias e W semanas recentes
+RETENCAO_PADRAO = {'ultimos': 7, 'diarios': 14, 'semanais': 8}
+
+BANCO_CENTRAL = 'central'
+
+
+class SnapshotInvalido(Exception):
+    """Snapshot inexistente, incompleto ou com blocos corrompidos"""
+
+
+def _agora():
+    return datetime.now(timezone.utc)
+
+
+def caminho_do_banco(banco):
+    """Arquivo atual do banco: 'central' ou o id da unidade."""
+    from database_config import _central_db_path, get_database_path
+    if banco == BANCO_CENTRAL:
+        return _central_db_path()
+    return get_database_path(banco)
+
+
+class ArmazemBackups:
+    """Armazém de blocos endereçados por conteúdo com catálogo em SQLite"""
+
+    def __init__(self, diretorio=ARMAZEM_DIR, tamanho_bloco=TAMANHO_BLOCO):
+        self.diretorio = diretorio
+        self.tamanho_bloco = tamanho_bloco
+        self.objetos_dir = os.path.join(diretorio, 'objetos')
+
+    # ── Catálogo ───────────────────────────────────────────────────────────
+    def _conectar(self):
+        os.makedirs(self.objetos_dir, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(self.diretorio, 'catalogo.db'), timeout=60.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                banco TEXT NOT NULL,
+                arquivo TEXT NOT NULL,
+                criado_em TEXT NOT NULL,
+                etiqueta TEXT,
+                completo INTEGER NOT NULL DEFAULT 0,
+                tamanho INTEGER,
+                hash TEXT,
+                blocos INTEGER,
+                blocos_novos INTEGER,
+                bytes_gravados INTEGER,
+                duracao REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_snapshots_banco ON snapshots(banco, criado_em);
+            CREATE TABLE IF NOT EXISTS snapshot_blocos (
+                snapshot_id INTEGER NOT NULL REFERENCES snapshots(id) ON DELETE CASCADE,
+                posicao INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (snapshot_id, posicao)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_snapshot_blocos_hash ON snapshot_blocos(hash);
+            CREATE TABLE IF NOT EXISTS objetos (
+                hash TEXT PRIMARY KEY,
+                tamanho INTEGER NOT NULL,
+                tamanho_gravado INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        ''')
+        return conn
+
+    def _caminho_objeto(self, hash_bloco):
+        return os.path.join(self.objetos_dir, hash_bloco[:2], hash_bloco)
+
+    def _gravar_objeto(self, hash_bloco, bloco):
+        """Grava o bloco compactado (escrita atômica). Retorna os bytes gravados."""
+        destino = self._caminho_objeto(hash_bloco)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        dados = zlib.compress(bloco, NIVEL_COMPRESSAO)
+        temporario = f'{destino}.{os.getpid()}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(dados)
+        os.replace(temporario, destino)
+        return len(dados)
+
+    def _ler_objeto(self, hash_bloco):
+        try:
+            with open(self._caminho_objeto(hash_bloco), 'rb') as arquivo:
+                bloco = zlib.decompress(arquivo.read())
+        except (OSError, zlib.error) as e:
+            raise SnapshotInvalido(f'Bloco {hash_bloco} ilegível: {e}')
+        if hashlib.sha256(bloco).hexdigest() != hash_bloco:
+            raise SnapshotInvalido(f'Bloco {hash_bloco} corrompido')
+        return bloco
+
+    # ── Backup ─────────────────────────────────────────────────────────────
+    def salvar(self, banco, caminho=None, etiqueta=None, progresso=None):
+        """Tira um snapshot do banco e grava só os blocos novos.
+
+        `progresso(lidos, total)` é chamado a cada lote de blocos.
+        Retorna o dict do snapshot criado.
+        """
+        caminho = caminho or caminho_do_banco(banco)
+        if not caminho or not os.path.exists(caminho):
+            raise FileNotFoundError(f'Banco {banco} não encontrado')
+        inicio = time.perf_counter()
+
+        fd, instantaneo = tempfile.mkstemp(suffix='.db', prefix='snapshot_')
+        os.close(fd)
+        conn = self._conectar()
+        try:
+            copiar_banco(caminho, instantaneo)
+            tamanho = os.path.getsize(instantaneo)
+            total_blocos = -(-tamanho // self.tamanho_bloco)
+            snapshot_id = conn.execute(
+                'INSERT INTO snapshots (banco, arquivo, criado_em, etiqueta) VALUES (?, ?, ?, ?)',
+                (banco, os.path.basename(caminho), _agora().isoformat(), etiqueta)
+            ).lastrowid
+
+            hash_total = hashlib.sha256()
+            novos = gravados = posicao = 0
+            with open(instantaneo, 'rb') as fonte:
+                while True:
+                    lote = []
+                    while len(lote) < BLOCOS_POR_TRANSACAO:
+                        bloco = fonte.read(self.tamanho_bloco)
+                        if not bloco:
+                            break
+                        hash_total.update(bloco)
+                        lote.append((hashlib.sha256(bloco).hexdigest(), bloco))
+                    if not lote:
+                        break
+                    # Verificar e referenciar na mesma transação: a coleta de
+                    # lixo não apaga um objeto entre as duas coisas
+                    conn.execute('BEGIN IMMEDIATE')
+                    try:
+                        hashes = list({h for h, _ in lote})
+                        existentes = set()
+                        for i in range(0, len(hashes), 500):
+                            parte = hashes[i:i + 500]
+                            existentes.update(r[0] for r in conn.execute(
+                                f"SELECT hash FROM objetos WHERE hash IN ({','.join('?' * len(parte))})", parte))
+                        for hash_bloco, bloco in lote:
+                            if hash_bloco not in existentes:
+                                tamanho_gravado = self._gravar_objeto(hash_bloco, bloco)
+                                conn.execute('INSERT INTO objetos (hash, tamanho, tamanho_gravado) VALUES (?, ?, ?)',
+                                             (hash_bloco, len(bloco), tamanho_gravado))
+                                existentes.add(hash_bloco)
+                                novos += 1
+                                gravados += tamanho_gravado
+                        conn.executemany(
+                            'INSERT INTO snapshot_blocos (snapshot_id, posicao, hash) VALUES (?, ?, ?)',
+                            [(snapshot_id, posicao + i, h) for i, (h, _) in enumerate(lote)]
+                        )
+                        conn.execute('COMMIT')
+                    except BaseException:
+                        conn.execute('ROLLBACK')
+                        raise
+                    posicao += len(lote)
+                    if progresso:
+                        progresso(posicao, total_blocos)
+
+            duracao = time.perf_counter() - inicio
+            conn.execute('''
+                UPDATE snapshots SET completo = 1, tamanho = ?, hash = ?, blocos = ?,
+                       blocos_novos = ?, bytes_gravados = ?, duracao = ?
+                WHERE id = ?
+            ''', (tamanho, hash_total.hexdigest(), posicao, novos, gravados, round(duracao, 3), snapshot_id))
+            return dict(conn.execute('SELECT * FROM snapshots WHERE id = ?', (snapshot_id,)).fetchone())
+        finally:
+            conn.close()
+            os.remove(instantaneo)
+
+    # ── Consulta ───────────────────────────────────────────────────────────
+    def snapshots(self, banco=None):
+        """Snapshots completos, do mais novo para o mais antigo."""
+        conn = self._conectar()
+        try:
+            sql = 'SELECT * FROM snapshots WHERE completo = 1'
+            parametros = ()
+            if banco:
+                sql += ' AND banco = ?'
+                parametros = (banco,)
+            return [dict(r) for r in conn.execute(sql + ' ORDER BY criado_em DESC, id DESC', parametros)]
+        finally:
+            conn.close()
+
+    def localizar(self, banco, quando=None):
+        """Snapshot do banco: o mais novo, ou o mais novo até `quando` (datetime ou ISO)."""
+        conn = self._conectar()
+        try:
+            if quando is None:
+                linha = conn.execute('''
+                    SELECT * FROM snapshots WHERE banco = ? AND completo = 1
+                    ORDER BY criado_em DESC, id DESC LIMIT 1
+                ''', (banco,)).fetchone()
+            else:
+                if isinstance(quando, str):
+                    quando = datetime.fromisoformat(quando)
+                if quando.tzinfo is None:
+                    quando = quando.astimezone()
+                linha = conn.execute('''
+                    SELECT * FROM snapshots WHERE banco = ? AND completo = 1 AND criado_em <= ?
+                    ORDER BY criado_em DESC, id DESC LIMIT 1
+                ''', (banco, quando.astimezone(timezone.utc).isoformat())).fetchone()
+            return dict(linha) if linha else None
+        finally:
+            conn.close()
+
+    def estatisticas(self):
+        """Totais do armazém: bytes lógicos dos snapshots x bytes gravados."""
+        conn = self._conectar()
+        try:
+            linha = conn.execute('''
+                SELECT (SELECT COUNT(*) FROM snapshots WHERE completo = 1) AS snapshots,
+                       (SELECT COALESCE(SUM(tamanho), 0) FROM snapshots WHERE completo = 1) AS bytes_logicos,
+                       COUNT(*) AS objetos, COALESCE(SUM(tamanho_gravado), 0) AS bytes_gravados
+                FROM objetos
+            ''').fetchone()
+            return dict(linha)
+        finally:
+            conn.close()
+
+    # ── Restauração ────────────────────────────────────────────────────────
+    def restaurar(self, snapshot_id, destino):
+        """Remonta o arquivo do snapshot em `destino`, conferindo cada bloco e
+        o hash do arquivo inteiro. Retorna o dict do snapshot."""
+        conn = self._conectar()
+        try:
+            snapshot = conn.execute('SELECT * FROM snapshots WHERE id = ?', (snapshot_id,)).fetchone()
+            if snapshot is None or not snapshot['completo']:
+                raise SnapshotInvalido(f'Snapshot {snapshot_id} inexistente ou incompleto')
+            snapshot = dict(snapshot)
+            hashes = [r[0] for r in conn.execute(
+                'SELECT hash FROM snapshot_blocos WHERE snapshot_id = ? ORDER BY posicao', (snapshot_id,))]
+        finally:
+            conn.close()
+
+        os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+        temporario = f'{destino}.restaurando'
+        hash_total = hashlib.sha256()
+        try:
+            with open(temporario, 'wb') as saida:
+                for hash_bloco in hashes:
+                    bloco = self._ler_objeto(hash_bloco)
+                    hash_total.update(bloco)
+                    saida.write(bloco)
+            if hash_total.hexdigest() != snapshot['hash']:
+                raise SnapshotInvalido(f'Snapshot {snapshot_id} não confere com o hash gravado')
+            os.replace(temporario, destino)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+        return snapshot
+
+    # ── Retenção ───────────────────────────────────────────────────────────
+    @staticmethod
+    def selecionar_mantidos(snapshots, ultimos=0, diarios=0, semanais=0):
+        """IDs a manter de uma lista (mais novo primeiro) de um mesmo banco."""
+        mantidos = {s['id'] for s in snapshots[:ultimos]}
+        for quantidade, periodo in ((diarios, lambda d: d.date()),
+                                    (semanais, lambda d: d.isocalendar()[:2])):
+            vistos = set()
+            for s in snapshots:
+                chave = periodo(datetime.fromisoformat(s['criado_em']).astimezone())
+                if chave in vistos:
+                    continue
+                if len(vistos) == quantidade:
+                    break
+                vistos.add(chave)
+                mantidos.add(s['id'])
+        return mantidos
+
+    def aplicar_retencao(self, ultimos=None, diarios=None, semanais=None, banco=None):
+        """Remove snapshots fora da política e os objetos que ficaram sem
+        referência. Retorna (snapshots removidos, objetos removidos)."""
+        ultimos = RETENCAO_PADRAO['ultimos'] if ultimos is None else ultimos
+        diarios = RETENCAO_PADRAO['diarios'] if diarios is None else diarios
+        semanais = RETENCAO_PADRAO['semanais'] if semanais is None else semanais
+
+        por_banco = {}
+        for s in self.snapshots(banco):
+            por_banco.setdefault(s['banco'], []).append(s)
+        remover = []
+        for lista in por_banco.values():
+            mantidos = self.selecionar_mantidos(lista, ultimos, diarios, semanais)
+            remover.extend(s['id'] for s in lista if s['id'] not in mantidos)
+
+        conn = self._conectar()
+        try:
+            limite = (_agora() - VALIDADE_INCOMPLETO).isoformat()
+            remover.extend(r[0] for r in conn.execute(
+                'SELECT id FROM snapshots WHERE completo = 0 AND criado_em < ?', (limite,)))
+            for i in range(0, len(remover), 500):
+                parte = remover[i:i + 500]
+                conn.execute(f"DELETE FROM snapshots WHERE id IN ({','.join('?' * len(parte))})", parte)
+        finally:
+            conn.close()
+        return len(remover), self.coletar_lixo()
+
+    def coletar_lixo(self):
+        """Apaga objetos que nenhum snapshot referencia. Retorna quantos."""
+        conn = self._conectar()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                orfaos = [r[0] for r in conn.execute('''
+                    SELECT hash FROM objetos o
+                    WHERE NOT EXISTS (SELECT 1 FROM snapshot_blocos b WHERE b.hash = o.hash)
+                ''')]
+                for i in range(0, len(orfaos), 500):
+                    parte = orfaos[i:i + 500]
+                    conn.execute(f"DELETE FROM objetos WHERE hash IN ({','.join('?' * len(parte))})", parte)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+            # Arquivos só depois do COMMIT: se o processo cair aqui, sobram
+            # arquivos sem entrada no catálogo (inofensivos), nunca entradas
+            # sem arquivo. O lock de escrita impede que um backup volte a
+            # gravar o mesmo bloco enquanto os arquivos são apagados, e o que
+            # ele tiver registrado depois do primeiro COMMIT é mantido.
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for i in range(0, len(orfaos), 500):
+                    parte = orfaos[i:i + 500]
+                    registrados = {r[0] for r in conn.execute(
+                        f"SELECT hash FROM objetos WHERE hash IN ({','.join('?' * len(parte))})", parte)}
+                    for hash_bloco in parte:
+                        if hash_bloco in registrados:
+                            continue
+                        try:
+                            os.remove(self._caminho_objeto(hash_bloco))
+                        except FileNotFoundError:
+                            pass
+            finally:
+                conn.execute('ROLLBACK')
+            return len(orfaos)
+        finally:
+            conn.close()
+
+
+def bancos_para_backup():
+    """Banco central e todas as unidades com arquivo existente."""
+    from database_config import get_all_units
+    bancos = [BANCO_CENTRAL]
+    for unit_id in get_all_units():
+        caminho = caminho_do_banco(unit_id)
+        if caminho and os.path.exists(caminho):
+            bancos.append(unit_id)
+    return bancos
+
+
+# Instância global do armazém
+armazem_backups = ArmazemBackups()
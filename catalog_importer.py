@@ -0,0 +1,302 @@
+# Importação em Lote do Catálogo (produtos, setores e fornecedores)
+# Lê CSV ou XLSX, identifica cada linha pela chave natural da entidade e grava
+# inserções e atualizações em lotes (executemany) numa única transação.
+# Usado pelo script scripts/importar_catalogo.py e pela rota /sistema/importar.
+import csv
+import io
+import os
+import re
+import sqlite3
+
+from database_manager import normalizar_busca
+
+# Linhas por chamada de executemany
+LOTE_IMPORTACAO = 5000
+# Quantidade máxima de mensagens de erro guardadas no resultado
+ERROS_RETIDOS = 50
+
+
+def _texto(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        # Planilhas guardam códigos numéricos como float
+        valor = int(valor)
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _inteiro(valor):
+    if valor is None or str(valor).strip() == '':
+        return None
+    return int(float(str(valor).strip().replace(',', '.')))
+
+
+def _chave_nome(linha):
+    return [normalizar_busca(linha.get('nome'))]
+
+
+def _chave_fornecedor(linha):
+    # CNPJ (só dígitos) identifica o fornecedor; sem CNPJ, vale o nome
+    cnpj = re.sub(r'\D', '', linha.get('cnpj') or '')
+    nome = f'nome:{normalizar_busca(linha.get("nome"))}'
+    return [f'cnpj:{cnpj}', nome] if cnpj else [nome]
+
+
+def _mesmo_fornecedor(registro, atual):
+    # O nome só identifica quando um dos lados não tem CNPJ: com CNPJs
+    # diferentes são fornecedores distintos (homônimos), e a linha é inserida
+    cnpj = re.sub(r'\D', '', registro.get('cnpj') or '')
+    cnpj_atual = re.sub(r'\D', '', atual.get('cnpj') or '')
+    return not cnpj or not cnpj_atual or cnpj == cnpj_atual
+
+
+# Definição das entidades importáveis:
+# - colunas: coluna da tabela -> conversor do valor lido
+# - apelidos: cabeçalhos aceitos (já normalizados) -> coluna
+# - chave: função que retorna as chaves naturais de uma linha, em ordem de
+#   preferência (a primeira identifica a linha no arquivo)
+# - mesmo_registro: (opcional) confirma que o registro encontrado por uma
+#   chave corresponde mesmo à linha
+# - somente_insercao: colunas gravadas apenas em registros novos
+# - padroes: valores usados na inserção quando a célula está vazia
+ENTIDADES = {
+    'produtos': {
+        'tabela': 'produtos',
+        'colunas': {
+            'nome': _texto,
+            'descricao': _texto,
+            'quantidade': _inteiro,
+            'categoria': _texto,
+            'codigo_barras': _texto,
+            'unidade_medida': _texto,
+            'estoque_minimo': _inteiro,
+        },
+        'apelidos': {
+            'produto': 'nome',
+            'descricao': 'descricao',
+            'estoque': 'quantidade',
+            'codigo': 'codigo_barras',
+            'codigo de barras': 'codigo_barras',
+            'ean': 'codigo_barras',
+            'unidade': 'unidade_medida',
+            'unidade de medida': 'unidade_medida',
+            'estoque minimo': 'estoque_minimo',
+        },
+        'chave': _chave_nome,
+        # O saldo só muda por movimentações; a planilha define o estoque inicial
+        'somente_insercao': ('quantidade',),
+        'padroes': {'quantidade': 0, 'unidade_medida': 'un', 'estoque_minimo': 5},
+    },
+    'setores': {
+        'tabela': 'setores',
+        'colunas': {
+            'nome': _texto,
+            'descricao': _texto,
+            'responsavel': _texto,
+        },
+        'apelidos': {
+            'setor': 'nome',
+        },
+        'chave': _chave_nome,
+        'somente_insercao': (),
+        'padroes': {},
+    },
+    'fornecedores': {
+        'tabela': 'fornecedores',
+        'colunas': {
+            'nome': _texto,
+            'cnpj': _texto,
+            'telefone': _texto,
+            'email': _texto,
+            'endereco': _texto,
+        },
+        'apelidos': {
+            'fornecedor': 'nome',
+            'razao social': 'nome',
+            'e-mail': 'email',
+            'endereco completo': 'endereco',
+        },
+        'chave': _chave_fornecedor,
+        'mesmo_registro': _mesmo_fornecedor,
+        'somente_insercao': (),
+        'padroes': {},
+    },
+}
+
+
+class ImportacaoErro(ValueError):
+    """Arquivo ou entidade que não pode ser importado"""
+
+
+def _coluna(definicao, cabecalho):
+    nome = normalizar_busca(cabecalho)
+    if nome.replace(' ', '_') in definicao['colunas']:
+        return nome.replace(' ', '_')
+    return definicao['apelidos'].get(nome)
+
+
+class _DialetoPadrao(csv.excel):
+    delimiter = ';'
+
+
+def ler_csv(arquivo):
+    """Gera (cabecalho, linhas) de um CSV em texto (separador ; ou ,)."""
+    amostra = arquivo.read(4096)
+    arquivo.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t')
+    except csv.Error:
+        dialeto = _DialetoPadrao
+    leitor = csv.reader(arquivo, dialeto)
+    cabecalho = next(leitor, [])
+    return cabecalho, leitor
+
+
+def ler_xlsx(arquivo):
+    """Gera (cabecalho, linhas) da primeira planilha de um XLSX (requer openpyxl)."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportacaoErro('Para importar arquivos .xlsx instale o pacote openpyxl.')
+
+    planilha = load_workbook(arquivo, read_only=True, data_only=True).active
+    linhas = planilha.iter_rows(values_only=True)
+    cabecalho = [c if c is not None else '' for c in next(linhas, [])]
+    return cabecalho, linhas
+
+
+def importar(conn, entidade, cabecalho, linhas, usuario_id=None):
+    """Importa `linhas` (sequências na ordem do `cabecalho`) para a entidade.
+
+    Registros existentes (ativos ou não) são localizados pela chave natural e
+    atualizados/reativados; os demais são inseridos. Linhas sem chave, com
+    valores inválidos, repetidas no arquivo ou sem alteração são ignoradas.
+    Tudo é gravado numa única transação. Retorna um dicionário com
+    inseridos, atualizados, ignorados e erros.
+    """
+    if entidade not in ENTIDADES:
+        raise ImportacaoErro(f'Entidade inválida: {entidade}')
+    definicao = ENTIDADES[entidade]
+    tabela = definicao['tabela']
+
+    indices = {}
+    for posicao, titulo in enumerate(cabecalho):
+        coluna = _coluna(definicao, str(titulo))
+        if coluna and coluna not in indices:
+            indices[coluna] = posicao
+    if 'nome' not in indices:
+        raise ImportacaoErro('O arquivo precisa de uma coluna "nome".')
+    colunas = list(indices)
+    atualizaveis = [c for c in colunas if c not in definicao['somente_insercao']]
+
+    # Mapa chave natural -> registro atual; ativos sobrescrevem inativos
+    existentes = {}
+    cursor = conn.execute(f'SELECT id, ativo, {", ".join(definicao["colunas"])} FROM {tabela} ORDER BY ativo, id')
+    nomes = [c[0] for c in cursor.description]
+    for row in cursor:
+        registro = dict(zip(nomes, row))
+        for chave in definicao['chave'](registro):
+            existentes[chave] = registro
+
+    resultado = {'inseridos': 0, 'atualizados': 0, 'ignorados': 0, 'erros': []}
+    vistos = set()
+    insercoes, atualizacoes = [], []
+
+    def erro(numero, mensagem):
+        resultado['ignorados'] += 1
+        if len(resultado['erros']) < ERROS_RETIDOS:
+            resultado['erros'].append(f'Linha {numero}: {mensagem}')
+
+    for numero, linha in enumerate(linhas, start=2):
+        try:
+            registro = {c: definicao['colunas'][c](linha[i] if i < len(linha) else None)
+                        for c, i in indices.items()}
+        except (TypeError, ValueError):
+            erro(numero, 'valor numérico inválido')
+            continue
+        if not registro.get('nome'):
+            if any(v is not None for v in registro.values()):
+                erro(numero, 'nome em branco')
+            continue
+
+        chaves = definicao['chave'](registro)
+        if chaves[0] in vistos:
+            erro(numero, 'repetida no arquivo')
+            continue
+        vistos.add(chaves[0])
+
+        mesmo_registro = definicao.get('mesmo_registro')
+        atual = next((existentes[c] for c in chaves if c in existentes
+                      and (mesmo_registro is None or mesmo_registro(registro, existentes[c]))), None)
+        if tabela == 'produtos':
+            # A chave de produtos já é o nome normalizado da busca
+            registro['nome_busca'] = chaves[0]
+        if atual is None:
+            insercoes.append(registro)
+            continue
+        # Células vazias mantêm o valor atual do cadastro
+        novos = [registro[c] if registro[c] is not None else atual[c] for c in atualizaveis]
+        if novos != [atual[c] for c in atualizaveis] or not atual['ativo']:
+            if tabela == 'produtos':
+                novos.append(registro['nome_busca'])
+            atualizacoes.append(novos + [atual['id']])
+        else:
+            resultado['ignorados'] += 1
+
+    colunas_insercao = colunas + (['nome_busca'] if tabela == 'produtos' else [])
+    if tabela == 'produtos' and usuario_id is not None:
+        colunas_insercao.append('usuario_id')
+    sql_insercao = (f'INSERT INTO {tabela} ({", ".join(colunas_insercao)}, ativo) '
+                    f'VALUES ({", ".join("?" * len(colunas_insercao))}, 1)')
+    ajustes = ''.join(f'{c} = ?, ' for c in atualizaveis)
+    if tabela == 'produtos':
+        ajustes += 'nome_busca = ?, data_atualizacao = CURRENT_TIMESTAMP, '
+    sql_atualizacao = f'UPDATE {tabela} SET {ajustes}ativo = 1 WHERE id = ?'
+
+    def valores_insercao(registro):
+        padroes = definicao['padroes']
+        valores = [registro[c] if registro[c] is not None else padroes.get(c) for c in colunas]
+        if tabela == 'produtos':
+            valores.append(registro['nome_busca'])
+            if usuario_id is not None:
+                valores.append(usuario_id)
+        return valores
+
+    try:
+        for inicio in range(0, len(insercoes), LOTE_IMPORTACAO):
+            conn.executemany(sql_insercao, [valores_insercao(r) for r in insercoes[inicio:inicio + LOTE_IMPORTACAO]])
+        for inicio in range(0, len(atualizacoes), LOTE_IMPORTACAO):
+            conn.executemany(sql_atualizacao, atualizacoes[inicio:inicio + LOTE_IMPORTACAO])
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        raise ImportacaoErro('Código de barras repetido no arquivo ou já usado por outro produto.')
+    except Exception:
+        conn.rollback()
+        raise
+
+    resultado['inseridos'] = len(insercoes)
+    resultado['atualizados'] = len(atualizacoes)
+    return resultado
+
+
+def importar_arquivo(conn, entidade, arquivo, nome_arquivo, usuario_id=None):
+    """Importa um arquivo CSV ou XLSX aberto em modo binário.
+
+    O formato é escolhido pela extensão de `nome_arquivo`.
+    """
+    extensao = os.path.splitext(nome_arquivo or '')[1].lower()
+    if extensao == '.xlsx':
+        cabecalho, linhas = ler_xlsx(arquivo)
+        return importar(conn, entidade, cabecalho, linhas, usuario_id)
+    if extensao in ('.csv', '.txt'):
+        texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+        try:
+            cabecalho, linhas = ler_csv(texto)
+            return importar(conn, entidade, cabecalho, linhas, usuario_id)
+        except UnicodeDecodeError:
+            raise ImportacaoErro('O arquivo CSV deve estar em UTF-8.')
+        finally:
+            texto.detach()
+    raise ImportacaoErro('Formato não suportado: use .csv ou .xlsx.')
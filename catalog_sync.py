@@ -0,0 +1,238 @@
+# Catálogo Mestre de Produtos e Sincronização com as Unidades
+# O catálogo fica no banco central com um SKU global estável por item. Cada
+# alteração recebe uma `versao` crescente; a sincronização envia a cada
+# unidade assinante apenas as linhas com versão maior que a última aplicada,
+# em lotes, e grava produtos.sku_global para ligar o produto local ao mestre.
+import secrets
+import sqlite3
+import threading
+
+from database_manager import db_manager, normalizar_busca
+
+# Linhas do catálogo enviadas por lote
+LOTE_SINCRONIZACAO = 500
+
+# Campos do catálogo copiados para produtos da unidade (estoque_minimo só na
+# criação: depois passa a ser política local da unidade)
+CAMPOS_CATALOGO = ('nome', 'descricao', 'categoria', 'codigo_barras', 'unidade_medida', 'estoque_minimo', 'ativo')
+
+_tabelas_verificadas = False
+_lock_sincronizacao = threading.Lock()
+
+
+def conectar_central():
+    """Conexão exclusiva com o banco central, com as tabelas do catálogo criadas."""
+    global _tabelas_verificadas
+    if not _tabelas_verificadas:
+        db_manager.init_database(None)
+        _tabelas_verificadas = True
+    return db_manager.get_connection(None, use_cache=False)
+
+
+def gerar_sku():
+    return 'SKU-' + secrets.token_hex(4).upper()
+
+
+def _proxima_versao_sql():
+    return '(SELECT COALESCE(MAX(versao), 0) + 1 FROM catalogo_produtos)'
+
+
+def salvar_produto(central, dados, produto_id=None):
+    """Cria ou altera um item do catálogo, incrementando sua versão.
+
+    A versão é calculada dentro do próprio INSERT/UPDATE, que roda com a
+    trava de escrita do SQLite, então nunca há duas alterações com o mesmo
+    número. Retorna o id do item.
+    """
+    valores = [dados.get(c) for c in CAMPOS_CATALOGO]
+    try:
+        if produto_id is None:
+            cursor = central.execute(f'''
+                INSERT INTO catalogo_produtos (sku, {", ".join(CAMPOS_CATALOGO)}, versao)
+                VALUES (?, {", ".join("?" * len(CAMPOS_CATALOGO))}, {_proxima_versao_sql()})
+            ''', [dados.get('sku') or gerar_sku()] + valores)
+            produto_id = cursor.lastrowid
+        else:
+            central.execute(f'''
+                UPDATE catalogo_produtos
+                SET {", ".join(f"{c} = ?" for c in CAMPOS_CATALOGO)},
+                    versao = {_proxima_versao_sql()}, data_atualizacao = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', valores + [produto_id])
+        central.commit()
+    except Exception:
+        central.rollback()
+        raise
+    return produto_id
+
+
+def publicar_produtos_unidade(central, unit_conn):
+    """Leva para o catálogo os produtos ativos da unidade ainda sem SKU global.
+
+    Produtos com o mesmo nome (sem acentos/maiúsculas) de um item já existente
+    no catálogo são apenas ligados a ele. Retorna (itens criados no catálogo,
+    produtos da unidade ligados).
+    """
+    catalogo = {normalizar_busca(row['nome']): row['sku']
+                for row in central.execute('SELECT sku, nome FROM catalogo_produtos')}
+    locais = unit_conn.execute('''
+        SELECT id, nome, descricao, categoria, codigo_barras, unidade_medida, estoque_minimo
+        FROM produtos WHERE ativo = 1 AND sku_global IS NULL
+    ''').fetchall()
+
+    # Um SKU liga no máximo um produto por unidade
+    usados = {row[0] for row in unit_conn.execute('SELECT sku_global FROM produtos WHERE sku_global IS NOT NULL')}
+
+    novos, vinculos = [], []
+    for produto in locais:
+        chave = normalizar_busca(produto['nome'])
+        sku = catalogo.get(chave)
+        if sku is None:
+            sku = catalogo[chave] = gerar_sku()
+            novos.append([sku] + [produto[c] if c != 'ativo' else 1 for c in CAMPOS_CATALOGO] + [len(novos)])
+        if sku not in usados:
+            usados.add(sku)
+            vinculos.append((sku, produto['id']))
+
+    try:
+        # Trava de escrita antes de ler a última versão: cada item novo recebe
+        # versão própria, consecutiva
+        central.execute('BEGIN IMMEDIATE')
+        versao = central.execute('SELECT COALESCE(MAX(versao), 0) + 1 FROM catalogo_produtos').fetchone()[0]
+        central.executemany(f'''
+            INSERT INTO catalogo_produtos (sku, {", ".join(CAMPOS_CATALOGO)}, versao)
+            VALUES (?, {", ".join("?" * len(CAMPOS_CATALOGO))}, {versao} + ?)
+        ''', novos)
+        central.commit()
+    except Exception:
+        central.rollback()
+        raise
+
+    try:
+        unit_conn.executemany('UPDATE produtos SET sku_global = ? WHERE id = ? AND sku_global IS NULL', vinculos)
+        unit_conn.commit()
+    except Exception:
+        unit_conn.rollback()
+        raise
+    return len(novos), len(vinculos)
+
+
+def _aplicar_lote(unit_conn, lote):
+    """Aplica um lote do catálogo na unidade (sem commit). Retorna contadores."""
+    skus = [row['sku'] for row in lote]
+    marcadores = ','.join('?' * len(skus))
+    ligados = {row['sku_global']: row['id'] for row in unit_conn.execute(
+        f'SELECT id, sku_global FROM produtos WHERE sku_global IN ({marcadores})', skus)}
+
+    # Produtos locais ainda não ligados são reconhecidos pelo nome
+    nomes = list({normalizar_busca(row['nome']) for row in lote})
+    sem_vinculo = {}
+    for row in unit_conn.execute(f'''
+        SELECT id, nome_busca FROM produtos
+        WHERE ativo = 1 AND nome_busca IN ({','.join('?' * len(nomes))}) AND sku_global IS NULL
+        ORDER BY id
+    ''', nomes):
+        sem_vinculo.setdefault(row['nome_busca'], row['id'])
+
+    atualizacoes, insercoes = [], []
+    for item in lote:
+        nome_busca = normalizar_busca(item['nome'])
+        produto_id = ligados.get(item['sku']) or sem_vinculo.pop(nome_busca, None)
+        if produto_id is not None:
+            atualizacoes.append((item['sku'], item['nome'], nome_busca, item['descricao'], item['categoria'],
+                                 item['codigo_barras'], item['unidade_medida'], item['ativo'], produto_id))
+        elif item['ativo']:
+            insercoes.append((item['sku'], item['nome'], nome_busca, item['descricao'], item['categoria'],
+                              item['codigo_barras'], item['unidade_medida'], item['estoque_minimo']))
+
+    unit_conn.executemany('''
+        UPDATE produtos
+        SET sku_global = ?, nome = ?, nome_busca = ?, descricao = ?, categoria = ?,
+            codigo_barras = ?, unidade_medida = ?, ativo = ?, data_atualizacao = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', atualizacoes)
+    unit_conn.executemany('''
+        INSERT INTO produtos (sku_global, nome, nome_busca, descricao, categoria,
+                              codigo_barras, unidade_medida, estoque_minimo, quantidade, ativo)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, 1)
+    ''', insercoes)
+    return len(insercoes), len(atualizacoes)
+
+
+def sincronizar_unidade(central, unit_id, lote=LOTE_SINCRONIZACAO):
+    """Envia à unidade as alterações do catálogo desde a última versão aplicada.
+
+    Cada lote é gravado na unidade e só então a versão da assinatura avança,
+    então uma sincronização interrompida é retomada do último lote completo.
+    Retorna {'inseridos', 'atualizados', 'versao'}.
+    """
+    assinatura = central.execute(
+        'SELECT versao_sincronizada FROM catalogo_assinaturas WHERE unidade_id = ? AND ativa = 1', (unit_id,)
+    ).fetchone()
+    if assinatura is None:
+        raise ValueError(f'Unidade sem assinatura ativa do catálogo: {unit_id}')
+
+    versao = assinatura['versao_sincronizada']
+    resultado = {'inseridos': 0, 'atualizados': 0, 'versao': versao}
+    unit_conn = db_manager.get_connection(unit_id, use_cache=False)
+    try:
+        while True:
+            itens = central.execute('''
+                SELECT sku, nome, descricao, categoria, codigo_barras, unidade_medida,
+                       estoque_minimo, ativo, versao
+                FROM catalogo_produtos WHERE versao > ? ORDER BY versao LIMIT ?
+            ''', (versao, lote)).fetchall()
+            if not itens:
+                break
+
+            try:
+                inseridos, atualizados = _aplicar_lote(unit_conn, itens)
+                unit_conn.commit()
+            except sqlite3.IntegrityError as e:
+                unit_conn.rollback()
+                raise ValueError(f'{unit_id}: conflito ao aplicar o catálogo (código de barras repetido?): {e}')
+            except Exception:
+                unit_conn.rollback()
+                raise
+
+            versao = itens[-1]['versao']
+            central.execute('''
+                UPDATE catalogo_assinaturas SET versao_sincronizada = ?, data_sincronizacao = CURRENT_TIMESTAMP
+                WHERE unidade_id = ?
+            ''', (versao, unit_id))
+            central.commit()
+            resultado['inseridos'] += inseridos
+            resultado['atualizados'] += atualizados
+            resultado['versao'] = versao
+    finally:
+        unit_conn.close()
+    return resultado
+
+
+def sincronizar_assinantes(central, lote=LOTE_SINCRONIZACAO):
+    """Sincroniza todas as unidades assinantes atrasadas. Retorna {unit_id: resultado}.
+
+    Execuções simultâneas no mesmo processo são serializadas.
+    """
+    resultados = {}
+    with _lock_sincronizacao:
+        pendentes = central.execute('''
+            SELECT unidade_id FROM catalogo_assinaturas
+            WHERE ativa = 1
+              AND versao_sincronizada < (SELECT COALESCE(MAX(versao), 0) FROM catalogo_produtos)
+        ''').fetchall()
+        for row in pendentes:
+            try:
+                resultados[row['unidade_id']] = sincronizar_unidade(central, row['unidade_id'], lote)
+            except ValueError as e:
+                resultados[row['unidade_id']] = {'erro': str(e)}
+    return resultados
+
+
+def assinar(central, unit_id, ativa=True):
+    """Ativa/desativa a assinatura da unidade (uma nova assinatura começa da versão 0)."""
+    central.execute('''
+        INSERT INTO catalogo_assinaturas (unidade_id, ativa) VALUES (?, ?)
+        ON CONFLICT(unidade_id) DO UPDATE SET ativa = excluded.ativa
+    ''', (unit_id, 1 if ativa else 0))
+    central.commit()
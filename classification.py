@@ -0,0 +1,98 @@
+# Classificação ABC/XYZ do Estoque
+# ABC: curva de Pareto do volume consumido (A concentra a maior parte das
+# saídas). XYZ: regularidade da demanda pelo coeficiente de variação do
+# consumo semanal (X estável, Z errática). Usa a mesma matriz de consumo
+# diário da previsão de demanda e classifica todos os produtos de uma vez.
+import numpy as np
+
+from forecasting import carregar_consumo
+
+CLASSES_ABC = ('A', 'B', 'C')
+CLASSES_XYZ = ('X', 'Y', 'Z')
+
+# Parâmetros padrão da classificação
+PARAMETROS_PADRAO = {
+    'dias_historico': 180,
+    # Percentual acumulado do consumo que fecha as classes A e B
+    'limite_a': 0.80,
+    'limite_b': 0.95,
+    # Coeficiente de variação máximo das classes X e Y
+    'limite_x': 0.5,
+    'limite_y': 1.0,
+}
+
+
+def classificar_abc(totais, limite_a=0.80, limite_b=0.95):
+    """Classe ABC de cada produto a partir do consumo total no período.
+
+    O produto que cruza o limite entra na classe anterior (um item que
+    sozinho responde por 90% do consumo é A). Sem consumo: C.
+    """
+    classes = np.full(len(totais), 'C', dtype='<U1')
+    soma = totais.sum()
+    if not len(totais) or soma <= 0:
+        return classes
+
+    ordem = np.argsort(-totais, kind='stable')
+    # Participação acumulada antes de cada produto, na ordem decrescente
+    anterior = (np.cumsum(totais[ordem]) - totais[ordem]) / soma
+    ordenadas = np.where(anterior < limite_a, 'A', np.where(anterior < limite_b, 'B', 'C'))
+    ordenadas[totais[ordem] <= 0] = 'C'
+    classes[ordem] = ordenadas
+    return classes
+
+
+def classificar_xyz(matriz, limite_x=0.5, limite_y=1.0):
+    """Classe XYZ pelo coeficiente de variação do consumo semanal.
+
+    O consumo diário é somado em semanas completas (as mais recentes) para
+    que dias sem movimentação, comuns em hospitais, não dominem a variação.
+    Sem consumo no período: Z.
+    """
+    n_produtos, n_dias = matriz.shape
+    semanas = n_dias // 7
+    if semanas < 2:
+        raise ValueError('A classificação XYZ precisa de pelo menos 14 dias de histórico.')
+    semanal = matriz[:, n_dias - semanas * 7:].reshape(n_produtos, semanas, 7).sum(axis=2)
+
+    media = semanal.mean(axis=1)
+    desvio = semanal.std(axis=1)
+    cv = np.divide(desvio, media, out=np.full(n_produtos, np.inf), where=media > 0)
+    return np.where(cv <= limite_x, 'X', np.where(cv <= limite_y, 'Y', 'Z')), cv
+
+
+def classificar_unidade(conn, **parametros):
+    """Calcula e grava classe_abc/classe_xyz dos produtos ativos da unidade.
+
+    Retorna {'produtos': total, 'abc': {classe: qtd}, 'xyz': {classe: qtd}}.
+    """
+    params = dict(PARAMETROS_PADRAO)
+    params.update({k: v for k, v in parametros.items() if v is not None})
+    if not 0 < params['limite_a'] < params['limite_b'] <= 1:
+        raise ValueError('Limites ABC inválidos: use 0 < A < B <= 1.')
+
+    ids, matriz = carregar_consumo(conn, params['dias_historico'])
+    resultado = {'produtos': len(ids),
+                 'abc': dict.fromkeys(CLASSES_ABC, 0),
+                 'xyz': dict.fromkeys(CLASSES_XYZ, 0)}
+    if not len(ids):
+        return resultado
+
+    abc = classificar_abc(matriz.sum(axis=1), params['limite_a'], params['limite_b'])
+    xyz, _ = classificar_xyz(matriz, params['limite_x'], params['limite_y'])
+
+    try:
+        conn.executemany('''
+            UPDATE produtos
+            SET classe_abc = ?, classe_xyz = ?, data_classificacao = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', zip(abc.tolist(), xyz.tolist(), ids.tolist()))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    for classes, contagem in ((abc, resultado['abc']), (xyz, resultado['xyz'])):
+        valores, quantidades = np.unique(classes, return_counts=True)
+        contagem.update(zip(valores.tolist(), quantidades.tolist()))
+    return resultado
@@ -1,14 +1,81 @@
 # Gerenciador de Conexões Multi-Tenant
+import logging
 import sqlite3
 import os
+import unicodedata
 from flask import g
 from database_config import get_database_path, CENTRAL_DB
 
+logger = logging.getLogger(__name__)
+
+# Versão do schema dos bancos de unidade (gravada em PRAGMA user_version).
+# Incrementar sempre que upgrade_unit_schema ganhar novos passos.
+SCHEMA_VERSAO_UNIDADE = 10
+
+# Versão do schema do banco central (tabelas criadas pelo SQLAlchemy e por
+# init_database). Incrementar sempre que upgrade_central_schema mudar.
+SCHEMA_VERSAO_CENTRAL = 4
+
+# Tabelas da unidade com contador de alterações em `versao_dados`
+TABELAS_VERSIONADAS = ('produtos', 'movimentacoes', 'setores', 'fornecedores')
+# Contador só do cadastro de produtos (colunas abaixo, inserções e exclusões):
+# o de `produtos` muda a cada movimentação de estoque
+CADASTRO_PRODUTOS = 'produtos_cadastro'
+COLUNAS_CADASTRO_PRODUTOS = ('nome', 'nome_busca', 'categoria', 'sku_global')
+
+
+def normalizar_busca(texto):
+    """Normaliza um nome para busca por prefixo (minúsculas, sem acentos)."""
+    if not texto:
+        return ''
+    if texto.isascii():
+        return ' '.join(texto.lower().split())
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.lower().split())
+
+
+def get_versao_dados(conn, tabelas=TABELAS_VERSIONADAS):
+    """Retorna {tabela: versão} com o contador de alterações de cada tabela.
+
+    O contador é mantido por triggers, então qualquer escrita (rotas, scripts)
+    o incrementa. Serve como versão barata dos dados para ETags e caches.
+    """
+    marcadores = ','.join('?' * len(tabelas))
+    cursor = conn.execute(f'SELECT tabela, versao FROM versao_dados WHERE tabela IN ({marcadores})', tuple(tabelas))
+    versoes = {tabela: 0 for tabela in tabelas}
+    versoes.update({row[0]: row[1] for row in cursor.fetchall()})
+    return versoes
+
+
+# Configurações da unidade criadas com o banco (chave, valor, descrição)
+CONFIGURACOES_PADRAO = (
+    ('nome_sistema', 'Sistema de Estoque Hospitalar', 'Nome do sistema'),
+    ('versao', '1.0.0', 'Versão atual do sistema'),
+    ('limite_produtos_pagina', '50', 'Limite de produtos por página'),
+    ('alerta_estoque_baixo', '5', 'Nível mínimo para alerta'),
+    ('tempo_sessao', '3600', 'Tempo de sessão em segundos'),
+    ('email_remetente', 'noreply@sistema.com', 'Email para notificações'),
+)
+
+
+def get_configuracao(conn, chave, padrao=None, tipo=str):
+    """Lê uma configuração da unidade convertida com `tipo` (ou `padrao`)."""
+    row = conn.execute('SELECT valor FROM configuracoes WHERE chave = ?', (chave,)).fetchone()
+    if row is None or row[0] in (None, ''):
+        return padrao
+    try:
+        return tipo(row[0])
+    except (TypeError, ValueError):
+        return padrao
+
 
 class DatabaseManager:
     def __init__(self):
         # cache de conexões ativas por chave (unit_id ou '__central__')
         self.connections = {}
+        # Unidades cujo índice único de código de barras já foi conferido neste processo
+        self._codigos_verificados = set()
     
     def _full_path(self, db_path):
         # Retorna caminho absoluto relativo ao diretório do projeto
@@ -59,6 +126,12 @@ class DatabaseManager:
         
         conn.row_factory = sqlite3.Row  # Permite acesso por nome da coluna
 
+        if unit_id is not None:
+            self.upgrade_unit_schema(conn)
+            if unit_id not in self._codigos_verificados:
+                self._codigos_verificados.add(unit_id)
+                self.codigos_barras_duplicados(conn)
+
         if use_cache:
             self.connections[key] = conn
 
@@ -78,7 +151,6 @@ class DatabaseManager:
                     email TEXT UNIQUE NOT NULL,
                     senha TEXT NOT NULL,
                     tipo TEXT DEFAULT 'user',
-                    unidades_acesso TEXT, -- JSON com unidades que o usuário pode acessar
                     ativo INTEGER DEFAULT 1,
                     pode_cadastrar INTEGER DEFAULT 1,
                     data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -106,6 +178,8 @@ class DatabaseManager:
             # Criar índices para melhor performance
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_unidades_ativa ON unidades(ativa)')
             
+            self._criar_usuario_unidade(cursor)
+            
             # Inserir unidades padrão (se existirem em DATABASES)
             from database_config import DATABASES
             for unit_id, config in DATABASES.items():
@@ -113,88 +187,430 @@ class DatabaseManager:
                     INSERT OR IGNORE INTO unidades (id, nome, descricao, database, type)
                     VALUES (?, ?, ?, ?, ?)
                 ''', (unit_id, config['name'], config['description'], config.get('database'), config.get('type', 'sqlite')))
-        
-        else:
-            # Tabelas do banco da unidade (estoque)
+            
+            # Catálogo mestre de produtos (SKU global) e unidades assinantes.
+            # `versao` cresce a cada alteração e guia a sincronização incremental
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS produtos (
+                CREATE TABLE IF NOT EXISTS catalogo_produtos (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sku TEXT UNIQUE NOT NULL,
                     nome TEXT NOT NULL,
                     descricao TEXT,
-                    quantidade INTEGER DEFAULT 0,
                     categoria TEXT,
-                    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    usuario_id INTEGER,
                     codigo_barras TEXT,
                     unidade_medida TEXT DEFAULT 'un',
                     estoque_minimo INTEGER DEFAULT 5,
-                    ativo INTEGER DEFAULT 1
+                    ativo INTEGER DEFAULT 1,
+                    versao INTEGER NOT NULL,
+                    data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
-            
-            # Criar índices para melhor performance
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_produtos_nome ON produtos(nome)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_produtos_categoria ON produtos(categoria)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_produtos_ativo ON produtos(ativo)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_produtos_estoque_minimo ON produtos(estoque_minimo)')
-            
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_catalogo_produtos_versao ON catalogo_produtos(versao)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_catalogo_produtos_nome ON catalogo_produtos(nome)')
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS movimentacoes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    produto_id INTEGER NOT NULL,
-                    tipo TEXT NOT NULL, -- 'entrada' ou 'saida'
-                    quantidade INTEGER NOT NULL,
-                    usuario_responsavel_id INTEGER NOT NULL,
-                    origem TEXT,
-                    destino TEXT,
-                    nota_fiscal TEXT,
-                    ordem_servico TEXT,
-                    motivo TEXT,
-                    data_movimentacao DATETIME DEFAULT CURRENT_TIMESTAMP
+                CREATE TABLE IF NOT EXISTS catalogo_assinaturas (
+                    unidade_id TEXT PRIMARY KEY,
+                    versao_sincronizada INTEGER NOT NULL DEFAULT 0,
+                    ativa INTEGER DEFAULT 1,
+                    data_sincronizacao DATETIME
                 )
             ''')
-            
-            # Criar índices para melhor performance
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimentacoes_produto_id ON movimentacoes(produto_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimentacoes_tipo ON movimentacoes(tipo)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimentacoes_data ON movimentacoes(data_movimentacao)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimentacoes_usuario ON movimentacoes(usuario_responsavel_id)')
-            
+            conn.commit()
+            self.upgrade_central_schema(conn)
+        
+        else:
+            self._criar_tabelas_unidade(cursor)
+
+        conn.commit()
+
+        if unit_id is not None:
+            self.upgrade_unit_schema(conn)
+
+        conn.close()
+
+    def upgrade_central_schema(self, conn):
+        """Aplica no banco central as alterações posteriores à criação das
+        tabelas pelo SQLAlchemy (db.create_all não altera tabelas existentes).
+
+        Só marca a versão quando as tabelas já existem; em um banco novo é
+        chamado de novo depois do create_all. Roda sob o lock de escrita, como
+        upgrade_unit_schema: todos os workers chamam no import do app.
+        """
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSAO_CENTRAL:
+            return
+        self._migrar_com_lock(conn, SCHEMA_VERSAO_CENTRAL, self._migrar_central)
+
+    def _migrar_central(self, cursor):
+        """Passos de upgrade_central_schema (já dentro da transação)."""
+        tabelas = {r[0] for r in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if not {'usuarios', 'unidades', 'notificacoes'} <= tabelas:
+            return False
+
+        # v1: contador de notificações não lidas no usuário (badge do menu),
+        # mantido por triggers em qualquer escrita na tabela notificacoes
+        colunas_usuarios = [r[1] for r in cursor.execute('PRAGMA table_info(usuarios)').fetchall()]
+        if 'notificacoes_nao_lidas' not in colunas_usuarios:
+            cursor.execute('ALTER TABLE usuarios ADD COLUMN notificacoes_nao_lidas INTEGER NOT NULL DEFAULT 0')
+        cursor.execute('''
+            UPDATE usuarios SET notificacoes_nao_lidas = (
+                SELECT COUNT(*) FROM notificacoes n WHERE n.usuario_id = usuarios.id AND n.lida = 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notificacoes_usuario_lida_data
+            ON notificacoes(usuario_id, lida, data_criacao)
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_notificacoes_insert
+            AFTER INSERT ON notificacoes WHEN NEW.lida = 0
+            BEGIN
+                UPDATE usuarios SET notificacoes_nao_lidas = notificacoes_nao_lidas + 1 WHERE id = NEW.usuario_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_notificacoes_update
+            AFTER UPDATE OF lida ON notificacoes WHEN OLD.lida != NEW.lida
+            BEGIN
+                UPDATE usuarios SET notificacoes_nao_lidas = notificacoes_nao_lidas + (CASE WHEN NEW.lida THEN -1 ELSE 1 END)
+                WHERE id = NEW.usuario_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_notificacoes_delete
+            AFTER DELETE ON notificacoes WHEN OLD.lida = 0
+            BEGIN
+                UPDATE usuarios SET notificacoes_nao_lidas = notificacoes_nao_lidas - 1 WHERE id = OLD.usuario_id;
+            END
+        ''')
+
+        # v2: chave de deduplicação do serviço de notificações (notifications.py)
+        colunas_notificacoes = [r[1] for r in cursor.execute('PRAGMA table_info(notificacoes)').fetchall()]
+        if 'chave_dedup' not in colunas_notificacoes:
+            cursor.execute('ALTER TABLE notificacoes ADD COLUMN chave_dedup TEXT')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_notificacoes_usuario_chave
+            ON notificacoes(usuario_id, chave_dedup) WHERE chave_dedup IS NOT NULL
+        ''')
+
+        # v3: versão das permissões do usuário (cache de permissões compiladas)
+        if 'versao_permissoes' not in colunas_usuarios:
+            cursor.execute('ALTER TABLE usuarios ADD COLUMN versao_permissoes INTEGER NOT NULL DEFAULT 0')
+
+        # v4: acesso às unidades na tabela usuario_unidade. O JSON válido da
+        # coluna antiga é copiado aqui; valores em outros formatos ficam para
+        # scripts/normalize_unidades_access.py
+        self._criar_usuario_unidade(cursor)
+        if 'unidades_acesso' in colunas_usuarios:
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS setores (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome TEXT NOT NULL,
-                    descricao TEXT,
-                    responsavel TEXT,
-                    ativo INTEGER DEFAULT 1
-                )
+                INSERT OR IGNORE INTO usuario_unidade (usuario_id, unidade_id)
+                SELECT u.id, j.value
+                FROM usuarios u, json_each(u.unidades_acesso) j
+                WHERE json_valid(u.unidades_acesso) AND json_type(u.unidades_acesso) = 'array'
+                  AND j.value IN (SELECT id FROM unidades)
             ''')
-            
-            # Criar índices para melhor performance
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_setores_nome ON setores(nome)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_setores_ativo ON setores(ativo)')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS fornecedores (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome TEXT NOT NULL,
-                    cnpj TEXT,
-                    telefone TEXT,
-                    email TEXT,
-                    endereco TEXT,
-                    ativo INTEGER DEFAULT 1
-                )
+            cursor.execute('UPDATE usuarios SET versao_permissoes = versao_permissoes + 1')
+        return True
+
+    @staticmethod
+    def _criar_tabelas_unidade(cursor):
+        """Tabelas originais do banco da unidade; upgrade_unit_schema aplica
+        as alterações posteriores."""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS produtos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL,
+                descricao TEXT,
+                quantidade INTEGER DEFAULT 0,
+                categoria TEXT,
+                data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+                data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+                usuario_id INTEGER,
+                codigo_barras TEXT,
+                unidade_medida TEXT DEFAULT 'un',
+                estoque_minimo INTEGER DEFAULT 5,
+                ativo INTEGER DEFAULT 1
+            )
+        ''')
+        
+        # Criar índices para melhor performance
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_produtos_nome ON produtos(nome)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_produtos_categoria ON produtos(categoria)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_produtos_ativo ON produtos(ativo)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_produtos_estoque_minimo ON produtos(estoque_minimo)')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS movimentacoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                produto_id INTEGER NOT NULL,
+                tipo TEXT NOT NULL, -- 'entrada' ou 'saida'
+                quantidade INTEGER NOT NULL,
+                usuario_responsavel_id INTEGER NOT NULL,
+                origem TEXT,
+                destino TEXT,
+                nota_fiscal TEXT,
+                ordem_servico TEXT,
+                motivo TEXT,
+                data_movimentacao DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Criar índices para melhor performance
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimentacoes_produto_id ON movimentacoes(produto_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimentacoes_tipo ON movimentacoes(tipo)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimentacoes_data ON movimentacoes(data_movimentacao)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimentacoes_usuario ON movimentacoes(usuario_responsavel_id)')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS setores (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL,
+                descricao TEXT,
+                responsavel TEXT,
+                ativo INTEGER DEFAULT 1
+            )
+        ''')
+        
+        # Criar índices para melhor performance
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_setores_nome ON setores(nome)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_setores_ativo ON setores(ativo)')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fornecedores (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL,
+                cnpj TEXT,
+                telefone TEXT,
+                email TEXT,
+                endereco TEXT,
+                ativo INTEGER DEFAULT 1
+            )
+        ''')
+        
+        # Criar índices para melhor performance
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_fornecedores_nome ON fornecedores(nome)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_fornecedores_cnpj ON fornecedores(cnpj)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_fornecedores_ativo ON fornecedores(ativo)')
+
+    @staticmethod
+    def _criar_usuario_unidade(cursor):
+        """Tabela de acesso usuário/unidade (mesma definição do models.py)."""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS usuario_unidade (
+                usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+                unidade_id VARCHAR(50) NOT NULL REFERENCES unidades(id) ON DELETE CASCADE,
+                PRIMARY KEY (usuario_id, unidade_id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_usuario_unidade_unidade
+            ON usuario_unidade(unidade_id, usuario_id)
+        ''')
+
+    def upgrade_unit_schema(self, conn):
+        """Aplica no banco da unidade as alterações de schema posteriores à
+        criação original das tabelas (colunas e índices novos).
+
+        A versão aplicada fica em PRAGMA user_version, então conexões a bancos
+        já atualizados custam apenas uma leitura do pragma. A migração roda
+        com o lock de escrita (BEGIN IMMEDIATE) e relê a versão depois de
+        obtê-lo: com vários workers abrindo a mesma unidade após um deploy,
+        só o primeiro aplica os passos e os demais encontram o banco pronto.
+        """
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSAO_UNIDADE:
+            return
+        self._migrar_com_lock(conn, SCHEMA_VERSAO_UNIDADE, self._migrar_unidade)
+
+    @staticmethod
+    def _migrar_com_lock(conn, versao_alvo, migrar):
+        """Executa `migrar(cursor)` em uma transação BEGIN IMMEDIATE se a
+        versão relida dentro dela ainda for anterior a `versao_alvo`. Grava a
+        versão quando `migrar` retornar True."""
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] < versao_alvo:
+                cursor = conn.cursor()
+                if migrar(cursor):
+                    cursor.execute(f'PRAGMA user_version = {versao_alvo}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _migrar_unidade(self, cursor):
+        """Passos de upgrade_unit_schema (já dentro da transação)."""
+        cursor.execute("PRAGMA table_info(produtos)")
+        colunas_produtos = [r[1] for r in cursor.fetchall()]
+        if not colunas_produtos:
+            # Banco ainda não inicializado: init_database chamará novamente
+            return False
+
+        # v1: sugestão de estoque mínimo calculada pela previsão de demanda
+        if 'estoque_minimo_sugerido' not in colunas_produtos:
+            cursor.execute('ALTER TABLE produtos ADD COLUMN estoque_minimo_sugerido INTEGER')
+        if 'data_sugestao_minimo' not in colunas_produtos:
+            cursor.execute('ALTER TABLE produtos ADD COLUMN data_sugestao_minimo DATETIME')
+        # Série de consumo por produto (saídas no período)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimentacoes_tipo_data ON movimentacoes(tipo, data_movimentacao)')
+
+        # v2: eventos de alteração de estoque (feed SSE por unidade)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS eventos_estoque (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                produto_id INTEGER NOT NULL,
+                quantidade INTEGER,
+                tipo TEXT NOT NULL, -- 'entrada', 'saida' ou 'exclusao_<tipo>'
+                data_evento DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # v3: contador de alterações por tabela, mantido por triggers
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS versao_dados (
+                tabela TEXT PRIMARY KEY,
+                versao INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        for tabela in TABELAS_VERSIONADAS:
+            cursor.execute('INSERT OR IGNORE INTO versao_dados (tabela, versao) VALUES (?, 0)', (tabela,))
+            for operacao in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_versao_{tabela}_{operacao.lower()}
+                    AFTER {operacao} ON {tabela}
+                    BEGIN
+                        UPDATE versao_dados SET versao = versao + 1 WHERE tabela = '{tabela}';
+                    END
+                ''')
+
+        # v4: nome normalizado para busca/autocomplete por prefixo
+        if 'nome_busca' not in colunas_produtos:
+            cursor.execute('ALTER TABLE produtos ADD COLUMN nome_busca TEXT')
+        pendentes = cursor.execute('SELECT id, nome FROM produtos WHERE nome_busca IS NULL').fetchall()
+        cursor.executemany('UPDATE produtos SET nome_busca = ? WHERE id = ?',
+                           [(normalizar_busca(nome), pid) for pid, nome in pendentes])
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_produtos_ativo_nome_busca ON produtos(ativo, nome_busca)')
+
+        # v5: leitura por código de barras. Código vazio vira NULL para não
+        # colidir no índice único entre produtos ativos
+        cursor.execute("UPDATE produtos SET codigo_barras = NULL WHERE TRIM(codigo_barras) = ''")
+        self._criar_indice_codigo_barras(cursor)
+
+        # v6: configurações por unidade e índices da listagem paginada de
+        # produtos (o id entra implicitamente como desempate no índice)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS configuracoes (
+                chave TEXT PRIMARY KEY,
+                valor TEXT,
+                descricao TEXT
+            )
+        ''')
+        cursor.executemany('INSERT OR IGNORE INTO configuracoes (chave, valor, descricao) VALUES (?, ?, ?)',
+                           CONFIGURACOES_PADRAO)
+        cursor.execute('''
+            UPDATE produtos SET data_atualizacao = COALESCE(data_criacao, CURRENT_TIMESTAMP)
+            WHERE data_atualizacao IS NULL
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_produtos_ativo_quantidade ON produtos(ativo, quantidade)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_produtos_ativo_data_atualizacao ON produtos(ativo, data_atualizacao)')
+
+        # v7: vínculo com o catálogo mestre (SKU global do banco central)
+        colunas_produtos = [r[1] for r in cursor.execute('PRAGMA table_info(produtos)').fetchall()]
+        if 'sku_global' not in colunas_produtos:
+            cursor.execute('ALTER TABLE produtos ADD COLUMN sku_global TEXT')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_produtos_sku_global
+            ON produtos(sku_global) WHERE sku_global IS NOT NULL
+        ''')
+
+        # v8: registro das movimentações excluídas, para que a carga
+        # incremental da base analítica (analytics.py) remova os fatos
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS movimentacoes_excluidas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                movimentacao_id INTEGER NOT NULL,
+                data_exclusao DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_movimentacoes_excluidas
+            AFTER DELETE ON movimentacoes
+            BEGIN
+                INSERT INTO movimentacoes_excluidas (movimentacao_id) VALUES (OLD.id);
+            END
+        ''')
+
+        # v9: classificação ABC/XYZ (classification.py)
+        colunas_produtos = [r[1] for r in cursor.execute('PRAGMA table_info(produtos)').fetchall()]
+        for coluna, tipo in (('classe_abc', 'TEXT'), ('classe_xyz', 'TEXT'), ('data_classificacao', 'DATETIME')):
+            if coluna not in colunas_produtos:
+                cursor.execute(f'ALTER TABLE produtos ADD COLUMN {coluna} {tipo}')
+
+        # v10: contador do cadastro de produtos (dimensão produto da base
+        # analítica), que não muda com o saldo
+        cursor.execute('INSERT OR IGNORE INTO versao_dados (tabela, versao) VALUES (?, 0)', (CADASTRO_PRODUTOS,))
+        for nome, evento in (('insert', 'INSERT'),
+                             ('update', f"UPDATE OF {', '.join(COLUNAS_CADASTRO_PRODUTOS)}"),
+                             ('delete', 'DELETE')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_versao_{CADASTRO_PRODUTOS}_{nome}
+                AFTER {evento} ON produtos
+                BEGIN
+                    UPDATE versao_dados SET versao = versao + 1 WHERE tabela = '{CADASTRO_PRODUTOS}';
+                END
             ''')
-            
-            # Criar índices para melhor performance
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_fornecedores_nome ON fornecedores(nome)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_fornecedores_cnpj ON fornecedores(cnpj)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_fornecedores_ativo ON fornecedores(ativo)')
-            
-        conn.commit()
-        conn.close()
+        return True
     
+    @staticmethod
+    def _criar_indice_codigo_barras(cursor):
+        """Cria o índice único de código de barras entre produtos ativos.
+
+        Com códigos já duplicados na unidade, mantém a busca indexada por um
+        índice comum (_dup) e retorna os códigos repetidos; a criação é
+        tentada de novo (codigos_barras_duplicados) até os cadastros serem
+        corrigidos, quando o índice comum é removido.
+        """
+        try:
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_produtos_codigo_barras
+                ON produtos(codigo_barras) WHERE codigo_barras IS NOT NULL AND ativo = 1
+            ''')
+        except sqlite3.IntegrityError:
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_produtos_codigo_barras_dup
+                ON produtos(codigo_barras) WHERE codigo_barras IS NOT NULL AND ativo = 1
+            ''')
+            duplicados = [r[0] for r in cursor.execute('''
+                SELECT codigo_barras FROM produtos
+                WHERE codigo_barras IS NOT NULL AND ativo = 1
+                GROUP BY codigo_barras HAVING COUNT(*) > 1
+                ORDER BY codigo_barras
+            ''')]
+            logger.warning('Códigos de barras repetidos entre produtos ativos (índice único pendente): %s',
+                           ', '.join(duplicados))
+            return duplicados
+        cursor.execute('DROP INDEX IF EXISTS idx_produtos_codigo_barras_dup')
+        return []
+
+    def codigos_barras_duplicados(self, conn):
+        """Códigos repetidos que ainda impedem o índice único de código de
+        barras da unidade (tenta criá-lo de novo). Lista vazia quando a
+        unicidade já vale."""
+        if not conn.execute('''
+            SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_produtos_codigo_barras_dup'
+        ''').fetchone():
+            return []
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            duplicados = self._criar_indice_codigo_barras(conn.cursor())
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return duplicados
+
     def close_connection(self, unit_id=None):
         """Fecha conexão com o banco de dados"""
         key = unit_id or '__central__'
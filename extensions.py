@@ -1,13 +1,59 @@
 # Flask Extensions Configuration
+import logging
+
+from flask import request, session
 from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+# Registra o esquema sqlite:// no `limits` (armazenamento compartilhado)
+from limiter_storage import ArmazenamentoLimitesSQLite
+
+logger = logging.getLogger(__name__)
+
+# Armazenamento padrão dos contadores: arquivo local compartilhado pelos
+# workers (sobrescrito por RATELIMIT_STORAGE_URI, ex.: redis://...)
+RATELIMIT_STORAGE_PADRAO = 'sqlite:///instance/ratelimit.db'
+
 # Initialize CSRF protection
 csrf = CSRFProtect()
 
+
+def chave_limite():
+    """Usuário logado conta por id (vários almoxarifes saem pelo mesmo IP
+    do hospital); visitante, pelo endereço de origem."""
+    user_id = session.get('user_id')
+    return f'usuario:{user_id}' if user_id else get_remote_address()
+
+
+def registrar_rejeicao(limite):
+    """on_breach: registra a métrica da requisição rejeitada."""
+    descricao = str(limite.limit)
+    logger.warning('Rate limit %s excedido em %s (%s)', descricao, request.endpoint, limite.key)
+    storage = limiter.storage
+    if isinstance(storage, ArmazenamentoLimitesSQLite):
+        try:
+            storage.registrar_rejeicao(request.endpoint, descricao)
+        except Exception:
+            logger.exception('Falha ao registrar rejeição do rate limit')
+    return None
+
+
 # Initialize Flask-Limiter
+# Limites padrão por usuário para rotas sem limite próprio; as rotas de uso
+# intenso (leitura de código, movimentações, busca) têm limites específicos.
 limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
+    key_func=chave_limite,
+    default_limits=["5000 per day", "1000 per hour"],
+    strategy='fixed-window',
+    on_breach=registrar_rejeicao,
 )
+
+# Limites por rota
+LIMITE_LOGIN = '10 per minute'
+LIMITE_CADASTRO = '5 per hour'
+LIMITE_MOVIMENTACAO = '120 per minute'
+LIMITE_LEITURA_CODIGO = '600 per minute'
+LIMITE_BUSCA = '300 per minute'
+LIMITE_TAREFA_PESADA = '10 per hour'
+LIMITE_EXPORTACAO = '30 per hour'
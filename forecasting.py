@@ -0,0 +1,159 @@
+# Previsão de Demanda e Recálculo do Estoque Mínimo
+# Carrega o histórico de saídas de uma unidade em arrays NumPy e calcula,
+# para todos os produtos de uma vez, a demanda diária e o ponto de reposição.
+import math
+from datetime import datetime, timedelta, timezone
+from statistics import NormalDist
+
+import numpy as np
+
+METODOS = {
+    'media_movel': 'Média móvel',
+    'suavizacao_exponencial': 'Suavização exponencial',
+}
+
+# Parâmetros padrão do cálculo
+PARAMETROS_PADRAO = {
+    'metodo': 'media_movel',
+    'dias_historico': 90,
+    'janela': 30,
+    'alpha': 0.3,
+    'lead_time': 7,
+    'nivel_servico': 0.95,
+}
+
+
+def carregar_consumo(conn, dias_historico):
+    """Retorna (ids, matriz) com o consumo diário dos produtos ativos.
+
+    - ids: array ordenado com os IDs dos produtos ativos
+    - matriz: array (n_produtos, dias_historico) com a soma das saídas por dia;
+      a última coluna é o dia de hoje
+    """
+    if dias_historico < 1:
+        raise ValueError('O histórico precisa ter pelo menos 1 dia.')
+    inicio = (datetime.now(timezone.utc) - timedelta(days=dias_historico - 1)).strftime('%Y-%m-%d')
+
+    ids = np.fromiter(
+        (row[0] for row in conn.execute('SELECT id FROM produtos WHERE ativo = 1 ORDER BY id')),
+        dtype=np.int64
+    )
+    matriz = np.zeros((len(ids), dias_historico), dtype=np.float64)
+    if not len(ids):
+        return ids, matriz
+
+    cursor = conn.execute('''
+        SELECT produto_id,
+               CAST(julianday(date(data_movimentacao)) - julianday(?) AS INTEGER) AS dia,
+               SUM(quantidade)
+        FROM movimentacoes
+        WHERE tipo = 'saida' AND data_movimentacao >= ?
+        GROUP BY produto_id, dia
+    ''', (inicio, inicio))
+    dados = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)
+    if not len(dados):
+        return ids, matriz
+
+    produto_ids = dados[:, 0].astype(np.int64)
+    dias = dados[:, 1].astype(np.int64)
+    quantidades = dados[:, 2]
+
+    # Mapear produto_id -> linha da matriz (ignorando produtos inativos)
+    linhas = np.searchsorted(ids, produto_ids)
+    linhas = np.clip(linhas, 0, len(ids) - 1)
+    validos = (ids[linhas] == produto_ids) & (dias >= 0) & (dias < dias_historico)
+    np.add.at(matriz, (linhas[validos], dias[validos]), quantidades[validos])
+    return ids, matriz
+
+
+def calcular_demanda(matriz, metodo='media_movel', janela=30, alpha=0.3):
+    """Retorna (demanda_diaria, desvio_padrao) por produto (linha da matriz)."""
+    if metodo not in METODOS:
+        raise ValueError(f'Método de previsão inválido: {metodo}')
+
+    n_dias = matriz.shape[1]
+    if metodo == 'media_movel':
+        recorte = matriz[:, -min(janela, n_dias):]
+        return recorte.mean(axis=1), recorte.std(axis=1)
+
+    # Suavização exponencial simples em forma fechada: nível final é a média
+    # ponderada das observações com pesos alpha * (1 - alpha)^(idade)
+    idades = np.arange(n_dias - 1, -1, -1, dtype=np.float64)
+    pesos = alpha * (1 - alpha) ** idades
+    pesos /= pesos.sum()
+    demanda = matriz @ pesos
+    desvio = np.sqrt(((matriz - demanda[:, None]) ** 2) @ pesos)
+    return demanda, desvio
+
+
+def calcular_ponto_reposicao(demanda, desvio, lead_time=7, nivel_servico=0.95):
+    """Ponto de reposição = demanda no lead time + estoque de segurança."""
+    z = NormalDist().inv_cdf(nivel_servico)
+    ponto = demanda * lead_time + z * desvio * math.sqrt(lead_time)
+    return np.ceil(np.maximum(ponto, 0)).astype(np.int64)
+
+
+def validar_parametros(metodo='media_movel', dias_historico=90, janela=30,
+                       alpha=0.3, lead_time=7, nivel_servico=0.95):
+    """Levanta ValueError se algum parâmetro do cálculo for inválido."""
+    if metodo not in METODOS:
+        raise ValueError(f'Método de previsão inválido: {metodo}')
+    if dias_historico < 1 or janela < 1:
+        raise ValueError('Histórico e janela precisam ter pelo menos 1 dia.')
+    if not 0 < alpha <= 1:
+        raise ValueError('Alpha inválido: use 0 < alpha <= 1.')
+    if lead_time < 0:
+        raise ValueError('O lead time não pode ser negativo.')
+    if not 0 < nivel_servico < 1:
+        raise ValueError('Nível de serviço inválido: use 0 < nível < 1.')
+
+
+def calcular_sugestoes(conn, metodo='media_movel', dias_historico=90, janela=30,
+                       alpha=0.3, lead_time=7, nivel_servico=0.95):
+    """Calcula o estoque mínimo sugerido para todos os produtos ativos."""
+    validar_parametros(metodo, dias_historico, janela, alpha, lead_time, nivel_servico)
+    ids, matriz = carregar_consumo(conn, dias_historico)
+    if not len(ids):
+        return ids, np.zeros(0, dtype=np.int64)
+    demanda, desvio = calcular_demanda(matriz, metodo, janela, alpha)
+    return ids, calcular_ponto_reposicao(demanda, desvio, lead_time, nivel_servico)
+
+
+def recalcular_estoque_minimo(conn, **parametros):
+    """Grava as sugestões de estoque mínimo da unidade em um único executemany.
+
+    Retorna o número de produtos atualizados.
+    """
+    params = dict(PARAMETROS_PADRAO)
+    params.update({k: v for k, v in parametros.items() if v is not None})
+
+    ids, sugestoes = calcular_sugestoes(conn, **params)
+    if not len(ids):
+        return 0
+
+    try:
+        conn.executemany('''
+            UPDATE produtos
+            SET estoque_minimo_sugerido = ?, data_sugestao_minimo = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', zip(sugestoes.tolist(), ids.tolist()))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(ids)
+
+
+def aplicar_sugestoes(conn, produto_ids):
+    """Copia o estoque mínimo sugerido para estoque_minimo nos produtos informados."""
+    try:
+        cursor = conn.executemany('''
+            UPDATE produtos
+            SET estoque_minimo = estoque_minimo_sugerido, data_atualizacao = CURRENT_TIMESTAMP
+            WHERE id = ? AND estoque_minimo_sugerido IS NOT NULL
+        ''', [(int(pid),) for pid in produto_ids])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return cursor.rowcount
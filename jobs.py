@@ -0,0 +1,443 @@
+# Execução de Tarefas em Segundo Plano
+# Operações demoradas (backup, exportação de relatórios, recálculo do estoque
+# mínimo) são registradas na tabela `tarefas` de instance/tarefas.db e
+# executadas fora da requisição: as de E/S em um pool de threads e as de CPU
+# em um pool de processos, fora do GIL dos workers web. A rota retorna na
+# hora com o id da tarefa; o andamento é consultado por polling e o arquivo
+# gerado fica disponível para download.
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+INSTANCE_DIR = os.path.join(BASE_DIR, 'instance')
+TAREFAS_DB = os.path.join(INSTANCE_DIR, 'tarefas.db')
+# Arquivos gerados pelas tarefas (um diretório por tarefa)
+RESULTADOS_DIR = os.path.join(INSTANCE_DIR, 'tarefas')
+
+THREADS_TAREFAS = 2
+PROCESSOS_TAREFAS = 2
+# Horas que uma tarefa finalizada (e seu arquivo) é mantida
+RETENCAO_HORAS = 24
+
+STATUS_FINAIS = ('concluida', 'erro', 'cancelada')
+
+# Registro das tarefas: tipo -> {'funcao', 'processo', 'titulo'}
+TIPOS = {}
+
+
+class TarefaCancelada(Exception):
+    """Cancelamento pedido pelo usuário durante a execução"""
+
+
+def tarefa(tipo, titulo, processo=False, retencao_horas=None):
+    """Registra a função como executora de `tipo`.
+
+    A função recebe o Contexto e os parâmetros da tarefa e retorna o caminho
+    do arquivo gerado (ou None). Com processo=True ela roda no pool de
+    processos e precisa ser uma função de módulo (serializável).
+    `retencao_horas` mantém o histórico desse tipo por mais (ou menos) tempo
+    que RETENCAO_HORAS.
+    """
+    def decorador(funcao):
+        TIPOS[tipo] = {'funcao': funcao, 'processo': processo, 'titulo': titulo,
+                       'retencao_horas': retencao_horas or RETENCAO_HORAS}
+        return funcao
+    return decorador
+
+
+def _conectar():
+    os.makedirs(INSTANCE_DIR, exist_ok=True)
+    conn = sqlite3.connect(TAREFAS_DB, timeout=30.0)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def _agora():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def inicializar_banco():
+    conn = _conectar()
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS tarefas (
+                id TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                parametros TEXT,
+                unidade_id TEXT,
+                usuario_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'pendente', -- pendente, executando, concluida, erro, cancelada
+                progresso INTEGER DEFAULT 0,
+                mensagem TEXT,
+                arquivo TEXT,
+                cancelar INTEGER DEFAULT 0,
+                data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+                data_inicio DATETIME,
+                data_fim DATETIME,
+                dono TEXT -- processo que enfileirou: '<pid>-<id de boot>'
+            )
+        ''')
+        colunas = {row['name'] for row in conn.execute('PRAGMA table_info(tarefas)')}
+        if 'dono' not in colunas:
+            try:
+                conn.execute('ALTER TABLE tarefas ADD COLUMN dono TEXT')
+            except sqlite3.OperationalError:
+                pass  # outro worker acabou de adicionar
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tarefas_usuario ON tarefas(usuario_id, data_criacao)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tarefas_status ON tarefas(status)')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _processo_vivo(pid):
+    """O processo `pid` ainda existe?"""
+    if os.name == 'nt':
+        # No Windows os.kill(pid, 0) envia CTRL_C_EVENT em vez de só testar
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            codigo = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(codigo))
+            return codigo.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _dono_ativo(dono):
+    """O processo que enfileirou a tarefa ainda está rodando? Um dono com o
+    pid deste processo e outro id de boot é de uma execução anterior."""
+    try:
+        pid = int(dono.split('-', 1)[0])
+    except (AttributeError, ValueError):
+        return False
+    return pid != os.getpid() and _processo_vivo(pid)
+
+
+class Contexto:
+    """Acesso da função executora à própria tarefa (serializável para processos)"""
+
+    def __init__(self, tarefa_id):
+        self.tarefa_id = tarefa_id
+        self.diretorio = os.path.join(RESULTADOS_DIR, tarefa_id)
+        # Mensagem final exibida quando a tarefa termina com sucesso
+        self.resumo = 'Concluída'
+        self._ultima_escrita = 0.0
+
+    def caminho(self, nome_arquivo):
+        os.makedirs(self.diretorio, exist_ok=True)
+        return os.path.join(self.diretorio, nome_arquivo)
+
+    def progresso(self, percentual, mensagem=None):
+        """Atualiza o andamento (no máximo a cada 0,5 s) e verifica cancelamento."""
+        agora = time.monotonic()
+        if agora - self._ultima_escrita < 0.5 and percentual < 100:
+            return
+        self._ultima_escrita = agora
+        conn = _conectar()
+        try:
+            conn.execute('UPDATE tarefas SET progresso = ?, mensagem = COALESCE(?, mensagem) WHERE id = ?',
+                         (int(percentual), mensagem, self.tarefa_id))
+            conn.commit()
+            cancelar = conn.execute('SELECT cancelar FROM tarefas WHERE id = ?', (self.tarefa_id,)).fetchone()[0]
+        finally:
+            conn.close()
+        if cancelar:
+            raise TarefaCancelada()
+
+
+def _executar(tipo, tarefa_id, parametros):
+    """Executa a tarefa e grava o resultado (roda na thread ou no processo)."""
+    conn = _conectar()
+    try:
+        cursor = conn.execute('''
+            UPDATE tarefas SET status = 'executando', data_inicio = ?
+            WHERE id = ? AND status = 'pendente' AND cancelar = 0
+        ''', (_agora(), tarefa_id))
+        conn.commit()
+        if cursor.rowcount == 0:
+            return
+
+        contexto = Contexto(tarefa_id)
+        try:
+            arquivo = TIPOS[tipo]['funcao'](contexto, **parametros)
+            status, mensagem = 'concluida', contexto.resumo
+        except TarefaCancelada:
+            arquivo, status, mensagem = None, 'cancelada', 'Cancelada pelo usuário'
+            shutil.rmtree(contexto.diretorio, ignore_errors=True)
+        except Exception as e:
+            arquivo, status, mensagem = None, 'erro', f'Erro: {e}'
+            shutil.rmtree(contexto.diretorio, ignore_errors=True)
+
+        conn.execute('''
+            UPDATE tarefas SET status = ?, mensagem = ?, arquivo = ?, data_fim = ?,
+                               progresso = CASE WHEN ? = 'concluida' THEN 100 ELSE progresso END
+            WHERE id = ?
+        ''', (status, mensagem, arquivo, _agora(), status, tarefa_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class GerenciadorTarefas:
+    """Fila de tarefas do processo web (pools criados no primeiro uso)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._threads = None
+        self._processos = None
+        self._futuros = {}
+        self._dono = None
+
+    def _iniciar(self):
+        if self._threads is not None:
+            return
+        inicializar_banco()
+        # Id de boot: distingue este processo de um anterior com o mesmo pid
+        self._dono = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.recuperar_interrompidas()
+        self._threads = ThreadPoolExecutor(max_workers=THREADS_TAREFAS, thread_name_prefix='tarefa')
+
+    def _pool_processos(self):
+        if self._processos is None:
+            # spawn: o processo filho não herda threads nem conexões abertas
+            self._processos = ProcessPoolExecutor(max_workers=PROCESSOS_TAREFAS,
+                                                  mp_context=multiprocessing.get_context('spawn'))
+        return self._processos
+
+    def enviar(self, tipo, parametros=None, unidade_id=None, usuario_id=None):
+        """Registra a tarefa e a coloca na fila. Retorna o id."""
+        if tipo not in TIPOS:
+            raise ValueError(f'Tipo de tarefa inválido: {tipo}')
+        parametros = parametros or {}
+        tarefa_id = uuid.uuid4().hex
+
+        with self._lock:
+            self._iniciar()
+            conn = _conectar()
+            try:
+                conn.execute('''
+                    INSERT INTO tarefas (id, tipo, parametros, unidade_id, usuario_id, mensagem, dono)
+                    VALUES (?, ?, ?, ?, ?, 'Na fila', ?)
+                ''', (tarefa_id, tipo, json.dumps(parametros), unidade_id, usuario_id, self._dono))
+                conn.commit()
+            finally:
+                conn.close()
+
+            pool = self._pool_processos() if TIPOS[tipo]['processo'] else self._threads
+            futuro = pool.submit(_executar, tipo, tarefa_id, parametros)
+            self._futuros[tarefa_id] = futuro
+            futuro.add_done_callback(lambda f, tid=tarefa_id: self._futuros.pop(tid, None))
+
+        self.recuperar_interrompidas()
+        self.limpar_antigas()
+        return tarefa_id
+
+    def obter(self, tarefa_id):
+        inicializar_banco()
+        conn = _conectar()
+        try:
+            row = conn.execute('SELECT * FROM tarefas WHERE id = ?', (tarefa_id,)).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row else None
+
+    def listar(self, usuario_id=None, limite=50, tipo=None):
+        inicializar_banco()
+        conn = _conectar()
+        try:
+            if tipo is not None:
+                rows = conn.execute('SELECT * FROM tarefas WHERE tipo = ? ORDER BY data_criacao DESC LIMIT ?',
+                                    (tipo, limite))
+            elif usuario_id is None:
+                rows = conn.execute('SELECT * FROM tarefas ORDER BY data_criacao DESC LIMIT ?', (limite,))
+            else:
+                rows = conn.execute('SELECT * FROM tarefas WHERE usuario_id = ? ORDER BY data_criacao DESC LIMIT ?',
+                                    (usuario_id, limite))
+            return [dict(row) for row in rows.fetchall()]
+        finally:
+            conn.close()
+
+    def cancelar(self, tarefa_id):
+        """Pede o cancelamento. Tarefas ainda na fila são canceladas na hora."""
+        conn = _conectar()
+        try:
+            conn.execute('UPDATE tarefas SET cancelar = 1 WHERE id = ?', (tarefa_id,))
+            conn.execute('''
+                UPDATE tarefas SET status = 'cancelada', mensagem = 'Cancelada pelo usuário', data_fim = ?
+                WHERE id = ? AND status = 'pendente'
+            ''', (_agora(), tarefa_id))
+            conn.commit()
+        finally:
+            conn.close()
+        futuro = self._futuros.get(tarefa_id)
+        if futuro:
+            futuro.cancel()
+
+    def recuperar_interrompidas(self):
+        """Marca como erro as tarefas na fila ou em execução cujo processo
+        (dono) parou. As dos outros workers vivos não são tocadas."""
+        conn = _conectar()
+        try:
+            donos = [row['dono'] for row in conn.execute('''
+                SELECT DISTINCT dono FROM tarefas WHERE status IN ('pendente', 'executando')
+            ''')]
+            parados = [dono for dono in donos if dono != self._dono and not _dono_ativo(dono)]
+            for dono in parados:
+                conn.execute('''
+                    UPDATE tarefas SET status = 'erro', mensagem = 'Interrompida (reinício do servidor)', data_fim = ?
+                    WHERE status IN ('pendente', 'executando') AND dono IS ?
+                ''', (_agora(), dono))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def limpar_antigas(self):
+        """Remove registros e arquivos de tarefas finalizadas há mais de
+        RETENCAO_HORAS (ou da retenção própria do tipo)."""
+        casos = ' WHEN ? THEN ?' * len(TIPOS)
+        parametros = list(STATUS_FINAIS)
+        for tipo, definicao in TIPOS.items():
+            parametros += [tipo, int(definicao['retencao_horas'])]
+        parametros.append(int(RETENCAO_HORAS))
+        conn = _conectar()
+        try:
+            antigas = [row['id'] for row in conn.execute(f'''
+                SELECT id FROM tarefas
+                WHERE status IN ({', '.join('?' * len(STATUS_FINAIS))})
+                  AND data_fim < datetime('now', '-' || (CASE tipo{casos} ELSE ? END) || ' hours')
+            ''', parametros)]
+            conn.executemany('DELETE FROM tarefas WHERE id = ?', [(tid,) for tid in antigas])
+            conn.commit()
+        finally:
+            conn.close()
+        for tarefa_id in antigas:
+            shutil.rmtree(os.path.join(RESULTADOS_DIR, tarefa_id), ignore_errors=True)
+
+
+# Instância global do gerenciador
+gerenciador_tarefas = GerenciadorTarefas()
+
+
+# ========================
+# TAREFAS REGISTRADAS
+# ========================
+
+@tarefa('backup', 'Backup completo')
+def tarefa_backup(contexto):
+    """Compacta a pasta instance com cópias consistentes dos bancos (backup.py)."""
+    from backup import gerar_zip
+
+    def progresso(posicao, total, nome):
+        contexto.progresso(posicao * 100 / total, f'{posicao} de {total} arquivos')
+
+    destino = contexto.caminho(f"backup_completo_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.zip")
+    with open(destino, 'wb') as arquivo:
+        for bloco in gerar_zip(progresso=progresso):
+            arquivo.write(bloco)
+    return destino
+
+
+@tarefa('backup_incremental', 'Backup incremental', retencao_horas=24 * 90)
+def tarefa_backup_incremental(contexto, bancos=None, retencao=True, lease=False):
+    """Snapshot de cada banco no armazém de blocos (backup_store.py), em pool
+    limitado e escalonado (backup_scheduler.py), e retenção. Com lease=True a
+    rodada foi disparada pelo agendador e solta o lease ao terminar."""
+    from backup_scheduler import agendador_backups
+
+    inicio = time.time()
+    try:
+        contexto.resumo = '; '.join(agendador_backups.executar(contexto, bancos, retencao))
+    finally:
+        if lease:
+            agendador_backups.liberar_lease(inicio)
+
+
+@tarefa('relatorio_csv', 'Exportação de relatório')
+def tarefa_relatorio_csv(contexto, unit_id, relatorio, parametros):
+    """Gera o relatório por período e grava em CSV."""
+    from database_manager import db_manager
+    from report_engine import gerar_relatorio
+
+    conn = db_manager.get_connection(unit_id, use_cache=False)
+    try:
+        contexto.progresso(10, 'Calculando relatório')
+        resultado = gerar_relatorio(conn, unit_id, relatorio, parametros)
+    finally:
+        conn.close()
+
+    destino = contexto.caminho(f"{relatorio}_{unit_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    with open(destino, 'w', newline='', encoding='utf-8-sig') as arquivo:
+        writer = csv.writer(arquivo, delimiter=';')
+        writer.writerow([rotulo for _, rotulo in resultado['colunas']])
+        writer.writerows(resultado['linhas'])
+    return destino
+
+
+@tarefa('estoque_minimo', 'Recálculo do estoque mínimo sugerido', processo=True)
+def tarefa_estoque_minimo(contexto, unit_id, **parametros):
+    """Previsão de demanda (NumPy) executada no pool de processos."""
+    from database_manager import db_manager
+    from forecasting import recalcular_estoque_minimo
+
+    conn = db_manager.get_connection(unit_id, use_cache=False)
+    try:
+        contexto.progresso(5, 'Carregando histórico de consumo')
+        total = recalcular_estoque_minimo(conn, **parametros)
+    finally:
+        conn.close()
+    contexto.resumo = f'Sugestões recalculadas para {total} produtos.'
+    return None
+
+
+@tarefa('classificacao', 'Classificação ABC/XYZ', processo=True)
+def tarefa_classificacao(contexto, unit_id, **parametros):
+    """Classificação ABC/XYZ (NumPy) executada no pool de processos."""
+    from classification import classificar_unidade
+    from database_manager import db_manager
+
+    conn = db_manager.get_connection(unit_id, use_cache=False)
+    try:
+        contexto.progresso(5, 'Carregando histórico de consumo')
+        resultado = classificar_unidade(conn, **parametros)
+    finally:
+        conn.close()
+    abc = ', '.join(f'{classe}: {qtd}' for classe, qtd in resultado['abc'].items())
+    xyz = ', '.join(f'{classe}: {qtd}' for classe, qtd in resultado['xyz'].items())
+    contexto.resumo = f"{resultado['produtos']} produtos classificados ({abc} | {xyz})."
+    return None
+
+
+@tarefa('analytics', 'Atualização da base analítica da rede')
+def tarefa_analytics(contexto):
+    """Carga incremental de todas as unidades em instance/analytics.db."""
+    from analytics import atualizar
+
+    resultados = atualizar(progresso=contexto.progresso)
+    erros = [unit_id for unit_id, r in resultados.items() if 'erro' in r]
+    carregadas = sum(r.get('movimentacoes', 0) for r in resultados.values())
+    contexto.resumo = f'{carregadas} movimentações carregadas de {len(resultados)} unidades.'
+    if erros:
+        contexto.resumo += f" Falha em: {', '.join(erros)}."
+    return None
@@ -0,0 +1,146 @@
+# Armazenamento Compartilhado do Rate Limiter
+# Backend do `limits` (usado pelo Flask-Limiter) sobre um arquivo SQLite
+# local: todos os processos do servidor (workers do gunicorn) contam no mesmo
+# lugar. Cada acerto é um único UPSERT ... RETURNING, atômico no SQLite, que
+# também reinicia a janela vencida. Registrado no esquema sqlite://, ex.:
+#   RATELIMIT_STORAGE_URI=sqlite:///instance/ratelimit.db  (relativo ao projeto)
+#   RATELIMIT_STORAGE_URI=sqlite:////var/lib/estoque/ratelimit.db
+# Também guarda as métricas de requisições rejeitadas por rota e por dia.
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+from limits.storage import Storage
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+# Intervalo (s) entre limpezas de contadores vencidos e linhas por lote
+INTERVALO_LIMPEZA = 60
+LOTE_LIMPEZA = 1000
+
+
+def caminho_do_uri(uri):
+    """sqlite:///relativo/ao/projeto.db ou sqlite:////caminho/absoluto.db"""
+    caminho = (uri or '').split('://', 1)[-1]
+    if caminho.startswith('/'):
+        caminho = caminho[1:]
+    if not caminho:
+        caminho = os.path.join('instance', 'ratelimit.db')
+    if not os.path.isabs(caminho):
+        caminho = os.path.join(BASE_DIR, caminho)
+    return caminho
+
+
+class ArmazenamentoLimitesSQLite(Storage):
+    """Contadores de janela fixa compartilhados entre processos"""
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.caminho = caminho_do_uri(uri)
+        self._local = threading.local()
+        self._proxima_limpeza = 0
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+            # Autocommit: cada comando é sua própria transação
+            conn = sqlite3.connect(self.caminho, timeout=30.0, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS limites (
+                    chave TEXT PRIMARY KEY,
+                    contador INTEGER NOT NULL,
+                    expira REAL NOT NULL
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_limites_expira ON limites(expira);
+                CREATE TABLE IF NOT EXISTS limites_rejeicoes (
+                    dia TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    limite TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    ultima REAL NOT NULL,
+                    PRIMARY KEY (dia, endpoint, limite)
+                ) WITHOUT ROWID;
+            ''')
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        agora = time.time()
+        conn = self._conexao()
+        contador = conn.execute('''
+            INSERT INTO limites (chave, contador, expira) VALUES (?1, ?2, ?3 + ?4)
+            ON CONFLICT(chave) DO UPDATE SET
+                contador = CASE WHEN expira <= ?3 THEN ?2 ELSE contador + ?2 END,
+                expira = CASE WHEN expira <= ?3 OR ?5 THEN ?3 + ?4 ELSE expira END
+            RETURNING contador
+        ''', (key, amount, agora, expiry, int(bool(elastic_expiry)))).fetchone()[0]
+        if agora >= self._proxima_limpeza:
+            self.limpar_vencidos()
+        return contador
+
+    def get(self, key):
+        linha = self._conexao().execute(
+            'SELECT contador FROM limites WHERE chave = ? AND expira > ?', (key, time.time())
+        ).fetchone()
+        return linha[0] if linha else 0
+
+    def get_expiry(self, key):
+        linha = self._conexao().execute('SELECT expira FROM limites WHERE chave = ?', (key,)).fetchone()
+        agora = time.time()
+        return linha[0] if linha and linha[0] > agora else agora
+
+    def check(self):
+        try:
+            self._conexao().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._conexao().execute('DELETE FROM limites').rowcount
+
+    def clear(self, key):
+        self._conexao().execute('DELETE FROM limites WHERE chave = ?', (key,))
+
+    def limpar_vencidos(self):
+        """Apaga contadores de janelas encerradas, em lotes."""
+        agora = time.time()
+        self._proxima_limpeza = agora + INTERVALO_LIMPEZA
+        conn = self._conexao()
+        while conn.execute('''
+            DELETE FROM limites WHERE chave IN (
+                SELECT chave FROM limites WHERE expira <= ? LIMIT ?
+            )
+        ''', (agora, LOTE_LIMPEZA)).rowcount == LOTE_LIMPEZA:
+            pass
+
+    # ── Métricas ───────────────────────────────────────────────────────────
+    def registrar_rejeicao(self, endpoint, limite):
+        """Conta uma requisição rejeitada (rota e limite que estourou)."""
+        self._conexao().execute('''
+            INSERT INTO limites_rejeicoes (dia, endpoint, limite, total, ultima) VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT(dia, endpoint, limite) DO UPDATE SET total = total + 1, ultima = excluded.ultima
+        ''', (date.today().isoformat(), endpoint or '-', limite, time.time()))
+
+    def rejeicoes(self, dias=7):
+        """Rejeições dos últimos `dias` dias, da rota mais barrada para a menos."""
+        inicio = (date.today() - timedelta(days=dias - 1)).isoformat()
+        cursor = self._conexao().execute('''
+            SELECT endpoint, limite, SUM(total) AS total, MAX(ultima) AS ultima,
+                   SUM(CASE WHEN dia = ? THEN total ELSE 0 END) AS hoje
+            FROM limites_rejeicoes WHERE dia >= ?
+            GROUP BY endpoint, limite ORDER BY total DESC
+        ''', (date.today().isoformat(), inicio))
+        colunas = [c[0] for c in cursor.description]
+        return [dict(zip(colunas, linha)) for linha in cursor]
@@ -1,7 +1,6 @@
 # Modelos SQLAlchemy
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timezone
-import json
 import ast
 
 db = SQLAlchemy()
@@ -12,6 +11,16 @@ MAX_TENTATIVAS_LOGIN = 5
 BLOQUEIO_MINUTOS = 15
 
 
+# Unidades que cada usuário (não admin) pode acessar. A chave primária atende
+# "unidades do usuário" e o índice inverso "usuários da unidade".
+usuario_unidade = db.Table(
+    'usuario_unidade',
+    db.Column('usuario_id', db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('unidade_id', db.String(50), db.ForeignKey('unidades.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('idx_usuario_unidade_unidade', 'unidade_id', 'usuario_id'),
+)
+
+
 class Usuario(db.Model):
     """Modelo de Usuário (banco central)"""
     __tablename__ = 'usuarios'
@@ -21,29 +30,42 @@ class Usuario(db.Model):
     matricula = db.Column(db.String(50), unique=True, nullable=True)
     senha = db.Column(db.String(255), nullable=False)
     tipo = db.Column(db.String(20), default='user')
-    unidades_acesso = db.Column(db.Text)
     pode_cadastrar = db.Column(db.Integer, default=1)
     permissoes_menu = db.Column(db.Text)
+    # Incrementada a cada alteração de tipo/permissões/unidades (routes.helpers.invalidar_permissoes)
+    versao_permissoes = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     ativo = db.Column(db.Integer, default=1)
     data_criacao = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     ultimo_login = db.Column(db.DateTime, nullable=True)
     # Proteção contra brute force
     tentativas_login = db.Column(db.Integer, default=0)
     bloqueado_ate = db.Column(db.DateTime, nullable=True)
+    # Mantido por triggers do banco (database_manager.upgrade_central_schema)
+    notificacoes_nao_lidas = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     def get_unidades_acesso(self):
-        """Lê a coluna unidades_acesso (JSON) e retorna uma lista de IDs."""
-        if not self.unidades_acesso or not self.unidades_acesso.strip():
+        """Lista os IDs das unidades liberadas para o usuário."""
+        if self.id is None:
             return []
-        try:
-            # A fonte de dados deve garantir que o formato é sempre um JSON válido.
-            return json.loads(self.unidades_acesso)
-        except json.JSONDecodeError:
-            return [] # Retorna lista vazia se o JSON for inválido
+        return db.session.execute(
+            db.select(usuario_unidade.c.unidade_id).where(usuario_unidade.c.usuario_id == self.id)
+        ).scalars().all()
+
+    def set_unidades_acesso(self, unidades):
+        """Substitui as unidades liberadas (o usuário precisa ter id)."""
+        db.session.execute(usuario_unidade.delete().where(usuario_unidade.c.usuario_id == self.id))
+        unidades = sorted(set(unidades or []))
+        if unidades:
+            db.session.execute(usuario_unidade.insert(),
+                               [{'usuario_id': self.id, 'unidade_id': u} for u in unidades])
     
     def pode_acessar_unidade(self, unit_id):
-        unidades = self.get_unidades_acesso()
-        return unit_id in unidades or self.tipo == 'admin'
+        if self.tipo == 'admin':
+            return True
+        return db.session.execute(
+            db.select(usuario_unidade.c.usuario_id).where(
+                usuario_unidade.c.usuario_id == self.id, usuario_unidade.c.unidade_id == unit_id)
+        ).first() is not None
     
     def is_admin(self):
         return self.tipo == 'admin'
@@ -106,12 +128,17 @@ class Sugestao(db.Model):
 class Notificacao(db.Model):
     """Modelo para notificações do sistema"""
     __tablename__ = 'notificacoes'
+    __table_args__ = (
+        db.Index('idx_notificacoes_usuario_lida_data', 'usuario_id', 'lida', 'data_criacao'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
     mensagem = db.Column(db.String(255), nullable=False)
     link = db.Column(db.String(255))
     lida = db.Column(db.Boolean, default=False, nullable=False)
     data_criacao = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Identifica o evento notificado (única por usuário, ver notifications.py)
+    chave_dedup = db.Column(db.String(120))
 
     usuario = db.relationship('Usuario', backref=db.backref('notificacoes', lazy='dynamic'))
 
@@ -0,0 +1,98 @@
+# Serviço de Notificações
+# Quem notifica só coloca (destinatários, mensagem) numa fila e segue; uma
+# thread grava as notificações pendentes em lote, com um único executemany
+# por lote no banco central. A chave de deduplicação (`chave_dedup`) é única
+# por usuário: o mesmo evento enviado de novo é ignorado pelo INSERT OR
+# IGNORE, sem consulta prévia. O contador de não lidas do usuário é mantido
+# pelos triggers da tabela.
+import atexit
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+
+from database_manager import db_manager
+
+# Mensagens gravadas por transação
+LOTE_NOTIFICACOES = 500
+TAMANHO_MENSAGEM = 255
+
+logger = logging.getLogger(__name__)
+
+
+class ServicoNotificacoes:
+    """Fila de notificações com gravação assíncrona em lote"""
+
+    def __init__(self):
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enviar(self, destinatarios, mensagem, link=None, chave=None):
+        """Enfileira a mesma mensagem para cada id de usuário em `destinatarios`.
+
+        `chave` identifica o evento (ex.: 'sugestao:12'): um usuário nunca
+        recebe duas notificações com a mesma chave.
+        """
+        destinatarios = {int(u) for u in destinatarios if u is not None}
+        if not destinatarios:
+            return
+        self._iniciar()
+        self._fila.put((destinatarios, mensagem[:TAMANHO_MENSAGEM], link, chave))
+
+    def aguardar(self):
+        """Bloqueia até que tudo o que foi enfileirado esteja gravado."""
+        if self._thread is not None:
+            self._fila.join()
+
+    def _iniciar(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._gravar_continuamente, name='notificacoes', daemon=True)
+                self._thread.start()
+                atexit.register(self.aguardar)
+
+    def _gravar_continuamente(self):
+        conn = db_manager.get_connection(None, use_cache=False)
+        while True:
+            lote = [self._fila.get()]
+            while len(lote) < LOTE_NOTIFICACOES:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.gravar(conn, lote)
+            except Exception:
+                logger.exception('Falha ao gravar %d notificações', len(lote))
+            finally:
+                for _ in lote:
+                    self._fila.task_done()
+
+    @staticmethod
+    def gravar(conn, lote):
+        """Grava [(destinatarios, mensagem, link, chave), ...] numa transação.
+
+        Retorna o número de notificações criadas (sem as deduplicadas).
+        """
+        # Mesmo formato de data do SQLAlchemy (coluna DateTime)
+        agora = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+        linhas = [(usuario_id, mensagem, link, agora, chave)
+                  for destinatarios, mensagem, link, chave in lote
+                  for usuario_id in destinatarios]
+        try:
+            cursor = conn.executemany('''
+                INSERT OR IGNORE INTO notificacoes (usuario_id, mensagem, link, lida, data_criacao, chave_dedup)
+                VALUES (?, ?, ?, 0, ?, ?)
+            ''', linhas)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return cursor.rowcount
+
+
+# Instância global do serviço
+servico_notificacoes = ServicoNotificacoes()
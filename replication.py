@@ -0,0 +1,371 @@
+# Replicação para Standby (opcional, REPLICA_DIR)
+# Mantém em outro disco/montagem uma cópia de cada banco (central e
+# unidades), com o mesmo nome de arquivo da pasta instance. A cada ciclo:
+#
+# 1. Detecta alteração pelo tamanho/mtime do banco e do -wal (só stat, sem
+#    abrir o banco). Banco parado não custa nada.
+# 2. Alterado: instantâneo consistente com a API de backup (leitor WAL, não
+#    bloqueia os escritores) em um temporário local.
+# 3. Compara página a página com os hashes da cópia standby e grava só as
+#    páginas diferentes: primeiro em um arquivo .diff no standby (com fsync),
+#    depois aplicadas no lugar. Se o processo cair no meio, o .diff completo
+#    é reaplicado no próximo ciclo ou na promoção; um .diff incompleto é
+#    descartado e o standby continua no estado anterior.
+#
+# O caminho de escrita das unidades não muda; todo o custo fica na thread
+# de replicação. Só um processo replica por vez (lease em tarefas.db).
+# O atraso de cada banco é o tempo desde o instantâneo aplicado, quando o
+# banco de origem mudou depois dele (zero quando não mudou).
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from backup import INSTANCE_DIR, copiar_banco
+from backup_scheduler import Lease
+from backup_store import bancos_para_backup, caminho_do_banco
+
+logger = logging.getLogger(__name__)
+
+# Unidade de comparação (página padrão do SQLite)
+TAMANHO_PAGINA = 4096
+INTERVALO_REPLICACAO = 30
+NOME_LEASE = 'replicacao'
+
+# Formato do .diff: MAGICO, registros (deslocamento u64, tamanho u32, dados),
+# registro final (FIM_DIFF, 0) seguido do tamanho final do arquivo (u64)
+MAGICO = b'ESTQDIFF1'
+REGISTRO = struct.Struct('>QI')
+FIM_DIFF = 2 ** 64 - 1
+TAMANHO_FINAL = struct.Struct('>Q')
+
+
+class DiffIncompleto(Exception):
+    """Arquivo .diff truncado (gravação interrompida)"""
+
+
+def assinatura(caminho):
+    """Tamanho e mtime do banco e do -wal: muda a cada commit."""
+    partes = []
+    for sufixo in ('', '-wal'):
+        try:
+            st = os.stat(caminho + sufixo)
+            partes.append(f'{st.st_size}:{st.st_mtime_ns}')
+        except FileNotFoundError:
+            partes.append('-')
+    return '|'.join(partes)
+
+
+def _hash_pagina(pagina):
+    return hashlib.blake2b(pagina, digest_size=16).digest()
+
+
+def _fsync(caminho):
+    with open(caminho, 'rb') as arquivo:
+        os.fsync(arquivo.fileno())
+
+
+def _temporario(standby, sufixo):
+    """Arquivo temporário do standby exclusivo deste processo."""
+    return f'{standby}.{os.getpid()}{sufixo}'
+
+
+def _ler_diff(caminho):
+    """Valida o .diff inteiro e retorna (registros [(deslocamento, posição dos dados, tamanho)], tamanho final)."""
+    registros = []
+    with open(caminho, 'rb') as diff:
+        if diff.read(len(MAGICO)) != MAGICO:
+            raise DiffIncompleto(caminho)
+        while True:
+            cabecalho = diff.read(REGISTRO.size)
+            if len(cabecalho) < REGISTRO.size:
+                raise DiffIncompleto(caminho)
+            deslocamento, tamanho = REGISTRO.unpack(cabecalho)
+            if deslocamento == FIM_DIFF:
+                final = diff.read(TAMANHO_FINAL.size)
+                if len(final) < TAMANHO_FINAL.size:
+                    raise DiffIncompleto(caminho)
+                return registros, TAMANHO_FINAL.unpack(final)[0]
+            registros.append((deslocamento, diff.tell(), tamanho))
+            diff.seek(tamanho, os.SEEK_CUR)
+            if diff.tell() > os.fstat(diff.fileno()).st_size:
+                raise DiffIncompleto(caminho)
+
+
+class Replicador:
+    """Cópia standby incremental (por página) dos bancos da instance"""
+
+    def __init__(self, diretorio=None, intervalo=INTERVALO_REPLICACAO):
+        self.diretorio = None
+        self.intervalo = intervalo
+        self.lease = Lease(NOME_LEASE)
+        # banco -> (assinatura do arquivo standby, hashes das páginas)
+        self._hashes = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._parar = threading.Event()
+        self.configurar(diretorio, intervalo)
+
+    def configurar(self, diretorio, intervalo=None):
+        self.diretorio = os.path.abspath(diretorio) if diretorio else None
+        if intervalo:
+            self.intervalo = intervalo
+            self.lease.duracao = max(120, intervalo * 4)
+
+    @property
+    def ativo(self):
+        return bool(self.diretorio)
+
+    # ── Estado (replicacao.db no standby) ──────────────────────────────────
+    def _conectar(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(self.diretorio, 'replicacao.db'), timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS bancos (
+                banco TEXT PRIMARY KEY,
+                arquivo TEXT NOT NULL,
+                assinatura TEXT,
+                sincronizado_em REAL,
+                verificado_em REAL,
+                tamanho INTEGER,
+                paginas_enviadas INTEGER,
+                bytes_enviados INTEGER,
+                duracao REAL
+            )
+        ''')
+        return conn
+
+    def caminho_standby(self, arquivo):
+        return os.path.join(self.diretorio, arquivo)
+
+    def estado(self):
+        """Situação de cada banco replicado, com o atraso atual em segundos."""
+        conn = self._conectar()
+        try:
+            linhas = [dict(r) for r in conn.execute('SELECT * FROM bancos ORDER BY banco')]
+        finally:
+            conn.close()
+        agora = time.time()
+        for linha in linhas:
+            origem = caminho_do_banco(linha['banco'])
+            if not origem or not os.path.exists(origem):
+                linha['atraso'] = None
+            elif assinatura(origem) == linha['assinatura']:
+                linha['atraso'] = 0.0
+            else:
+                linha['atraso'] = round(agora - linha['sincronizado_em'], 1)
+        return linhas
+
+    # ── Diferença por página ───────────────────────────────────────────────
+    def _hashes_standby(self, banco, standby):
+        """Hashes das páginas da cópia standby (do cache, se o arquivo não mudou)."""
+        if not os.path.exists(standby):
+            return []
+        em_cache = self._hashes.get(banco)
+        if em_cache and em_cache[0] == assinatura(standby):
+            return em_cache[1]
+        hashes = []
+        with open(standby, 'rb') as arquivo:
+            while pagina := arquivo.read(TAMANHO_PAGINA):
+                hashes.append(_hash_pagina(pagina))
+        return hashes
+
+    def _aplicar_pendente(self, standby):
+        """Conclui (ou descarta, se incompleto) um .diff deixado por um ciclo interrompido."""
+        if os.path.exists(_temporario(standby, '.diff.tmp')):
+            os.remove(_temporario(standby, '.diff.tmp'))
+        diff = standby + '.diff'
+        if not os.path.exists(diff):
+            return False
+        try:
+            registros, tamanho_final = _ler_diff(diff)
+        except DiffIncompleto:
+            logger.warning('Diff incompleto descartado: %s', diff)
+            os.remove(diff)
+            return False
+        modo = 'r+b' if os.path.exists(standby) else 'w+b'
+        with open(diff, 'rb') as origem, open(standby, modo) as destino:
+            for deslocamento, posicao, tamanho in registros:
+                origem.seek(posicao)
+                destino.seek(deslocamento)
+                destino.write(origem.read(tamanho))
+            destino.truncate(tamanho_final)
+            destino.flush()
+            os.fsync(destino.fileno())
+        os.remove(diff)
+        return True
+
+    def _gravar_diferenca(self, banco, instantaneo, standby):
+        """Grava e aplica as páginas do instantâneo que diferem do standby.
+        Retorna (páginas enviadas, bytes enviados)."""
+        anteriores = self._hashes_standby(banco, standby)
+        novos = []
+        enviadas = 0
+        temporario = _temporario(standby, '.diff.tmp')
+        with open(instantaneo, 'rb') as fonte, open(temporario, 'wb') as diff:
+            diff.write(MAGICO)
+            deslocamento = 0
+            while pagina := fonte.read(TAMANHO_PAGINA):
+                hash_pagina = _hash_pagina(pagina)
+                indice = deslocamento // TAMANHO_PAGINA
+                if indice >= len(anteriores) or anteriores[indice] != hash_pagina:
+                    diff.write(REGISTRO.pack(deslocamento, len(pagina)))
+                    diff.write(pagina)
+                    enviadas += 1
+                novos.append(hash_pagina)
+                deslocamento += len(pagina)
+            diff.write(REGISTRO.pack(FIM_DIFF, 0))
+            diff.write(TAMANHO_FINAL.pack(deslocamento))
+            diff.flush()
+            os.fsync(diff.fileno())
+            bytes_enviados = diff.tell()
+
+        if enviadas == 0 and len(novos) == len(anteriores):
+            os.remove(temporario)
+            return 0, 0
+        os.replace(temporario, standby + '.diff')
+        self._aplicar_pendente(standby)
+        self._hashes[banco] = (assinatura(standby), novos)
+        return enviadas, bytes_enviados
+
+    # ── Sincronização ──────────────────────────────────────────────────────
+    def sincronizar(self, banco, forcar=False):
+        """Atualiza o standby do banco se a origem mudou. Retorna o registro
+        gravado ou None quando não havia o que enviar."""
+        origem = caminho_do_banco(banco)
+        if not origem or not os.path.exists(origem):
+            return None
+        arquivo = os.path.basename(origem)
+        standby = self.caminho_standby(arquivo)
+
+        with self._lock:
+            conn = self._conectar()
+            try:
+                anterior = conn.execute('SELECT * FROM bancos WHERE banco = ?', (banco,)).fetchone()
+                # Antes do instantâneo: um commit durante a cópia muda a
+                # assinatura e força outro envio no próximo ciclo
+                atual = assinatura(origem)
+                self._aplicar_pendente(standby)
+                if not forcar and anterior and anterior['assinatura'] == atual and os.path.exists(standby):
+                    conn.execute('UPDATE bancos SET verificado_em = ? WHERE banco = ?', (time.time(), banco))
+                    return None
+
+                inicio = time.time()
+                cronometro = time.perf_counter()
+                fd, instantaneo = tempfile.mkstemp(suffix='.db', prefix='replica_')
+                os.close(fd)
+                try:
+                    copiar_banco(origem, instantaneo)
+                    tamanho = os.path.getsize(instantaneo)
+                    if not os.path.exists(standby):
+                        # Primeira cópia: arquivo inteiro, trocado de uma vez
+                        temporario = _temporario(standby, '.tmp')
+                        shutil.copyfile(instantaneo, temporario)
+                        _fsync(temporario)
+                        os.replace(temporario, standby)
+                        self._hashes.pop(banco, None)
+                        enviadas, enviados = -(-tamanho // TAMANHO_PAGINA), tamanho
+                    else:
+                        enviadas, enviados = self._gravar_diferenca(banco, instantaneo, standby)
+                finally:
+                    os.remove(instantaneo)
+
+                registro = {
+                    'banco': banco, 'arquivo': arquivo, 'assinatura': atual, 'sincronizado_em': inicio,
+                    'verificado_em': time.time(), 'tamanho': tamanho, 'paginas_enviadas': enviadas,
+                    'bytes_enviados': enviados, 'duracao': round(time.perf_counter() - cronometro, 3),
+                }
+                conn.execute('''
+                    INSERT OR REPLACE INTO bancos (banco, arquivo, assinatura, sincronizado_em, verificado_em,
+                                                   tamanho, paginas_enviadas, bytes_enviados, duracao)
+                    VALUES (:banco, :arquivo, :assinatura, :sincronizado_em, :verificado_em,
+                            :tamanho, :paginas_enviadas, :bytes_enviados, :duracao)
+                ''', registro)
+                return registro
+            finally:
+                conn.close()
+
+    def ciclo(self):
+        """Sincroniza o banco central e todas as unidades. Retorna os registros enviados.
+
+        Deve ser chamado com o lease. Ele é renovado a cada banco (a primeira
+        cópia ou um ciclo com muitas unidades pode passar da validade), e o
+        ciclo para se o lease tiver sido perdido para outro processo.
+        """
+        enviados = []
+        for banco in bancos_para_backup():
+            try:
+                registro = self.sincronizar(banco)
+            except Exception:
+                logger.exception('Falha ao replicar %s', banco)
+                registro = None
+            if registro:
+                enviados.append(registro)
+            if not self.lease.renovar():
+                logger.warning('Lease de replicação perdido; ciclo interrompido após %s', banco)
+                break
+        return enviados
+
+    # ── Thread ─────────────────────────────────────────────────────────────
+    def _laco(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                if self.lease.renovar() or self.lease.adquirir():
+                    self.ciclo()
+            except Exception:
+                logger.exception('Falha no ciclo de replicação')
+
+    def iniciar(self):
+        if self._thread is None and self.ativo:
+            self._thread = threading.Thread(target=self._laco, name='replicacao', daemon=True)
+            self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self.lease.liberar()
+
+    # ── Promoção ───────────────────────────────────────────────────────────
+    def promover(self, banco, destino_dir=INSTANCE_DIR):
+        """Torna a cópia standby o banco em uso em `destino_dir`.
+
+        O banco atual (e seus -wal/-shm) é renomeado para *.antes_promocao_<data>.
+        Deve ser feito com o servidor parado. Retorna o caminho promovido.
+        """
+        conn = self._conectar()
+        try:
+            linha = conn.execute('SELECT arquivo FROM bancos WHERE banco = ?', (banco,)).fetchone()
+        finally:
+            conn.close()
+        if linha is None:
+            raise FileNotFoundError(f'Banco {banco} não tem cópia standby')
+        standby = self.caminho_standby(linha['arquivo'])
+        self._aplicar_pendente(standby)
+
+        verificacao = sqlite3.connect(f'file:{standby}?mode=ro', uri=True)
+        try:
+            resultado = verificacao.execute('PRAGMA quick_check').fetchone()[0]
+        finally:
+            verificacao.close()
+        if resultado != 'ok':
+            raise sqlite3.DatabaseError(f'Standby de {banco} com erro: {resultado}')
+
+        destino = os.path.join(destino_dir, linha['arquivo'])
+        marca = datetime.now().strftime('%Y%m%d%H%M%S')
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(destino + sufixo):
+                os.replace(destino + sufixo, f'{destino}.antes_promocao_{marca}{sufixo}')
+        shutil.copyfile(standby, destino + '.tmp')
+        _fsync(destino + '.tmp')
+        os.replace(destino + '.tmp', destino)
+        return destino
+
+
+# Instância global (ativada por REPLICA_DIR)
+replicador = Replicador()
@@ -0,0 +1,293 @@
+# Motor de Relatórios por Período
+# Relatórios parametrizados sobre as movimentações da unidade, calculados no
+# SQLite com funções de agregação e de janela. O resultado fica em cache por
+# (unidade, relatório, parâmetros, versão dos dados): enquanto as tabelas
+# envolvidas não mudam, novas visualizações não executam nenhuma consulta
+# além da leitura de versao_dados.
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+
+from database_manager import get_versao_dados
+
+# Quantidade máxima de resultados mantidos em memória (LRU)
+CACHE_MAXIMO = 256
+
+AGRUPAMENTOS = {
+    'dia': "date(m.data_movimentacao)",
+    'semana': "date(m.data_movimentacao, 'weekday 0', '-6 days')",
+    'mes': "strftime('%Y-%m', m.data_movimentacao)",
+}
+
+PARAMETROS_PADRAO = {
+    'dias': 30,
+    'agrupamento': 'dia',
+    'limite': 20,
+}
+
+_FILTRO_PERIODO = "m.data_movimentacao >= :inicio AND m.data_movimentacao < date(:fim, '+1 day')"
+# Classificação ABC/XYZ do produto ('' = todas)
+_FILTRO_CLASSE = "(:classe_abc = '' OR p.classe_abc = :classe_abc) AND (:classe_xyz = '' OR p.classe_xyz = :classe_xyz)"
+
+
+def _consumo_periodo(params):
+    periodo = AGRUPAMENTOS[params['agrupamento']]
+    return f'''
+        SELECT periodo, total, movimentacoes,
+               SUM(total) OVER (ORDER BY periodo ROWS UNBOUNDED PRECEDING) AS acumulado,
+               ROUND(AVG(total) OVER (ORDER BY periodo ROWS BETWEEN 2 PRECEDING AND CURRENT ROW), 2) AS media_movel,
+               total - LAG(total) OVER (ORDER BY periodo) AS variacao
+        FROM (
+            SELECT {periodo} AS periodo, SUM(m.quantidade) AS total, COUNT(*) AS movimentacoes
+            FROM movimentacoes m
+            WHERE m.tipo = 'saida' AND {_FILTRO_PERIODO}
+            GROUP BY periodo
+        )
+        ORDER BY periodo
+    '''
+
+
+def _consumo_setor(params):
+    return f'''
+        SELECT RANK() OVER (ORDER BY total DESC) AS posicao, setor, total, movimentacoes, produtos,
+               ROUND(total * 100.0 / SUM(total) OVER (), 2) AS percentual
+        FROM (
+            SELECT COALESCE(NULLIF(TRIM(m.destino), ''), 'Não informado') AS setor,
+                   SUM(m.quantidade) AS total, COUNT(*) AS movimentacoes,
+                   COUNT(DISTINCT m.produto_id) AS produtos
+            FROM movimentacoes m
+            WHERE m.tipo = 'saida' AND {_FILTRO_PERIODO}
+            GROUP BY setor
+        )
+        ORDER BY posicao, setor
+    '''
+
+
+def _consumo_produto(params):
+    # Curva de Pareto: percentual acumulado do consumo em ordem decrescente
+    return f'''
+        SELECT RANK() OVER (ORDER BY c.total DESC) AS posicao, COALESCE(p.nome, 'Produto removido') AS produto,
+               c.total, c.movimentacoes, ROUND(c.total * 1.0 / :dias_periodo, 2) AS media_diaria,
+               ROUND(c.total * 100.0 / SUM(c.total) OVER (), 2) AS percentual,
+               ROUND(SUM(c.total) OVER (ORDER BY c.total DESC, c.produto_id ROWS UNBOUNDED PRECEDING) * 100.0
+                     / SUM(c.total) OVER (), 2) AS percentual_acumulado
+        FROM (
+            SELECT m.produto_id, SUM(m.quantidade) AS total, COUNT(*) AS movimentacoes
+            FROM movimentacoes m
+            WHERE m.tipo = 'saida' AND {_FILTRO_PERIODO}
+            GROUP BY m.produto_id
+        ) c
+        LEFT JOIN produtos p ON p.id = c.produto_id
+        WHERE {_FILTRO_CLASSE}
+        ORDER BY posicao, produto
+    '''
+
+
+def _matriz_abc_xyz(params):
+    # Produtos e consumo do período em cada combinação de classes
+    return f'''
+        SELECT COALESCE(p.classe_abc, '-') || COALESCE(p.classe_xyz, '-') AS classe,
+               COUNT(*) AS produtos, COALESCE(SUM(c.total), 0) AS total,
+               ROUND(COALESCE(SUM(c.total), 0) * 100.0 / NULLIF(SUM(SUM(c.total)) OVER (), 0), 2) AS percentual,
+               SUM(p.quantidade <= p.estoque_minimo) AS abaixo_minimo
+        FROM produtos p
+        LEFT JOIN (
+            SELECT m.produto_id, SUM(m.quantidade) AS total
+            FROM movimentacoes m
+            WHERE m.tipo = 'saida' AND {_FILTRO_PERIODO}
+            GROUP BY m.produto_id
+        ) c ON c.produto_id = p.id
+        WHERE p.ativo = 1 AND {_FILTRO_CLASSE}
+        GROUP BY classe
+        ORDER BY classe
+    '''
+
+
+def _top_movimentados(params):
+    return f'''
+        SELECT * FROM (
+            SELECT ROW_NUMBER() OVER (ORDER BY SUM(m.quantidade) DESC, m.produto_id) AS posicao,
+                   COALESCE(p.nome, 'Produto removido') AS produto,
+                   SUM(CASE WHEN m.tipo = 'entrada' THEN m.quantidade ELSE 0 END) AS entradas,
+                   SUM(CASE WHEN m.tipo = 'saida' THEN m.quantidade ELSE 0 END) AS saidas,
+                   SUM(m.quantidade) AS volume, COUNT(*) AS movimentacoes
+            FROM movimentacoes m
+            LEFT JOIN produtos p ON p.id = m.produto_id
+            WHERE {_FILTRO_PERIODO}
+            GROUP BY m.produto_id
+        )
+        WHERE posicao <= :limite
+        ORDER BY posicao
+    '''
+
+
+def _entradas_saidas(params):
+    periodo = AGRUPAMENTOS[params['agrupamento']]
+    return f'''
+        SELECT periodo, entradas, saidas, entradas - saidas AS saldo,
+               SUM(entradas - saidas) OVER (ORDER BY periodo ROWS UNBOUNDED PRECEDING) AS saldo_acumulado
+        FROM (
+            SELECT {periodo} AS periodo,
+                   SUM(CASE WHEN m.tipo = 'entrada' THEN m.quantidade ELSE 0 END) AS entradas,
+                   SUM(CASE WHEN m.tipo = 'saida' THEN m.quantidade ELSE 0 END) AS saidas
+            FROM movimentacoes m
+            WHERE {_FILTRO_PERIODO}
+            GROUP BY periodo
+        )
+        ORDER BY periodo
+    '''
+
+
+# Catálogo de relatórios:
+# - colunas: (chave, rótulo) na ordem do SELECT
+# - tabelas: tabelas cuja versão invalida o resultado
+# - parametros: parâmetros além do período que alteram o resultado
+RELATORIOS = {
+    'consumo_periodo': {
+        'titulo': 'Consumo por período',
+        'sql': _consumo_periodo,
+        'colunas': [('periodo', 'Período'), ('total', 'Saídas'), ('movimentacoes', 'Movimentações'),
+                    ('acumulado', 'Acumulado'), ('media_movel', 'Média móvel (3)'), ('variacao', 'Variação')],
+        'tabelas': ('movimentacoes',),
+        'parametros': ('agrupamento',),
+    },
+    'consumo_setor': {
+        'titulo': 'Consumo por setor',
+        'sql': _consumo_setor,
+        'colunas': [('posicao', '#'), ('setor', 'Setor'), ('total', 'Saídas'), ('movimentacoes', 'Movimentações'),
+                    ('produtos', 'Produtos'), ('percentual', '% do total')],
+        'tabelas': ('movimentacoes',),
+        'parametros': (),
+    },
+    'consumo_produto': {
+        'titulo': 'Consumo por produto',
+        'sql': _consumo_produto,
+        'colunas': [('posicao', '#'), ('produto', 'Produto'), ('total', 'Saídas'), ('movimentacoes', 'Movimentações'),
+                    ('media_diaria', 'Média diária'), ('percentual', '% do total'),
+                    ('percentual_acumulado', '% acumulado')],
+        'tabelas': ('movimentacoes', 'produtos'),
+        'parametros': ('classe',),
+    },
+    'matriz_abc_xyz': {
+        'titulo': 'Matriz ABC/XYZ',
+        'sql': _matriz_abc_xyz,
+        'colunas': [('classe', 'Classe'), ('produtos', 'Produtos'), ('total', 'Saídas'),
+                    ('percentual', '% do total'), ('abaixo_minimo', 'Abaixo do mínimo')],
+        'tabelas': ('movimentacoes', 'produtos'),
+        'parametros': ('classe',),
+    },
+    'top_movimentados': {
+        'titulo': 'Produtos mais movimentados',
+        'sql': _top_movimentados,
+        'colunas': [('posicao', '#'), ('produto', 'Produto'), ('entradas', 'Entradas'), ('saidas', 'Saídas'),
+                    ('volume', 'Volume'), ('movimentacoes', 'Movimentações')],
+        'tabelas': ('movimentacoes', 'produtos'),
+        'parametros': ('limite',),
+    },
+    'entradas_saidas': {
+        'titulo': 'Entradas x saídas',
+        'sql': _entradas_saidas,
+        'colunas': [('periodo', 'Período'), ('entradas', 'Entradas'), ('saidas', 'Saídas'),
+                    ('saldo', 'Saldo'), ('saldo_acumulado', 'Saldo acumulado')],
+        'tabelas': ('movimentacoes',),
+        'parametros': ('agrupamento',),
+    },
+}
+
+
+class RelatorioCache:
+    """Cache LRU de resultados, seguro entre threads"""
+
+    def __init__(self, maximo=CACHE_MAXIMO):
+        self.maximo = maximo
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            if chave not in self._itens:
+                return None
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+cache_relatorios = RelatorioCache()
+
+
+def normalizar_parametros(relatorio, parametros):
+    """Valida os parâmetros recebidos (ex.: request.args) e aplica os padrões.
+
+    Retorna apenas o que influencia o relatório, com o período já resolvido
+    em datas, para servir de chave do cache.
+    """
+    if relatorio not in RELATORIOS:
+        raise ValueError(f'Relatório inválido: {relatorio}')
+
+    # Datas gravadas com CURRENT_TIMESTAMP (UTC)
+    hoje = datetime.now(timezone.utc).date()
+    try:
+        fim = date.fromisoformat(parametros.get('data_fim') or hoje.isoformat())
+        inicio = date.fromisoformat(parametros.get('data_inicio') or
+                                    (fim - timedelta(days=PARAMETROS_PADRAO['dias'] - 1)).isoformat())
+    except ValueError:
+        raise ValueError('Datas inválidas: use o formato AAAA-MM-DD.')
+    if inicio > fim:
+        inicio, fim = fim, inicio
+
+    normalizados = {'inicio': inicio.isoformat(), 'fim': fim.isoformat()}
+    extras = RELATORIOS[relatorio]['parametros']
+    if 'agrupamento' in extras:
+        agrupamento = parametros.get('agrupamento') or PARAMETROS_PADRAO['agrupamento']
+        normalizados['agrupamento'] = agrupamento if agrupamento in AGRUPAMENTOS else PARAMETROS_PADRAO['agrupamento']
+    if 'limite' in extras:
+        try:
+            limite = int(parametros.get('limite') or PARAMETROS_PADRAO['limite'])
+        except (TypeError, ValueError):
+            limite = PARAMETROS_PADRAO['limite']
+        normalizados['limite'] = max(1, min(limite, 500))
+    if 'classe' in extras:
+        classe_abc = parametros.get('classe_abc') or ''
+        classe_xyz = parametros.get('classe_xyz') or ''
+        normalizados['classe_abc'] = classe_abc if classe_abc in ('A', 'B', 'C') else ''
+        normalizados['classe_xyz'] = classe_xyz if classe_xyz in ('X', 'Y', 'Z') else ''
+    return normalizados
+
+
+def gerar_relatorio(conn, unit_id, relatorio, parametros):
+    """Executa (ou lê do cache) o relatório para a unidade.
+
+    Retorna dict com titulo, colunas, linhas, parametros, versao e em_cache.
+    """
+    definicao = RELATORIOS[relatorio]
+    params = normalizar_parametros(relatorio, parametros)
+    versoes = get_versao_dados(conn, definicao['tabelas'])
+    chave = (unit_id, relatorio, tuple(sorted(params.items())), tuple(sorted(versoes.items())))
+
+    resultado = cache_relatorios.obter(chave)
+    if resultado is not None:
+        return dict(resultado, em_cache=True)
+
+    argumentos = dict(params)
+    argumentos['dias_periodo'] = (date.fromisoformat(params['fim']) - date.fromisoformat(params['inicio'])).days + 1
+    linhas = [tuple(row) for row in conn.execute(definicao['sql'](params), argumentos).fetchall()]
+    resultado = {
+        'relatorio': relatorio,
+        'titulo': definicao['titulo'],
+        'colunas': definicao['colunas'],
+        'linhas': linhas,
+        'parametros': params,
+        'versao': versoes,
+    }
+    cache_relatorios.guardar(chave, resultado)
+    return dict(resultado, em_cache=False)
@@ -5,5 +5,6 @@
 __all__ = [
     'auth_bp', 'main_bp', 'users_bp', 'units_bp',
     'products_bp', 'movements_bp', 'suppliers_bp',
-    'categories_bp', 'sectors_bp', 'settings_bp'
+    'categories_bp', 'sectors_bp', 'settings_bp',
+    'api_bp', 'catalog_bp'
 ]
@@ -0,0 +1,197 @@
+# API JSON (somente leitura) para integrações e leitores de código de barras
+# Respostas em formato compacto {"colunas": [...], "dados": [[...], ...]} com
+# ETag forte derivada do contador de alterações da unidade (versao_dados).
+# Quando o cliente envia If-None-Match com a versão atual, a resposta é
+# 304 Not Modified sem consultar as tabelas.
+import hashlib
+import json
+from functools import wraps
+from flask import Blueprint, Response, request, session
+from database_manager import get_versao_dados, normalizar_busca
+from routes.helpers import get_unit_db
+from extensions import limiter, LIMITE_BUSCA
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+LIMITE_PADRAO = 500
+LIMITE_MAXIMO = 5000
+
+# Autocomplete de produtos
+BUSCA_MIN_CARACTERES = 2
+BUSCA_LIMITE_PADRAO = 20
+BUSCA_LIMITE_MAXIMO = 50
+
+
+def _json(payload, status=200):
+    corpo = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str)
+    return Response(corpo, status=status, mimetype='application/json')
+
+
+def api_auth(f):
+    """Exige sessão autenticada com unidade selecionada (responde 401 em JSON)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return _json({'erro': 'Não autenticado'}, 401)
+        if 'unit_id' not in session:
+            return _json({'erro': 'Nenhuma unidade selecionada'}, 400)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _limite():
+    limite = request.args.get('limite', LIMITE_PADRAO, type=int)
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def _resposta_versionada(unit_db, tabelas, consulta):
+    """Responde com ETag/304 a partir das versões das `tabelas`.
+
+    `consulta` só é executada se a versão do cliente estiver desatualizada e
+    deve retornar (colunas, linhas).
+    """
+    versoes = get_versao_dados(unit_db, tabelas)
+    chave = '|'.join([
+        session['unit_id'],
+        request.path,
+        ','.join(f'{t}={versoes[t]}' for t in tabelas),
+        '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True))),
+    ])
+    etag = hashlib.sha1(chave.encode('utf-8')).hexdigest()
+
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        colunas, linhas = consulta()
+        resposta = _json({
+            'versao': versoes,
+            'colunas': colunas,
+            'dados': [list(row) for row in linhas],
+        })
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+
+def _executar(unit_db, query, params=()):
+    cursor = unit_db.execute(query, params)
+    colunas = [c[0] for c in cursor.description]
+    return colunas, cursor.fetchall()
+
+
+@api_bp.route('/produtos')
+@api_auth
+def produtos():
+    """Produtos ativos, em ordem de id (paginação por ?apos_id=&limite=)"""
+    unit_db = get_unit_db()
+    if not unit_db:
+        return _json({'erro': 'Erro ao conectar com o banco da unidade'}, 503)
+
+    apos_id = request.args.get('apos_id', 0, type=int)
+    limite = _limite()
+
+    def consulta():
+        return _executar(unit_db, '''
+            SELECT id, nome, descricao, quantidade, categoria, codigo_barras,
+                   unidade_medida, estoque_minimo, data_atualizacao
+            FROM produtos
+            WHERE ativo = 1 AND id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (apos_id, limite))
+
+    return _resposta_versionada(unit_db, ('produtos',), consulta)
+
+
+@api_bp.route('/produtos/busca')
+@limiter.limit(LIMITE_BUSCA)
+@api_auth
+def buscar_produtos():
+    """Autocomplete: produtos ativos cujo nome começa com ?q= (sem acentos).
+
+    A busca é um intervalo no índice (ativo, nome_busca), então o custo não
+    depende do tamanho do catálogo.
+    """
+    unit_db = get_unit_db()
+    if not unit_db:
+        return _json({'erro': 'Erro ao conectar com o banco da unidade'}, 503)
+
+    colunas = ['id', 'nome', 'quantidade', 'unidade_medida']
+    termo = normalizar_busca(request.args.get('q', ''))
+    if len(termo) < BUSCA_MIN_CARACTERES:
+        return _json({'colunas': colunas, 'dados': []})
+
+    limite = request.args.get('limite', BUSCA_LIMITE_PADRAO, type=int)
+    limite = max(1, min(limite, BUSCA_LIMITE_MAXIMO))
+
+    cursor = unit_db.execute('''
+        SELECT id, nome, quantidade, unidade_medida
+        FROM produtos
+        WHERE ativo = 1 AND nome_busca >= ? AND nome_busca < ?
+        ORDER BY nome_busca
+        LIMIT ?
+    ''', (termo, termo + '\uffff', limite))
+    resposta = _json({'colunas': colunas, 'dados': [list(row) for row in cursor.fetchall()]})
+    resposta.headers['Cache-Control'] = 'private, max-age=5'
+    return resposta
+
+
+@api_bp.route('/movimentacoes')
+@api_auth
+def movimentacoes():
+    """Movimentações mais recentes primeiro (paginação por ?antes_id=&limite=).
+
+    Aceita os mesmos filtros da listagem: tipo, produto_id, setor,
+    data_inicio e data_fim.
+    """
+    from routes.movements import _filtros_movimentacoes
+
+    unit_db = get_unit_db()
+    if not unit_db:
+        return _json({'erro': 'Erro ao conectar com o banco da unidade'}, 503)
+
+    where, params = _filtros_movimentacoes(request.args)
+    antes_id = request.args.get('antes_id', type=int)
+    if antes_id:
+        where += ' AND m.id < ?'
+        params.append(antes_id)
+    params.append(_limite())
+
+    def consulta():
+        return _executar(unit_db, '''
+            SELECT m.id, m.data_movimentacao, m.tipo, m.produto_id, p.nome AS produto_nome,
+                   m.quantidade, m.usuario_responsavel_id, m.origem, m.destino,
+                   m.nota_fiscal, m.ordem_servico, m.motivo
+            FROM movimentacoes m
+            LEFT JOIN produtos p ON m.produto_id = p.id
+        ''' + where + ' ORDER BY m.id DESC LIMIT ?', params)
+
+    return _resposta_versionada(unit_db, ('movimentacoes', 'produtos'), consulta)
+
+
+@api_bp.route('/setores')
+@api_auth
+def setores():
+    """Setores ativos"""
+    unit_db = get_unit_db()
+    if not unit_db:
+        return _json({'erro': 'Erro ao conectar com o banco da unidade'}, 503)
+
+    def consulta():
+        return _executar(unit_db, 'SELECT id, nome, descricao, responsavel FROM setores WHERE ativo = 1 ORDER BY nome')
+
+    return _resposta_versionada(unit_db, ('setores',), consulta)
+
+
+@api_bp.route('/fornecedores')
+@api_auth
+def fornecedores():
+    """Fornecedores ativos"""
+    unit_db = get_unit_db()
+    if not unit_db:
+        return _json({'erro': 'Erro ao conectar com o banco da unidade'}, 503)
+
+    def consulta():
+        return _executar(unit_db, 'SELECT id, nome, cnpj, telefone, email, endereco FROM fornecedores WHERE ativo = 1 ORDER BY nome')
+
+    return _resposta_versionada(unit_db, ('fornecedores',), consulta)
@@ -1,8 +1,9 @@
 # Rotas de Autenticação
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from werkzeug.security import generate_password_hash, check_password_hash
-from extensions import limiter
-import json
+from extensions import limiter, LIMITE_LOGIN, LIMITE_CADASTRO
+from server_sessions import regenerar_sessao
+from routes.helpers import eh_admin
 import re
 
 auth_bp = Blueprint('auth', __name__)
@@ -25,7 +26,7 @@ def _validar_senha_forte(senha: str) -> str | None:
 
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
-@limiter.limit('10 per minute')
+@limiter.limit(LIMITE_LOGIN)
 def login():
     """Rota de login - aceita email ou matrícula"""
     from app import db, Usuario
@@ -62,29 +63,15 @@ def login():
 
             # Proteção contra session fixation: limpar sessão antiga antes de popular
             session.clear()
+            regenerar_sessao(session)
             session.permanent = True
 
             session['user_id'] = usuario.id
             session['user_nome'] = usuario.nome
             session['user_email'] = usuario.email
             session['user_tipo'] = usuario.tipo
-            session['pode_cadastrar'] = getattr(usuario, 'pode_cadastrar', 1)
-
-            # Define as permissões de menu na sessão
-            if usuario.tipo == 'admin':
-                # Administradores sempre têm todas as permissões.
-                session['permissoes_menu'] = {
-                    'dashboard': True, 'produtos': True, 'movimentacoes': True,
-                    'usuarios': True, 'unidades': True, 'fornecedores': True,
-                    'setores': True, 'configuracoes': True, 'sugestoes': True,
-                    'relatorios': True, 'backup': True, 'logs': True
-                }
-            else:
-                # Usuários comuns carregam as permissões do banco de dados.
-                try:
-                    session['permissoes_menu'] = json.loads(usuario.permissoes_menu) if usuario.permissoes_menu else {}
-                except json.JSONDecodeError:
-                    session['permissoes_menu'] = {} # Em caso de JSON inválido, não concede permissões.
+            # Permissões de menu e unidades: compiladas sob demanda e mantidas
+            # em cache por versão (routes.helpers.obter_permissoes)
 
             flash(f'Bem-vindo, {usuario.nome}!', 'success')
             return redirect(url_for('main.selecionar_unidade'))
@@ -100,6 +87,7 @@ def login():
 
 
 @auth_bp.route('/cadastro', methods=['GET', 'POST'])
+@limiter.limit(LIMITE_CADASTRO, methods=['POST'])
 def cadastro():
     """Rota de cadastro de novo usuário"""
     from app import db, Usuario
@@ -143,7 +131,7 @@ def cadastro():
             db.session.rollback()
             flash('Erro ao cadastrar usuário!', 'danger')
 
-    unidades = get_all_units() if session.get('user_tipo') == 'admin' else {}
+    unidades = get_all_units() if eh_admin() else {}
     return render_template('cadastro.html', get_all_units=lambda: unidades)
 
 
@@ -151,5 +139,6 @@ def cadastro():
 def logout():
     """Rota de logout"""
     session.clear()
+    regenerar_sessao(session)
     flash('Você saiu do sistema!', 'info')
     return redirect(url_for('auth.login'))
@@ -0,0 +1,207 @@
+# Rotas do Catálogo Mestre de Produtos (banco central)
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
+from routes.helpers import login_required, get_unit_db, eh_admin
+
+catalog_bp = Blueprint('catalog', __name__, url_prefix='/catalogo')
+
+LIMITE_CATALOGO_PAGINA = 200
+
+
+def _somente_admin():
+    if not eh_admin():
+        flash('Acesso negado! Apenas administradores podem gerenciar o catálogo mestre.', 'danger')
+        return redirect(url_for('main.index'))
+    return None
+
+
+def _dados_formulario():
+    return {
+        'sku': request.form.get('sku', '').strip() or None,
+        'nome': request.form['nome'].strip(),
+        'descricao': request.form.get('descricao', '').strip() or None,
+        'categoria': request.form.get('categoria', '').strip() or None,
+        'codigo_barras': request.form.get('codigo_barras', '').strip() or None,
+        'unidade_medida': request.form.get('unidade_medida', 'un').strip() or 'un',
+        'estoque_minimo': int(request.form.get('estoque_minimo') or 5),
+        'ativo': 1 if request.form.get('ativo', '1') == '1' else 0,
+    }
+
+
+def _propagar(central):
+    """Envia as alterações às unidades assinantes e avisa sobre falhas."""
+    from catalog_sync import sincronizar_assinantes
+
+    for unit_id, resultado in sincronizar_assinantes(central).items():
+        if 'erro' in resultado:
+            current_app.logger.error(f"[catalogo] {resultado['erro']}")
+            flash(f'Falha ao sincronizar a unidade {unit_id}: {resultado["erro"]}', 'warning')
+
+
+@catalog_bp.route('')
+@login_required
+def catalogo():
+    """Itens do catálogo mestre e assinaturas das unidades"""
+    from catalog_sync import conectar_central
+    from database_config import get_all_units
+
+    negado = _somente_admin()
+    if negado:
+        return negado
+
+    busca = request.args.get('busca', '').strip()
+    central = conectar_central()
+    try:
+        query = 'SELECT * FROM catalogo_produtos'
+        params = []
+        if busca:
+            query += ' WHERE nome LIKE ? OR sku = ?'
+            params.extend([f'%{busca}%', busca])
+        query += ' ORDER BY nome LIMIT ?'
+        params.append(LIMITE_CATALOGO_PAGINA)
+        itens = central.execute(query, params).fetchall()
+
+        versao_atual = central.execute('SELECT COALESCE(MAX(versao), 0) FROM catalogo_produtos').fetchone()[0]
+        assinaturas = {row['unidade_id']: row for row in central.execute('SELECT * FROM catalogo_assinaturas')}
+    finally:
+        central.close()
+
+    unidades = []
+    for unit_id, config in sorted(get_all_units().items(), key=lambda x: x[1].get('name', '')):
+        assinatura = assinaturas.get(unit_id)
+        unidades.append({
+            'id': unit_id,
+            'nome': config.get('name', unit_id),
+            'assinante': bool(assinatura and assinatura['ativa']),
+            'versao': assinatura['versao_sincronizada'] if assinatura else None,
+            'data_sincronizacao': assinatura['data_sincronizacao'] if assinatura else None,
+        })
+
+    return render_template('catalogo.html', itens=itens, unidades=unidades, versao_atual=versao_atual,
+                           limite=LIMITE_CATALOGO_PAGINA)
+
+
+@catalog_bp.route('/novo', methods=['POST'])
+@login_required
+def novo_item():
+    """Cria item no catálogo e propaga às unidades assinantes"""
+    import sqlite3
+    from catalog_sync import conectar_central, salvar_produto
+
+    negado = _somente_admin()
+    if negado:
+        return negado
+
+    central = conectar_central()
+    try:
+        salvar_produto(central, _dados_formulario())
+        _propagar(central)
+        flash('Item cadastrado no catálogo!', 'success')
+    except sqlite3.IntegrityError:
+        flash('SKU já cadastrado no catálogo!', 'danger')
+    except ValueError:
+        flash('Estoque mínimo inválido!', 'danger')
+    finally:
+        central.close()
+    return redirect(url_for('catalog.catalogo'))
+
+
+@catalog_bp.route('/editar/<int:id>', methods=['GET', 'POST'])
+@login_required
+def editar_item(id):
+    """Edita item do catálogo (SKU é imutável) e propaga às unidades assinantes"""
+    from catalog_sync import conectar_central, salvar_produto
+
+    negado = _somente_admin()
+    if negado:
+        return negado
+
+    central = conectar_central()
+    try:
+        item = central.execute('SELECT * FROM catalogo_produtos WHERE id = ?', (id,)).fetchone()
+        if not item:
+            flash('Item não encontrado no catálogo!', 'danger')
+            return redirect(url_for('catalog.catalogo'))
+
+        if request.method == 'POST':
+            try:
+                salvar_produto(central, _dados_formulario(), produto_id=id)
+                _propagar(central)
+                flash('Item do catálogo atualizado!', 'success')
+                return redirect(url_for('catalog.catalogo'))
+            except ValueError:
+                flash('Estoque mínimo inválido!', 'danger')
+    finally:
+        central.close()
+
+    return render_template('editar_catalogo.html', item=item)
+
+
+@catalog_bp.route('/assinatura/<unit_id>', methods=['POST'])
+@login_required
+def alterar_assinatura(unit_id):
+    """Assina (com sincronização inicial) ou cancela o catálogo para a unidade"""
+    from catalog_sync import conectar_central, assinar, sincronizar_unidade
+
+    negado = _somente_admin()
+    if negado:
+        return negado
+
+    ativa = request.form.get('acao') == 'assinar'
+    central = conectar_central()
+    try:
+        assinar(central, unit_id, ativa)
+        if ativa:
+            resultado = sincronizar_unidade(central, unit_id)
+            flash(f"Unidade sincronizada: {resultado['inseridos']} produtos criados, "
+                  f"{resultado['atualizados']} atualizados.", 'success')
+        else:
+            flash('Assinatura do catálogo cancelada.', 'info')
+    except ValueError as e:
+        flash(str(e), 'danger')
+    finally:
+        central.close()
+    return redirect(url_for('catalog.catalogo'))
+
+
+@catalog_bp.route('/publicar', methods=['POST'])
+@login_required
+def publicar_unidade():
+    """Publica no catálogo os produtos da unidade atual que ainda não têm SKU global"""
+    from catalog_sync import conectar_central, publicar_produtos_unidade
+
+    negado = _somente_admin()
+    if negado:
+        return negado
+
+    unit_db = get_unit_db()
+    if not unit_db:
+        flash('Selecione uma unidade para publicar os produtos.', 'danger')
+        return redirect(url_for('catalog.catalogo'))
+
+    central = conectar_central()
+    try:
+        criados, ligados = publicar_produtos_unidade(central, unit_db)
+        _propagar(central)
+        flash(f'{criados} itens criados no catálogo; {ligados} produtos da unidade ligados a SKUs globais.', 'success')
+    finally:
+        central.close()
+    return redirect(url_for('catalog.catalogo'))
+
+
+@catalog_bp.route('/sincronizar', methods=['POST'])
+@login_required
+def sincronizar():
+    """Sincroniza agora todas as unidades assinantes atrasadas"""
+    from catalog_sync import conectar_central
+
+    negado = _somente_admin()
+    if negado:
+        return negado
+
+    central = conectar_central()
+    try:
+        _propagar(central)
+    finally:
+        central.close()
+    flash('Sincronização do catálogo concluída.', 'success')
+    return redirect(url_for('catalog.catalogo'))
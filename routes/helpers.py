@@ -1,8 +1,124 @@
 # Funções auxiliares compartilhadas entre os módulos de rotas
 # Evita duplicação de código em múltiplos arquivos
+import json
+import threading
+from collections import namedtuple
 from functools import wraps
 from flask import g, session, redirect, url_for, flash
 
+# Menus controlados por permissão, na ordem dos bits da máscara
+MENUS = ('dashboard', 'produtos', 'movimentacoes', 'setores', 'fornecedores', 'unidades',
+         'usuarios', 'sugestoes', 'relatorios', 'configuracoes', 'backup', 'logs')
+BIT_MENU = {menu: 1 << i for i, menu in enumerate(MENUS)}
+TODOS_MENUS = (1 << len(MENUS)) - 1
+# Menus liberados quando a permissão não foi gravada para o usuário
+MENUS_PADRAO = ('dashboard', 'produtos', 'movimentacoes')
+
+
+class Permissoes(namedtuple('Permissoes', 'versao admin pode_cadastrar menus unidades')):
+    """Permissões compiladas de um usuário (imutáveis).
+
+    `menus` é a máscara de bits de MENUS e `unidades` um frozenset com os IDs
+    das unidades liberadas; as verificações não dependem do JSON gravado.
+    """
+    __slots__ = ()
+
+    def menu(self, nome):
+        return bool(self.menus & BIT_MENU.get(nome, 0))
+
+    def pode_acessar_unidade(self, unit_id):
+        return self.admin or unit_id in self.unidades
+
+
+SEM_PERMISSAO = Permissoes(-1, False, False, 0, frozenset())
+
+# Cache por processo: user_id -> Permissoes. A entrada vale enquanto a versão
+# gravada no usuário (versao_permissoes) for a mesma.
+_permissoes_cache = {}
+_permissoes_lock = threading.Lock()
+
+
+def compilar_permissoes(usuario):
+    """Converte as colunas JSON do usuário em Permissoes."""
+    if usuario.tipo == 'admin':
+        return Permissoes(usuario.versao_permissoes or 0, True, True, TODOS_MENUS, frozenset())
+
+    try:
+        menus_json = json.loads(usuario.permissoes_menu) if usuario.permissoes_menu else {}
+    except (TypeError, ValueError):
+        menus_json = {}
+    menus = 0
+    for menu in MENUS:
+        if menus_json.get(menu, menu in MENUS_PADRAO):
+            menus |= BIT_MENU[menu]
+
+    return Permissoes(
+        usuario.versao_permissoes or 0,
+        False,
+        bool(usuario.pode_cadastrar),
+        menus,
+        frozenset(usuario.get_unidades_acesso()),
+    )
+
+
+def obter_permissoes(user_id=None):
+    """Permissões do usuário (padrão: o da sessão), com cache por versão.
+
+    Custa uma leitura da versão por chave primária por requisição; o JSON só
+    é lido de novo quando a versão muda (ver invalidar_permissoes).
+    """
+    from app import db, Usuario
+
+    if user_id is None:
+        if 'permissoes' in g:
+            return g.permissoes
+        user_id = session.get('user_id')
+        if not user_id:
+            return SEM_PERMISSAO
+        g.permissoes = obter_permissoes(user_id)
+        return g.permissoes
+
+    linha = db.session.query(Usuario.versao_permissoes, Usuario.ativo).filter_by(id=user_id).first()
+    if not linha or not linha.ativo:
+        return SEM_PERMISSAO
+    em_cache = _permissoes_cache.get(user_id)
+    if em_cache is not None and em_cache.versao == (linha.versao_permissoes or 0):
+        return em_cache
+
+    usuario = db.session.get(Usuario, user_id)
+    permissoes = compilar_permissoes(usuario)
+    with _permissoes_lock:
+        _permissoes_cache[user_id] = permissoes
+    return permissoes
+
+
+def invalidar_permissoes(usuario):
+    """Marca as permissões do usuário como alteradas (antes do commit).
+
+    O incremento da versão vale para todos os processos na próxima
+    requisição, sem esperar um novo login.
+    """
+    usuario.versao_permissoes = (usuario.versao_permissoes or 0) + 1
+    with _permissoes_lock:
+        _permissoes_cache.pop(usuario.id, None)
+    g.pop('permissoes', None)
+
+
+def pode_menu(nome):
+    """O usuário da sessão pode ver o menu `nome`?"""
+    return obter_permissoes().menu(nome)
+
+
+def eh_admin():
+    """O usuário da sessão é administrador? Lido das permissões compiladas
+    (não do tipo gravado na sessão), então um rebaixamento vale na hora."""
+    return obter_permissoes().admin
+
+
+def pode_acessar_unidade(unit_id):
+    """O usuário da sessão pode acessar a unidade?"""
+    return obter_permissoes().pode_acessar_unidade(unit_id)
+
 
 def get_unit_db():
     """Obtém conexão com o banco da unidade atual"""
@@ -37,17 +153,16 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return redirect(url_for('auth.login'))
-        from app import db, Usuario
         try:
-            usuario = db.session.get(Usuario, session['user_id'])
+            permissoes = obter_permissoes()
         except Exception:
-            usuario = None
+            permissoes = SEM_PERMISSAO
 
-        if not usuario:
+        if permissoes is SEM_PERMISSAO:
             flash('Acesso negado! Usuário inválido.', 'danger')
             return redirect(url_for('auth.login'))
 
-        if usuario.tipo != 'admin' and not getattr(usuario, 'pode_cadastrar', 0):
+        if not permissoes.pode_cadastrar:
             flash('Acesso negado! Apenas administradores ou usuários com permissão.', 'danger')
             return redirect(url_for('main.index'))
         return f(*args, **kwargs)
@@ -56,25 +171,12 @@ def admin_required(f):
 
 def check_permission():
     """Verifica permissão do usuário para cadastrar/editar"""
-    from app import db, Usuario
     from flask import current_app
     
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return False
-            
-        usuario = db.session.get(Usuario, user_id)
-        if not usuario:
-            return False
-        
-        tipo = usuario.tipo
-        pode = getattr(usuario, 'pode_cadastrar', 0)
-        
-        if tipo != 'admin' and not pode:
+        if not session.get('user_id'):
             return False
-            
-        return True
+        return obter_permissoes().pode_cadastrar
     except Exception as e:
         current_app.logger.error(f'check_permission: exception={str(e)}')
         return False
@@ -1,6 +1,6 @@
 # Rotas Principais - Dashboard e Seleção de Unidade
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from routes.helpers import get_unit_db
+from routes.helpers import get_unit_db, obter_permissoes, pode_acessar_unidade
 
 main_bp = Blueprint('main', __name__)
 
@@ -58,7 +58,6 @@ def index():
 @main_bp.route('/selecionar-unidade', methods=['GET', 'POST'])
 def selecionar_unidade():
     """Seleção de unidade"""
-    from app import db, Usuario
     from database_config import get_database_config, get_all_units
     from database_manager import db_manager
     
@@ -67,9 +66,8 @@ def selecionar_unidade():
     
     if request.method == 'POST':
         unit_id = request.form.get('unit_id')
-        usuario = db.session.get(Usuario, session['user_id'])
         
-        if not usuario.pode_acessar_unidade(unit_id):
+        if not pode_acessar_unidade(unit_id):
             flash('Você não tem permissão para acessar esta unidade', 'danger')
             return redirect(url_for('main.selecionar_unidade'))
         
@@ -88,17 +86,16 @@ def selecionar_unidade():
             flash('Erro ao conectar com a unidade', 'danger')
             return redirect(url_for('main.selecionar_unidade'))
     
-    usuario = db.session.get(Usuario, session['user_id'])
+    permissoes = obter_permissoes()
     
-    if usuario.is_admin():
+    if permissoes.admin:
         unidades = get_all_units()
     else:
-        unidades_permitidas = usuario.get_unidades_acesso()
         todas_unidades = get_all_units()
-        unidades = {k: v for k, v in todas_unidades.items() if k in unidades_permitidas}
+        unidades = {k: v for k, v in todas_unidades.items() if k in permissoes.unidades}
     
     # Se não houver unidades e for admin, redirecionar para criar uma
-    if not unidades and usuario.is_admin():
+    if not unidades and permissoes.admin:
         flash('Nenhuma unidade encontrada. Por favor, crie a primeira unidade do sistema.', 'info')
         return redirect(url_for('units.novo_unidade'))
     
@@ -108,7 +105,6 @@ def selecionar_unidade():
 @main_bp.route('/trocar-unidade')
 def trocar_unidade():
     """Remove unidade da sessão e redireciona para seleção ou alterna para outra unidade"""
-    from app import db, Usuario
     from database_config import get_database_config, get_all_units
     from database_manager import db_manager
     
@@ -117,9 +113,7 @@ def trocar_unidade():
     
     if proxima_unidade:
         # Trocar para a unidade especificada
-        usuario = db.session.get(Usuario, session['user_id'])
-        
-        if not usuario.pode_acessar_unidade(proxima_unidade):
+        if not pode_acessar_unidade(proxima_unidade):
             flash('Você não tem permissão para acessar esta unidade', 'danger')
             return redirect(url_for('main.selecionar_unidade'))
         
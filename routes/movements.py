@@ -1,9 +1,108 @@
 # Rotas de Movimentações
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
+from datetime import datetime
+import csv
+import io
 from routes.helpers import get_unit_db, check_permission
+from extensions import limiter, LIMITE_MOVIMENTACAO, LIMITE_LEITURA_CODIGO
+from stock_events import event_bus
+from stock_alerts import alertas_estoque, verificar as verificar_alerta
 
 movements_bp = Blueprint('movements', __name__, url_prefix='/movimentacoes')
 
+# Linhas lidas do cursor por vez na exportação CSV
+EXPORT_BATCH_SIZE = 1000
+
+
+def _filtros_movimentacoes(args):
+    """Monta a cláusula WHERE (e parâmetros) a partir dos filtros da listagem.
+
+    Datas (data_inicio/data_fim) no formato AAAA-MM-DD, ambas inclusivas.
+    """
+    where = ' WHERE 1=1'
+    params = []
+
+    tipo = args.get('tipo', '')
+    produto_id = args.get('produto_id', '')
+    setor = args.get('setor', '')
+    data_inicio = args.get('data_inicio', '')
+    data_fim = args.get('data_fim', '')
+
+    if tipo:
+        where += ' AND m.tipo = ?'
+        params.append(tipo)
+
+    if produto_id:
+        where += ' AND m.produto_id = ?'
+        params.append(produto_id)
+
+    if setor:
+        where += ' AND (m.origem LIKE ? OR m.destino LIKE ?)'
+        params.append(f'%{setor}%')
+        params.append(f'%{setor}%')
+
+    for valor, operador, sufixo in ((data_inicio, '>=', ' 00:00:00'), (data_fim, '<=', ' 23:59:59')):
+        if not valor:
+            continue
+        try:
+            datetime.strptime(valor, '%Y-%m-%d')
+        except ValueError:
+            continue
+        where += f' AND m.data_movimentacao {operador} ?'
+        params.append(valor + sufixo)
+
+    return where, params
+
+
+class EstoqueInsuficiente(Exception):
+    """Saída maior que o estoque disponível no momento da gravação"""
+
+
+def _registrar_movimentacao(unit_db, produto_id, tipo, quantidade, usuario_id, alertas=None, **campos):
+    """Grava a movimentação e ajusta o estoque do produto, sem commit.
+
+    Na saída o UPDATE só é aplicado se ainda houver estoque suficiente, o que
+    evita saldo negativo com leituras simultâneas. Se `alertas` (lista) for
+    informada, recebe o alerta de estoque baixo/zerado quando a saída cruza o
+    limite; deve ser emitida depois do commit. Retorna a nova quantidade.
+    """
+    if tipo == 'entrada':
+        atual = unit_db.execute('''
+            UPDATE produtos SET quantidade = quantidade + ?, data_atualizacao = CURRENT_TIMESTAMP
+            WHERE id = ?
+            RETURNING quantidade, estoque_minimo, nome
+        ''', (quantidade, produto_id)).fetchone()
+    else:
+        atual = unit_db.execute('''
+            UPDATE produtos SET quantidade = quantidade - ?, data_atualizacao = CURRENT_TIMESTAMP
+            WHERE id = ? AND quantidade >= ?
+            RETURNING quantidade, estoque_minimo, nome
+        ''', (quantidade, produto_id, quantidade)).fetchone()
+        if atual is None:
+            raise EstoqueInsuficiente()
+
+    cursor = unit_db.execute('''
+        INSERT INTO movimentacoes (produto_id, tipo, quantidade, usuario_responsavel_id,
+                                   origem, destino, nota_fiscal, ordem_servico, motivo)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (produto_id, tipo, quantidade, usuario_id,
+          campos.get('origem'), campos.get('destino'), campos.get('nota_fiscal'),
+          campos.get('ordem_servico'), campos.get('motivo')))
+    event_bus.registrar(unit_db, produto_id, tipo)
+
+    if atual is None:
+        return None
+    if tipo == 'saida' and alertas is not None:
+        alertas.append(verificar_alerta(produto_id, atual['nome'], atual['quantidade'] + quantidade,
+                                        atual['quantidade'], atual['estoque_minimo'], f'mov:{cursor.lastrowid}'))
+    return atual['quantidade']
+
+
+def _emitir_alertas(alertas):
+    """Envia os alertas de estoque da unidade atual (depois do commit)."""
+    alertas_estoque.emitir(session['unit_id'], session.get('unit_name', session['unit_id']), alertas,
+                           link=url_for('products.produtos', estoque='baixo'))
+
 
 @movements_bp.route('')
 def movimentacoes():
@@ -21,33 +120,13 @@ def movimentacoes():
         flash('Erro ao conectar com o banco da unidade', 'danger')
         return redirect(url_for('main.selecionar_unidade'))
     
-    tipo = request.args.get('tipo', '')
-    produto_id = request.args.get('produto_id', '')
-    setor = request.args.get('setor', '')
-    
     # Build query dynamically
+    where, params = _filtros_movimentacoes(request.args)
     query = '''
         SELECT m.*, p.nome as produto_nome
         FROM movimentacoes m
         LEFT JOIN produtos p ON m.produto_id = p.id
-        WHERE 1=1
-    '''
-    params = []
-    
-    if tipo:
-        query += ' AND m.tipo = ?'
-        params.append(tipo)
-    
-    if produto_id:
-        query += ' AND m.produto_id = ?'
-        params.append(produto_id)
-    
-    if setor:
-        query += ' AND (m.origem LIKE ? OR m.destino LIKE ?)'
-        params.append(f'%{setor}%')
-        params.append(f'%{setor}%')
-    
-    query += ' ORDER BY m.data_movimentacao DESC'
+    ''' + where + ' ORDER BY m.data_movimentacao DESC'
     
     cursor = unit_db.execute(query, params)
     movimentacoes = cursor.fetchall()
@@ -92,7 +171,123 @@ def movimentacoes():
                          saldo_geral=saldo_geral)
 
 
+@movements_bp.route('/exportar')
+def exportar_movimentacoes():
+    """Exporta as movimentações filtradas em CSV, em streaming.
+
+    As linhas são lidas do cursor em lotes (fetchmany) e enviadas conforme
+    são produzidas, então o uso de memória não depende do período exportado.
+    """
+    from app import Usuario
+    from database_manager import db_manager
+
+    if 'user_id' not in session:
+        return redirect(url_for('auth.login'))
+
+    if 'unit_id' not in session:
+        return redirect(url_for('main.selecionar_unidade'))
+
+    where, params = _filtros_movimentacoes(request.args)
+    query = '''
+        SELECT m.id, m.data_movimentacao, m.tipo, m.produto_id, p.nome AS produto_nome,
+               m.quantidade, m.usuario_responsavel_id, m.origem, m.destino,
+               m.nota_fiscal, m.ordem_servico, m.motivo
+        FROM movimentacoes m
+        LEFT JOIN produtos p ON m.produto_id = p.id
+    ''' + where + ' ORDER BY m.data_movimentacao DESC, m.id DESC'
+
+    # Conexão própria: o gerador continua lendo depois que a view retorna
+    try:
+        conn = db_manager.get_connection(session['unit_id'], use_cache=False)
+    except Exception:
+        flash('Erro ao conectar com o banco da unidade', 'danger')
+        return redirect(url_for('main.selecionar_unidade'))
+
+    # Nomes dos usuários (banco central) resolvidos uma única vez
+    nomes_usuarios = dict(Usuario.query.with_entities(Usuario.id, Usuario.nome).all())
+
+    def gerar():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';')
+        try:
+            cursor = conn.execute(query, params)
+            writer.writerow(['ID', 'Data', 'Tipo', 'Produto ID', 'Produto', 'Quantidade',
+                             'Responsável', 'Origem', 'Destino', 'Nota Fiscal',
+                             'Retirado por', 'Motivo'])
+            # BOM para o Excel reconhecer UTF-8
+            yield '\ufeff' + buffer.getvalue()
+            while True:
+                linhas = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not linhas:
+                    break
+                buffer.seek(0)
+                buffer.truncate()
+                for row in linhas:
+                    writer.writerow([
+                        row['id'], row['data_movimentacao'], row['tipo'], row['produto_id'],
+                        row['produto_nome'], row['quantidade'],
+                        nomes_usuarios.get(row['usuario_responsavel_id'], ''),
+                        row['origem'], row['destino'], row['nota_fiscal'],
+                        row['ordem_servico'], row['motivo'],
+                    ])
+                yield buffer.getvalue()
+        finally:
+            conn.close()
+
+    nome_arquivo = f"movimentacoes_{session['unit_id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    return Response(
+        stream_with_context(gerar()),
+        mimetype='text/csv; charset=utf-8',
+        headers={
+            'Content-Disposition': f'attachment; filename={nome_arquivo}',
+            # Evita que proxies (nginx) acumulem a resposta antes de enviar
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+
+@movements_bp.route('/eventos')
+@limiter.exempt
+def eventos_estoque():
+    """Feed SSE com as alterações de estoque da unidade atual.
+
+    Cada evento traz {"p": produto_id, "q": nova quantidade, "t": tipo,
+    "d": +1 ou -1 (exclusão)}. O cliente (EventSource) reconecta sozinho e
+    informa o Last-Event-ID, a partir do qual o feed é retomado. Com o limite
+    de assinantes do processo atingido, responde 503 com `retry:`.
+    """
+    from database_manager import db_manager
+    from stock_events import RETRY_LOTADO
+
+    if 'user_id' not in session or 'unit_id' not in session:
+        return Response(status=401)
+
+    if not event_bus.reservar():
+        return Response(f'retry: {RETRY_LOTADO}\n\n', status=503, mimetype='text/event-stream',
+                        headers={'Retry-After': str(RETRY_LOTADO // 1000), 'Cache-Control': 'no-cache'})
+
+    unit_id = session['unit_id']
+    try:
+        conn = db_manager.get_connection(unit_id, use_cache=False)
+        ultimo_id = request.headers.get('Last-Event-ID', type=int)
+        if ultimo_id is None:
+            ultimo_id = event_bus.ultimo_id(conn)
+    except Exception:
+        event_bus.liberar()
+        return Response(status=503)
+
+    resposta = Response(
+        event_bus.escutar(unit_id, conn, ultimo_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Vaga liberada quando o servidor fecha a resposta, mesmo que o gerador não chegue a rodar
+    resposta.call_on_close(event_bus.liberar)
+    return resposta
+
+
 @movements_bp.route('/entrada', methods=['GET', 'POST'])
+@limiter.limit(LIMITE_MOVIMENTACAO, methods=['POST'])
 def entrada_produto():
     """Registrar entrada de produto"""
     if 'unit_id' not in session:
@@ -119,30 +314,24 @@ def entrada_produto():
         
         if not produto:
             flash('Produto não encontrado!', 'danger')
-            produtos = unit_db.execute('SELECT id, nome FROM produtos WHERE ativo = 1 ORDER BY nome').fetchall()
-            return render_template('entrada_produto.html', produtos=produtos)
+            return render_template('entrada_produto.html')
         
         try:
-            cursor = unit_db.execute('''
-                INSERT INTO movimentacoes (produto_id, tipo, quantidade, usuario_responsavel_id, origem, nota_fiscal, motivo)
-                VALUES (?, 'entrada', ?, ?, ?, ?, ?)
-            ''', (produto_id, quantidade, session['user_id'], origem, nota_fiscal, motivo))
-            
-            cursor = unit_db.execute('UPDATE produtos SET quantidade = quantidade + ?, data_atualizacao = CURRENT_TIMESTAMP WHERE id = ?', 
-                                    (quantidade, produto_id))
-            
+            _registrar_movimentacao(unit_db, produto_id, 'entrada', quantidade, session['user_id'],
+                                    origem=origem, nota_fiscal=nota_fiscal, motivo=motivo)
             unit_db.commit()
+            event_bus.notificar(session['unit_id'])
             flash(f'Entrada de {quantidade} unidades de {produto["nome"]} registrada com sucesso!', 'success')
             return redirect(url_for('movements.movimentacoes'))
         except Exception as e:
             unit_db.rollback()
             flash('Erro ao registrar entrada!', 'danger')
     
-    produtos = unit_db.execute('SELECT id, nome FROM produtos WHERE ativo = 1 ORDER BY nome').fetchall()
-    return render_template('entrada_produto.html', produtos=produtos)
+    return render_template('entrada_produto.html')
 
 
 @movements_bp.route('/saida', methods=['GET', 'POST'])
+@limiter.limit(LIMITE_MOVIMENTACAO, methods=['POST'])
 def saida_produto():
     """Registrar saída de produto"""
     if 'unit_id' not in session:
@@ -170,34 +359,107 @@ def saida_produto():
         
         if not produto:
             flash('Produto não encontrado!', 'danger')
-            produtos = unit_db.execute('SELECT id, nome, quantidade FROM produtos WHERE ativo = 1 ORDER BY nome').fetchall()
             setores = unit_db.execute('SELECT id, nome FROM setores WHERE ativo = 1 ORDER BY nome').fetchall()
-            return render_template('saida_produto.html', produtos=produtos, setores=setores)
+            return render_template('saida_produto.html', setores=setores)
         
         if produto['quantidade'] < quantidade:
             flash(f'Estoque insuficiente! Produto tem apenas {produto["quantidade"]} unidades.', 'danger')
-            produtos = unit_db.execute('SELECT id, nome, quantidade FROM produtos WHERE ativo = 1 ORDER BY nome').fetchall()
             setores = unit_db.execute('SELECT id, nome FROM setores WHERE ativo = 1 ORDER BY nome').fetchall()
-            return render_template('saida_produto.html', produtos=produtos, setores=setores)
+            return render_template('saida_produto.html', setores=setores)
         
         try:
-            cursor = unit_db.execute('UPDATE produtos SET quantidade = quantidade - ? WHERE id = ?', (quantidade, produto_id))
-            
-            cursor = unit_db.execute('''
-                INSERT INTO movimentacoes (produto_id, tipo, quantidade, usuario_responsavel_id, destino, ordem_servico, motivo)
-                VALUES (?, 'saida', ?, ?, ?, ?, ?)
-            ''', (produto_id, quantidade, session['user_id'], destino, ordem_servico, motivo))
-            
+            alertas = []
+            _registrar_movimentacao(unit_db, produto_id, 'saida', quantidade, session['user_id'], alertas,
+                                    destino=destino, ordem_servico=ordem_servico, motivo=motivo)
             unit_db.commit()
+            event_bus.notificar(session['unit_id'])
+            _emitir_alertas(alertas)
             flash(f'Saída de {quantidade} unidades de {produto["nome"]} registrada com sucesso!', 'success')
             return redirect(url_for('movements.movimentacoes'))
+        except EstoqueInsuficiente:
+            unit_db.rollback()
+            flash('Estoque insuficiente! O saldo foi alterado por outra movimentação.', 'danger')
         except Exception as e:
             unit_db.rollback()
             flash('Erro ao registrar saída!', 'danger')
     
-    produtos = unit_db.execute('SELECT id, nome, quantidade FROM produtos WHERE ativo = 1 ORDER BY nome').fetchall()
     setores = unit_db.execute('SELECT id, nome FROM setores WHERE ativo = 1 ORDER BY nome').fetchall()
-    return render_template('saida_produto.html', produtos=produtos, setores=setores)
+    return render_template('saida_produto.html', setores=setores)
+
+
+@movements_bp.route('/leitura', methods=['GET', 'POST'])
+@limiter.limit(LIMITE_LEITURA_CODIGO, methods=['POST'])
+def leitura_codigo():
+    """Leitura de código de barras: registra entrada/saída em uma requisição.
+
+    GET exibe a tela da estação de leitura; POST (JSON ou formulário) recebe
+    codigo, tipo ('entrada' ou 'saida'), quantidade (padrão 1) e, opcionalmente,
+    origem/destino. A resposta é mínima para leituras em sequência:
+    {"ok": true, "p": produto_id, "n": nome, "q": nova quantidade}.
+    """
+    if 'user_id' not in session:
+        if request.method == 'POST':
+            return jsonify(ok=False, erro='Não autenticado'), 401
+        return redirect(url_for('auth.login'))
+
+    if 'unit_id' not in session:
+        if request.method == 'POST':
+            return jsonify(ok=False, erro='Nenhuma unidade selecionada'), 400
+        return redirect(url_for('main.selecionar_unidade'))
+
+    unit_db = get_unit_db()
+
+    if request.method == 'GET':
+        if not check_permission():
+            flash('Acesso negado! Você não tem permissão para movimentar produtos.', 'danger')
+            return redirect(url_for('movements.movimentacoes'))
+        setores = unit_db.execute('SELECT id, nome FROM setores WHERE ativo = 1 ORDER BY nome').fetchall() if unit_db else []
+        return render_template('leitura_codigo.html', setores=setores)
+
+    if not check_permission():
+        return jsonify(ok=False, erro='Sem permissão para movimentar produtos'), 403
+    if not unit_db:
+        return jsonify(ok=False, erro='Erro ao conectar com o banco da unidade'), 503
+
+    dados = request.get_json(silent=True) or request.form
+    codigo = (dados.get('codigo') or '').strip()
+    tipo = dados.get('tipo', 'saida')
+    try:
+        quantidade = int(dados.get('quantidade') or 1)
+    except (TypeError, ValueError):
+        quantidade = 0
+
+    if not codigo or tipo not in ('entrada', 'saida') or quantidade < 1:
+        return jsonify(ok=False, erro='Leitura inválida'), 400
+
+    encontrados = unit_db.execute(
+        'SELECT id, nome FROM produtos WHERE codigo_barras = ? AND ativo = 1 LIMIT 2', (codigo,)
+    ).fetchall()
+    if not encontrados:
+        return jsonify(ok=False, erro='Código não cadastrado'), 404
+    if len(encontrados) > 1:
+        # Unidade com códigos duplicados (índice único pendente): não escolhe um ao acaso
+        return jsonify(ok=False, erro='Código usado por mais de um produto'), 409
+    produto = encontrados[0]
+
+    alertas = []
+    try:
+        nova_quantidade = _registrar_movimentacao(
+            unit_db, produto['id'], tipo, quantidade, session['user_id'], alertas,
+            origem=dados.get('origem') or None, destino=dados.get('destino') or None,
+            motivo='Leitura de código de barras'
+        )
+        unit_db.commit()
+    except EstoqueInsuficiente:
+        unit_db.rollback()
+        return jsonify(ok=False, erro='Estoque insuficiente', p=produto['id'], n=produto['nome']), 409
+    except Exception:
+        unit_db.rollback()
+        return jsonify(ok=False, erro='Erro ao registrar movimentação'), 500
+
+    event_bus.notificar(session['unit_id'])
+    _emitir_alertas(alertas)
+    return jsonify(ok=True, p=produto['id'], n=produto['nome'], q=nova_quantidade)
 
 
 @movements_bp.route('/excluir/<int:id>')
@@ -216,26 +478,37 @@ def excluir_movimentacao(id):
         return redirect(url_for('main.selecionar_unidade'))
     
     try:
-        cursor = unit_db.execute('SELECT * FROM movimentacoes WHERE id = ?', (id,))
-        movimentacao = cursor.fetchone()
-        
+        # DELETE ... RETURNING: duas exclusões simultâneas da mesma
+        # movimentação não estornam o estoque duas vezes
+        movimentacao = unit_db.execute(
+            'DELETE FROM movimentacoes WHERE id = ? RETURNING produto_id, tipo, quantidade', (id,)
+        ).fetchone()
+
         if not movimentacao:
+            unit_db.rollback()
             flash('Movimentação não encontrada!', 'danger')
             return redirect(url_for('movements.movimentacoes'))
-        
-        cursor = unit_db.execute('SELECT * FROM produtos WHERE id = ?', (movimentacao['produto_id'],))
-        produto = cursor.fetchone()
-        
+
+        # Estorno atômico, como em _registrar_movimentacao: uma saída gravada
+        # por outra conexão entre a leitura e a escrita não se perde
+        sinal = -1 if movimentacao['tipo'] == 'entrada' else 1
+        produto = unit_db.execute('''
+            UPDATE produtos SET quantidade = quantidade + ?, data_atualizacao = CURRENT_TIMESTAMP
+            WHERE id = ?
+            RETURNING id, quantidade, estoque_minimo, nome
+        ''', (sinal * movimentacao['quantidade'], movimentacao['produto_id'])).fetchone()
+
+        alertas = []
         if produto:
-            if movimentacao['tipo'] == 'entrada':
-                nova_quantidade = produto['quantidade'] - movimentacao['quantidade']
-            else:
-                nova_quantidade = produto['quantidade'] + movimentacao['quantidade']
-            
-            cursor = unit_db.execute('UPDATE produtos SET quantidade = ? WHERE id = ?', (nova_quantidade, movimentacao['produto_id']))
-        
-        cursor = unit_db.execute('DELETE FROM movimentacoes WHERE id = ?', (id,))
+            event_bus.registrar(unit_db, movimentacao['produto_id'], f"exclusao_{movimentacao['tipo']}")
+            # Excluir uma entrada pode levar o saldo abaixo do mínimo
+            anterior = produto['quantidade'] - sinal * movimentacao['quantidade']
+            alertas.append(verificar_alerta(produto['id'], produto['nome'], anterior, produto['quantidade'],
+                                            produto['estoque_minimo'], f'exclusao:{id}'))
+
         unit_db.commit()
+        event_bus.notificar(session['unit_id'])
+        _emitir_alertas(alertas)
         flash('Movimentação excluída e estoque atualizado!', 'success')
     except Exception as e:
         unit_db.rollback()
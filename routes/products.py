@@ -1,16 +1,33 @@
 # Rotas de Gerenciamento de Produtos
+import sqlite3
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from datetime import datetime, timezone
-from routes.helpers import get_unit_db, check_permission, login_required, require_unit
+from routes.helpers import get_unit_db, check_permission, login_required, require_unit, eh_admin
+from database_manager import normalizar_busca, get_configuracao
+from extensions import limiter, LIMITE_TAREFA_PESADA
 
 products_bp = Blueprint('products', __name__, url_prefix='/produtos')
 
 
+# Ordenações da listagem: parâmetro -> coluna (todas com índice em (ativo, coluna))
+ORDENACOES_PRODUTOS = {
+    'nome': 'nome_busca',
+    'quantidade': 'quantidade',
+    'atualizacao': 'data_atualizacao',
+}
+LIMITE_PRODUTOS_MAXIMO = 500
+
+
 @products_bp.route('')
 @login_required
 @require_unit
 def produtos():
-    """Lista produtos"""
+    """Lista produtos com paginação por chave (keyset).
+
+    A próxima página é pedida com o valor de ordenação e o id do último item
+    exibido (?apos=&apos_id=), então cada página lê apenas `limite` linhas do
+    índice, independente do tamanho do catálogo.
+    """
     from app import db, Usuario
     
     unit_db = get_unit_db()
@@ -18,7 +35,19 @@ def produtos():
         flash('Erro ao conectar com o banco da unidade', 'danger')
         return redirect(url_for('main.selecionar_unidade'))
     
+    ordem = request.args.get('ordem', 'nome')
+    if ordem not in ORDENACOES_PRODUTOS:
+        ordem = 'nome'
+    coluna = ORDENACOES_PRODUTOS[ordem]
+    decrescente = request.args.get('direcao') == 'desc'
+    limite = get_configuracao(unit_db, 'limite_produtos_pagina', 50, int)
+    limite = max(1, min(limite, LIMITE_PRODUTOS_MAXIMO))
+    
     estoque_status = request.args.get('estoque', '')
+    busca = normalizar_busca(request.args.get('busca', ''))
+    categoria = request.args.get('categoria', '')
+    classe_abc = request.args.get('classe_abc', '')
+    classe_xyz = request.args.get('classe_xyz', '')
     
     query = 'SELECT * FROM produtos WHERE ativo = 1'
     params = []
@@ -27,29 +56,74 @@ def produtos():
         query += ' AND quantidade <= estoque_minimo'
     elif estoque_status == 'zerado':
         query += ' AND quantidade = 0'
+    if busca:
+        query += " AND nome_busca LIKE ? ESCAPE '\\'"
+        params.append('%' + busca.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+    if categoria:
+        query += ' AND categoria = ?'
+        params.append(categoria)
+    if classe_abc in ('A', 'B', 'C'):
+        query += ' AND classe_abc = ?'
+        params.append(classe_abc)
+    if classe_xyz in ('X', 'Y', 'Z'):
+        query += ' AND classe_xyz = ?'
+        params.append(classe_xyz)
+    
+    apos = request.args.get('apos')
+    apos_id = request.args.get('apos_id', type=int)
+    if apos is not None and apos_id is not None:
+        valor = int(apos) if ordem == 'quantidade' and apos.lstrip('-').isdigit() else apos
+        query += f" AND ({coluna}, id) {'<' if decrescente else '>'} (?, ?)"
+        params.extend([valor, apos_id])
     
-    query += ' ORDER BY nome'
+    direcao = 'DESC' if decrescente else 'ASC'
+    query += f' ORDER BY {coluna} {direcao}, id {direcao} LIMIT ?'
+    # Uma linha a mais indica se existe próxima página
+    params.append(limite + 1)
     
-    cursor = unit_db.execute(query, params)
-    produtos = cursor.fetchall()
+    produtos = [dict(produto) for produto in unit_db.execute(query, params).fetchall()]
+    proxima = None
+    if len(produtos) > limite:
+        produtos = produtos[:limite]
+        ultimo = produtos[-1]
+        proxima = {'apos': ultimo[coluna], 'apos_id': ultimo['id']}
     
-    produtos_com_info = []
+    # Nomes dos responsáveis em uma única consulta ao banco central
+    usuario_ids = {p['usuario_id'] for p in produtos if p.get('usuario_id')}
+    nomes = {}
+    if usuario_ids:
+        try:
+            nomes = dict(db.session.query(Usuario.id, Usuario.nome).filter(Usuario.id.in_(usuario_ids)).all())
+        except Exception:
+            nomes = {uid: 'Erro ao carregar' for uid in usuario_ids}
     for produto in produtos:
-        produto_dict = dict(produto)
-        if produto_dict.get('usuario_id'):
-            try:
-                usuario = db.session.get(Usuario, produto_dict['usuario_id'])
-                if usuario:
-                    produto_dict['usuario_nome'] = usuario.nome
-                else:
-                    produto_dict['usuario_nome'] = 'Usuário não encontrado'
-            except Exception:
-                produto_dict['usuario_nome'] = 'Erro ao carregar'
+        if produto.get('usuario_id'):
+            produto['usuario_nome'] = nomes.get(produto['usuario_id'], 'Usuário não encontrado')
         else:
-            produto_dict['usuario_nome'] = None
-        produtos_com_info.append(produto_dict)
+            produto['usuario_nome'] = None
     
-    return render_template('produtos.html', produtos=produtos_com_info)
+    # Totais do catálogo calculados no banco (índice (ativo, quantidade))
+    estatisticas = unit_db.execute('''
+        SELECT COUNT(*) AS total,
+               COALESCE(SUM(quantidade > 5), 0) AS em_estoque,
+               COALESCE(SUM(quantidade BETWEEN 1 AND 5), 0) AS baixo,
+               COALESCE(SUM(quantidade = 0), 0) AS zerado
+        FROM produtos WHERE ativo = 1
+    ''').fetchone()
+    
+    # Códigos repetidos impedem o índice único (e a leitura por código)
+    if eh_admin():
+        from database_manager import db_manager
+        duplicados = db_manager.codigos_barras_duplicados(unit_db)
+        if duplicados:
+            flash('Códigos de barras usados por mais de um produto ativo: '
+                  f"{', '.join(duplicados[:20])}{' ...' if len(duplicados) > 20 else ''}. "
+                  'Corrija os cadastros para que a leitura por código identifique o produto.', 'warning')
+
+    filtros = {k: v for k, v in request.args.items() if k not in ('apos', 'apos_id')}
+    return render_template('produtos.html', produtos=produtos, estatisticas=estatisticas,
+                           proxima=proxima, filtros=filtros, ordem=ordem,
+                           direcao='desc' if decrescente else 'asc', limite=limite)
 
 
 @products_bp.route('/novo', methods=['GET', 'POST'])
@@ -71,18 +145,22 @@ def novo_produto():
         nome = request.form['nome']
         descricao = request.form.get('descricao', '')
         quantidade = int(request.form['quantidade'])
-        codigo_barras = request.form.get('codigo_barras', '')
+        # Código vazio é gravado como NULL (o índice único ignora NULL)
+        codigo_barras = request.form.get('codigo_barras', '').strip() or None
         unidade_medida = request.form.get('unidade_medida', 'un')
         estoque_minimo = int(request.form.get('estoque_minimo', 5))
         
         try:
             cursor = unit_db.execute('''
-                INSERT INTO produtos (nome, descricao, quantidade, usuario_id, codigo_barras, unidade_medida, estoque_minimo)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (nome, descricao, quantidade, session['user_id'], codigo_barras, unidade_medida, estoque_minimo))
+                INSERT INTO produtos (nome, nome_busca, descricao, quantidade, usuario_id, codigo_barras, unidade_medida, estoque_minimo)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (nome, normalizar_busca(nome), descricao, quantidade, session['user_id'], codigo_barras, unidade_medida, estoque_minimo))
             unit_db.commit()
             flash('Produto cadastrado com sucesso!', 'success')
             return redirect(url_for('products.produtos'))
+        except sqlite3.IntegrityError:
+            unit_db.rollback()
+            flash('Código de barras já cadastrado em outro produto!', 'danger')
         except Exception as e:
             unit_db.rollback()
             flash('Erro ao cadastrar produto!', 'danger')
@@ -118,21 +196,25 @@ def editar_produto(id):
         nome = request.form['nome']
         descricao = request.form.get('descricao', '')
         quantidade = int(request.form['quantidade'])
-        codigo_barras = request.form.get('codigo_barras', '')
+        # Código vazio é gravado como NULL (o índice único ignora NULL)
+        codigo_barras = request.form.get('codigo_barras', '').strip() or None
         unidade_medida = request.form.get('unidade_medida', 'un')
         estoque_minimo = int(request.form.get('estoque_minimo', 5))
         
         try:
             cursor = unit_db.execute('''
                 UPDATE produtos 
-                SET nome = ?, descricao = ?, quantidade = ?, 
+                SET nome = ?, nome_busca = ?, descricao = ?, quantidade = ?, 
                     codigo_barras = ?, unidade_medida = ?, estoque_minimo = ?,
                     data_atualizacao = CURRENT_TIMESTAMP
                 WHERE id = ?
-            ''', (nome, descricao, quantidade, codigo_barras, unidade_medida, estoque_minimo, id))
+            ''', (nome, normalizar_busca(nome), descricao, quantidade, codigo_barras, unidade_medida, estoque_minimo, id))
             unit_db.commit()
             flash('Produto atualizado com sucesso!', 'success')
             return redirect(url_for('products.produtos'))
+        except sqlite3.IntegrityError:
+            unit_db.rollback()
+            flash('Código de barras já cadastrado em outro produto!', 'danger')
         except Exception as e:
             unit_db.rollback()
             flash('Erro ao atualizar produto!', 'danger')
@@ -194,3 +276,86 @@ def excluir_produto(id):
         flash('Erro ao excluir produto!', 'danger')
     
     return redirect(url_for('products.produtos'))
+
+
+@products_bp.route('/estoque-minimo', methods=['GET', 'POST'])
+@login_required
+@require_unit
+def estoque_minimo():
+    """Revisão e aplicação do estoque mínimo sugerido pela previsão de demanda"""
+    from forecasting import METODOS, PARAMETROS_PADRAO, aplicar_sugestoes, validar_parametros
+    from jobs import gerenciador_tarefas
+
+    if not eh_admin():
+        flash('Acesso negado! Apenas administradores podem revisar o estoque mínimo.', 'danger')
+        return redirect(url_for('products.produtos'))
+
+    unit_db = get_unit_db()
+    if not unit_db:
+        flash('Erro ao conectar com o banco da unidade', 'danger')
+        return redirect(url_for('main.selecionar_unidade'))
+
+    if request.method == 'POST':
+        acao = request.form.get('acao')
+        try:
+            if acao == 'recalcular':
+                # Cálculo pesado (NumPy) no pool de processos das tarefas
+                metodo = request.form.get('metodo', PARAMETROS_PADRAO['metodo'])
+                parametros = {
+                    'metodo': metodo if metodo in METODOS else None,
+                    'dias_historico': request.form.get('dias_historico', type=int),
+                    'janela': request.form.get('janela', type=int),
+                    'alpha': request.form.get('alpha', type=float),
+                    'lead_time': request.form.get('lead_time', type=int),
+                    'nivel_servico': request.form.get('nivel_servico', type=float),
+                }
+                # Parâmetros inválidos voltam para o formulário em vez de virar tarefa com erro
+                validar_parametros(**{**PARAMETROS_PADRAO, **{k: v for k, v in parametros.items() if v is not None}})
+                tarefa_id = gerenciador_tarefas.enviar('estoque_minimo', {'unit_id': session['unit_id'], **parametros},
+                                                       unidade_id=session['unit_id'], usuario_id=session['user_id'])
+                return redirect(url_for('system.ver_tarefa', tarefa_id=tarefa_id))
+            elif acao == 'aplicar':
+                ids = request.form.getlist('produto_ids')
+                if not ids:
+                    flash('Selecione ao menos um produto.', 'warning')
+                else:
+                    total = aplicar_sugestoes(unit_db, ids)
+                    flash(f'Estoque mínimo atualizado em {total} produtos.', 'success')
+        except ValueError as e:
+            flash(str(e), 'danger')
+        except Exception:
+            flash('Erro ao processar o estoque mínimo!', 'danger')
+        return redirect(url_for('products.estoque_minimo'))
+
+    cursor = unit_db.execute('''
+        SELECT id, nome, quantidade, estoque_minimo, estoque_minimo_sugerido, data_sugestao_minimo
+        FROM produtos
+        WHERE ativo = 1 AND estoque_minimo_sugerido IS NOT NULL
+          AND estoque_minimo_sugerido != estoque_minimo
+        ORDER BY ABS(estoque_minimo_sugerido - estoque_minimo) DESC, nome
+    ''')
+    sugestoes = cursor.fetchall()
+
+    return render_template('estoque_minimo.html',
+                           sugestoes=sugestoes,
+                           metodos=METODOS,
+                           parametros=PARAMETROS_PADRAO)
+
+
+@products_bp.route('/classificar', methods=['POST'])
+@limiter.limit(LIMITE_TAREFA_PESADA)
+@login_required
+@require_unit
+def classificar_produtos():
+    """Enfileira a classificação ABC/XYZ dos produtos da unidade"""
+    from jobs import gerenciador_tarefas
+
+    if not eh_admin():
+        flash('Acesso negado! Apenas administradores podem classificar produtos.', 'danger')
+        return redirect(url_for('products.produtos'))
+
+    tarefa_id = gerenciador_tarefas.enviar('classificacao', {
+        'unit_id': session['unit_id'],
+        'dias_historico': request.form.get('dias_historico', type=int),
+    }, unidade_id=session['unit_id'], usuario_id=session['user_id'])
+    return redirect(url_for('system.ver_tarefa', tarefa_id=tarefa_id))
@@ -1,6 +1,7 @@
 # routes/reports.py
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from routes.helpers import login_required, require_unit, get_unit_db
+from routes.helpers import login_required, require_unit, get_unit_db, pode_menu, eh_admin
+from extensions import limiter, LIMITE_EXPORTACAO
 
 reports_bp = Blueprint('reports', __name__, url_prefix='/relatorios')
 
@@ -9,7 +10,7 @@ reports_bp = Blueprint('reports', __name__, url_prefix='/relatorios')
 @require_unit
 def relatorio_geral():
     # Verifica se o usuário tem permissão para ver relatórios
-    if not session.get('permissoes_menu', {}).get('relatorios', False):
+    if not pode_menu('relatorios'):
         flash('Acesso negado. Você não tem permissão para ver relatórios.', 'danger')
         return redirect(url_for('main.index'))
 
@@ -41,4 +42,97 @@ def relatorio_geral():
                            total_produtos_distintos=total_produtos_distintos,
                            total_itens_estoque=total_itens_estoque,
                            produtos_estoque_baixo=produtos_estoque_baixo,
-                           produtos_estoque_zerado=produtos_estoque_zerado)
\ No newline at end of file
+                           produtos_estoque_zerado=produtos_estoque_zerado)
+
+@reports_bp.route('/periodo')
+@login_required
+@require_unit
+def relatorio_periodo():
+    """Relatórios de movimentação por período (consumo, setores, produtos, entradas x saídas)"""
+    from report_engine import RELATORIOS, AGRUPAMENTOS, gerar_relatorio
+
+    if not pode_menu('relatorios'):
+        flash('Acesso negado. Você não tem permissão para ver relatórios.', 'danger')
+        return redirect(url_for('main.index'))
+
+    unit_db = get_unit_db()
+    if not unit_db:
+        flash('Erro ao conectar com o banco da unidade', 'danger')
+        return redirect(url_for('main.selecionar_unidade'))
+
+    relatorio = request.args.get('relatorio', 'consumo_periodo')
+    if relatorio not in RELATORIOS:
+        relatorio = 'consumo_periodo'
+
+    try:
+        resultado = gerar_relatorio(unit_db, session['unit_id'], relatorio, request.args)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        resultado = gerar_relatorio(unit_db, session['unit_id'], relatorio, {})
+
+    return render_template('relatorio_periodo.html', resultado=resultado,
+                           relatorios={k: v['titulo'] for k, v in RELATORIOS.items()},
+                           agrupamentos=AGRUPAMENTOS)
+
+
+@reports_bp.route('/periodo/exportar', methods=['POST'])
+@limiter.limit(LIMITE_EXPORTACAO)
+@login_required
+@require_unit
+def exportar_relatorio_periodo():
+    """Enfileira a exportação do relatório em CSV (tarefa em segundo plano)"""
+    from report_engine import normalizar_parametros
+    from jobs import gerenciador_tarefas
+
+    if not pode_menu('relatorios'):
+        flash('Acesso negado. Você não tem permissão para ver relatórios.', 'danger')
+        return redirect(url_for('main.index'))
+
+    relatorio = request.form.get('relatorio', 'consumo_periodo')
+    try:
+        normalizar_parametros(relatorio, request.form)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('reports.relatorio_periodo'))
+
+    parametros = {k: request.form.get(k) for k in ('data_inicio', 'data_fim', 'agrupamento', 'limite',
+                                                   'classe_abc', 'classe_xyz')}
+    tarefa_id = gerenciador_tarefas.enviar('relatorio_csv',
+                                           {'unit_id': session['unit_id'], 'relatorio': relatorio,
+                                            'parametros': parametros},
+                                           unidade_id=session['unit_id'], usuario_id=session['user_id'])
+    return redirect(url_for('system.ver_tarefa', tarefa_id=tarefa_id))
+
+
+@reports_bp.route('/rede', methods=['GET', 'POST'])
+@login_required
+def relatorio_rede():
+    """Relatórios consolidados de todas as unidades (base analítica)"""
+    import analytics
+    from jobs import gerenciador_tarefas
+
+    if not eh_admin():
+        flash('Acesso negado! Apenas administradores podem ver os relatórios da rede.', 'danger')
+        return redirect(url_for('main.index'))
+
+    if request.method == 'POST':
+        tarefa_id = gerenciador_tarefas.enviar('analytics', usuario_id=session['user_id'])
+        return redirect(url_for('system.ver_tarefa', tarefa_id=tarefa_id))
+
+    consulta = request.args.get('consulta', 'consumo_item')
+    if consulta not in analytics.CONSULTAS:
+        consulta = 'consumo_item'
+
+    conn = analytics.conectar()
+    try:
+        try:
+            resultado = analytics.consultar(conn, consulta, request.args)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            resultado = analytics.consultar(conn, consulta, {})
+        cargas = analytics.situacao_carga(conn)
+    finally:
+        conn.close()
+
+    return render_template('relatorio_rede.html', resultado=resultado, cargas=cargas,
+                           consultas={k: v['titulo'] for k, v in analytics.CONSULTAS.items()})
@@ -1,31 +1,41 @@
 # Rotas de Configurações
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from routes.helpers import admin_required
+from routes.helpers import admin_required, get_unit_db
 
 settings_bp = Blueprint('settings', __name__, url_prefix='/configuracoes')
 
 
-@settings_bp.route('')
+@settings_bp.route('', methods=['GET', 'POST'])
 @admin_required
 def configuracoes():
     if 'unit_id' not in session:
         return redirect(url_for('main.selecionar_unidade'))
     
+    unit_db = get_unit_db()
+    if not unit_db:
+        flash('Erro ao conectar com o banco da unidade', 'danger')
+        return redirect(url_for('main.selecionar_unidade'))
+    
     if request.method == 'POST':
-        for key, value in request.form.items():
-            if key.startswith('config_'):
-                config_key = key.replace('config_', '')
-                print(f"Configuração {config_key}: {value}")
-        flash('Configurações salvas com sucesso!', 'success')
+        nova_chave = request.form.get('config_nova_chave', '').strip()
+        try:
+            if nova_chave:
+                unit_db.execute('''
+                    INSERT INTO configuracoes (chave, valor, descricao) VALUES (?, ?, ?)
+                    ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor, descricao = excluded.descricao
+                ''', (nova_chave, request.form.get('config_novo_valor', ''),
+                      request.form.get('config_nova_descricao', '')))
+            else:
+                valores = [(value, key.replace('config_', '', 1))
+                           for key, value in request.form.items() if key.startswith('config_')]
+                unit_db.executemany('UPDATE configuracoes SET valor = ? WHERE chave = ?', valores)
+            unit_db.commit()
+            flash('Configurações salvas com sucesso!', 'success')
+        except Exception as e:
+            unit_db.rollback()
+            flash('Erro ao salvar configurações!', 'danger')
         return redirect(url_for('settings.configuracoes'))
     
-    configuracoes = [
-        {'chave': 'nome_sistema', 'valor': 'Sistema de Estoque Hospitalar', 'descricao': 'Nome do sistema'},
-        {'chave': 'versao', 'valor': '1.0.0', 'descricao': 'Versão atual do sistema'},
-        {'chave': 'limite_produtos_pagina', 'valor': '50', 'descricao': 'Limite de produtos por página'},
-        {'chave': 'alerta_estoque_baixo', 'valor': '5', 'descricao': 'Nível mínimo para alerta'},
-        {'chave': 'tempo_sessao', 'valor': '3600', 'descricao': 'Tempo de sessão em segundos'},
-        {'chave': 'email_remetente', 'valor': 'noreply@sistema.com', 'descricao': 'Email para notificações'},
-    ]
+    configuracoes = unit_db.execute('SELECT chave, valor, descricao FROM configuracoes ORDER BY chave').fetchall()
     
     return render_template('configuracoes.html', configuracoes=configuracoes)
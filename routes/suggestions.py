@@ -1,8 +1,9 @@
 # routes/suggestions.py
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from datetime import datetime, timezone
-from routes.helpers import login_required
-from models import db, Sugestao, Usuario, Notificacao
+from routes.helpers import login_required, eh_admin
+from models import db, Sugestao, Usuario
+from notifications import servico_notificacoes
 
 suggestions_bp = Blueprint('suggestions', __name__, url_prefix='/sugestoes')
 
@@ -34,20 +35,14 @@ def nova_sugestao():
         db.session.add(nova)
         db.session.commit()
 
-        # Notificar todos os administradores
-        try:
-            admins = Usuario.query.filter_by(tipo='admin').all()
-            autor = Usuario.query.get(session['user_id'])
-            for admin in admins:
-                notificacao = Notificacao(
-                    usuario_id=admin.id,
-                    mensagem=f"Nova sugestão de {autor.nome}: '{nova.titulo[:30]}...'",
-                    link=url_for('suggestions.responder_sugestao', id=nova.id)
-                )
-                db.session.add(notificacao)
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
+        # Notificar todos os administradores (gravação em lote, fora da requisição)
+        admins = [row.id for row in Usuario.query.with_entities(Usuario.id).filter_by(tipo='admin', ativo=1)]
+        servico_notificacoes.enviar(
+            admins,
+            f"Nova sugestão de {session.get('user_nome')}: '{nova.titulo[:30]}...'",
+            link=url_for('suggestions.responder_sugestao', id=nova.id),
+            chave=f'sugestao:{nova.id}'
+        )
 
         flash('Sua sugestão foi enviada com sucesso! Obrigado por sua contribuição.', 'success')
         return redirect(url_for('suggestions.minhas_sugestoes'))
@@ -58,7 +53,7 @@ def nova_sugestao():
 @suggestions_bp.route('/admin')
 @login_required
 def admin_sugestoes():
-    if session.get('user_tipo') != 'admin':
+    if not eh_admin():
         flash('Acesso negado.', 'danger')
         return redirect(url_for('main.index'))
 
@@ -69,7 +64,7 @@ def admin_sugestoes():
 @suggestions_bp.route('/admin/responder/<int:id>', methods=['GET', 'POST'])
 @login_required
 def responder_sugestao(id):
-    if session.get('user_tipo') != 'admin':
+    if not eh_admin():
         flash('Acesso negado.', 'danger')
         return redirect(url_for('main.index'))
 
@@ -83,15 +78,14 @@ def responder_sugestao(id):
         sugestao.resposta_admin = resposta
         sugestao.data_resposta = datetime.now(timezone.utc)
 
+        db.session.commit()
+
         # Notificar o usuário sobre a resposta
-        notificacao = Notificacao(
-            usuario_id=sugestao.usuario_id,
-            mensagem=f"Sua sugestão '{sugestao.titulo[:20]}...' foi respondida.",
+        servico_notificacoes.enviar(
+            [sugestao.usuario_id],
+            f"Sua sugestão '{sugestao.titulo[:20]}...' foi respondida.",
             link=url_for('suggestions.minhas_sugestoes')
         )
-        db.session.add(notificacao)
-
-        db.session.commit()
         flash('Resposta enviada com sucesso!', 'success')
         return redirect(url_for('suggestions.admin_sugestoes'))
 
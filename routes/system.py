@@ -1,48 +1,226 @@
 # routes/system.py
-from flask import Blueprint, current_app, send_from_directory, flash, redirect, url_for, session, request
-from routes.helpers import admin_required, login_required
+from flask import Blueprint, current_app, send_from_directory, flash, redirect, url_for, session, request, render_template, jsonify, Response
+from routes.helpers import admin_required, login_required, eh_admin
+from extensions import limiter, LIMITE_TAREFA_PESADA
 import os
-import zipfile
-from datetime import datetime
 from models import db, Notificacao
 
 system_bp = Blueprint('system', __name__, url_prefix='/sistema')
 
-@system_bp.route('/backup')
+@system_bp.route('/backup', methods=['POST'])
+@limiter.limit(LIMITE_TAREFA_PESADA)
 @admin_required
 def create_backup():
-    """Cria um backup ZIP de toda a pasta 'instance' e o oferece para download."""
-    try:
-        # Caminho para a pasta 'instance'
-        instance_path = os.path.join(current_app.root_path, 'instance')
-        
-        # Caminho para a pasta de backups temporários (será criada se não existir)
-        backup_dir = os.path.join(current_app.root_path, 'temp_backups')
-        os.makedirs(backup_dir, exist_ok=True)
-
-        # Nome do arquivo de backup com data e hora
-        timestamp = datetime.now().strftime('%Y-%m-%d_%H%M%S')
-        backup_filename = f'backup_completo_{timestamp}.zip'
-        backup_filepath = os.path.join(backup_dir, backup_filename)
-
-        # Cria o arquivo ZIP com todos os dados da pasta 'instance'
-        with zipfile.ZipFile(backup_filepath, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(instance_path):
-                # Evita incluir a subpasta de backups (se existir) dentro do novo backup
-                if 'backups' in dirs:
-                    dirs.remove('backups')
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, instance_path)
-                    zipf.write(file_path, arcname)
-        
-        return send_from_directory(directory=backup_dir, path=backup_filename, as_attachment=True)
+    """Backup ZIP da pasta 'instance' com cópias consistentes dos bancos.
+
+    Por padrão o ZIP é gerado enquanto é enviado (sem arquivo temporário);
+    com modo=tarefa vai para a fila e fica disponível na página da tarefa.
+    """
+    from datetime import datetime
+    from backup import gerar_zip, remover_temp_backups_legado
+    from jobs import gerenciador_tarefas
 
+    remover_temp_backups_legado()
+    if request.form.get('modo') != 'tarefa':
+        nome = f"backup_completo_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.zip"
+        return Response(gerar_zip(), mimetype='application/zip',
+                        headers={'Content-Disposition': f'attachment; filename={nome}',
+                                 'Cache-Control': 'no-store'})
+
+    try:
+        tarefa_id = gerenciador_tarefas.enviar('backup', usuario_id=session['user_id'])
     except Exception as e:
-        current_app.logger.error(f"Falha ao criar backup: {e}")
-        flash('Ocorreu um erro ao gerar o arquivo de backup.', 'danger')
+        current_app.logger.error(f"Falha ao enfileirar backup: {e}")
+        flash('Ocorreu um erro ao iniciar o backup.', 'danger')
+        return redirect(url_for('main.index'))
+    return redirect(url_for('system.ver_tarefa', tarefa_id=tarefa_id))
+
+
+def _tarefa_do_usuario(tarefa_id):
+    """Tarefa visível para o usuário logado (dono ou administrador), ou None."""
+    from jobs import gerenciador_tarefas
+    tarefa = gerenciador_tarefas.obter(tarefa_id)
+    if tarefa and (tarefa['usuario_id'] == session['user_id'] or eh_admin()):
+        return tarefa
+    return None
+
+
+def _status_tarefa(tarefa):
+    from jobs import TIPOS
+    return {
+        'id': tarefa['id'],
+        'tipo': tarefa['tipo'],
+        'titulo': TIPOS.get(tarefa['tipo'], {}).get('titulo', tarefa['tipo']),
+        'status': tarefa['status'],
+        'progresso': tarefa['progresso'],
+        'mensagem': tarefa['mensagem'],
+        'download': url_for('system.baixar_tarefa', tarefa_id=tarefa['id'])
+                    if tarefa['status'] == 'concluida' and tarefa['arquivo'] else None,
+    }
+
+
+@system_bp.route('/tarefas')
+@login_required
+def listar_tarefas():
+    """Tarefas em segundo plano do usuário (todas, para administradores)."""
+    from jobs import gerenciador_tarefas
+    usuario_id = None if eh_admin() else session['user_id']
+    tarefas = [_status_tarefa(t) | {'data_criacao': t['data_criacao'], 'data_fim': t['data_fim']}
+               for t in gerenciador_tarefas.listar(usuario_id)]
+    return render_template('tarefas.html', tarefas=tarefas)
+
+
+@system_bp.route('/tarefas/<tarefa_id>')
+@login_required
+def ver_tarefa(tarefa_id):
+    tarefa = _tarefa_do_usuario(tarefa_id)
+    if not tarefa:
+        flash('Tarefa não encontrada.', 'danger')
+        return redirect(url_for('system.listar_tarefas'))
+    return render_template('tarefa.html', tarefa=_status_tarefa(tarefa))
+
+
+@system_bp.route('/tarefas/<tarefa_id>/status')
+@limiter.exempt
+@login_required
+def status_tarefa(tarefa_id):
+    """Andamento da tarefa em JSON (consultado por polling)."""
+    tarefa = _tarefa_do_usuario(tarefa_id)
+    if not tarefa:
+        return jsonify({'erro': 'Tarefa não encontrada'}), 404
+    return jsonify(_status_tarefa(tarefa))
+
+
+@system_bp.route('/tarefas/<tarefa_id>/download')
+@login_required
+def baixar_tarefa(tarefa_id):
+    tarefa = _tarefa_do_usuario(tarefa_id)
+    if not tarefa or tarefa['status'] != 'concluida' or not tarefa['arquivo'] or not os.path.exists(tarefa['arquivo']):
+        flash('Arquivo não disponível.', 'danger')
+        return redirect(url_for('system.listar_tarefas'))
+    return send_from_directory(directory=os.path.dirname(tarefa['arquivo']),
+                               path=os.path.basename(tarefa['arquivo']), as_attachment=True)
+
+
+@system_bp.route('/tarefas/<tarefa_id>/cancelar', methods=['POST'])
+@login_required
+def cancelar_tarefa(tarefa_id):
+    from jobs import gerenciador_tarefas
+    tarefa = _tarefa_do_usuario(tarefa_id)
+    if not tarefa:
+        flash('Tarefa não encontrada.', 'danger')
+        return redirect(url_for('system.listar_tarefas'))
+    if tarefa['status'] in ('pendente', 'executando'):
+        gerenciador_tarefas.cancelar(tarefa_id)
+        flash('Cancelamento solicitado.', 'info')
+    return redirect(url_for('system.ver_tarefa', tarefa_id=tarefa_id))
+
+
+@system_bp.route('/limites')
+@login_required
+def metricas_limites():
+    """Requisições rejeitadas pelo rate limit nos últimos dias (admin)."""
+    from datetime import datetime
+    from limiter_storage import ArmazenamentoLimitesSQLite
+    if not eh_admin():
+        flash('Acesso negado.', 'danger')
+        return redirect(url_for('main.index'))
+    dias = request.args.get('dias', 7, type=int)
+    storage = limiter.storage
+    rejeicoes = storage.rejeicoes(dias) if isinstance(storage, ArmazenamentoLimitesSQLite) else None
+    for r in rejeicoes or []:
+        r['ultima'] = datetime.fromtimestamp(r['ultima']).strftime('%d/%m/%Y %H:%M')
+    return render_template('limites.html', rejeicoes=rejeicoes, dias=dias)
+
+
+@system_bp.route('/backups')
+@login_required
+def backups():
+    """Agendamento, histórico das rodadas e último snapshot de cada banco (admin)."""
+    from datetime import datetime
+    from backup_scheduler import agendador_backups
+    from backup_store import armazem_backups
+    from jobs import gerenciador_tarefas
+    from replication import replicador
+    if not eh_admin():
+        flash('Acesso negado.', 'danger')
         return redirect(url_for('main.index'))
 
+    def formatar(momento):
+        return datetime.fromtimestamp(momento).strftime('%d/%m/%Y %H:%M') if momento else None
+
+    estado = agendador_backups.estado()
+    estado['ultima_execucao'] = formatar(estado['ultima_execucao'])
+    estado['proxima_execucao'] = formatar(estado['proxima_execucao'])
+
+    rodadas = []
+    for t in gerenciador_tarefas.listar(limite=30, tipo='backup_incremental'):
+        duracao = None
+        if t['data_inicio'] and t['data_fim']:
+            duracao = (datetime.fromisoformat(t['data_fim']) - datetime.fromisoformat(t['data_inicio'])).total_seconds()
+        rodadas.append(_status_tarefa(t) | {'data_inicio': t['data_inicio'], 'duracao': duracao})
+
+    bancos = {}
+    for s in armazem_backups.snapshots():
+        banco = bancos.setdefault(s['banco'], s | {'retidos': 0})
+        banco['retidos'] += 1
+
+    replicacao = None
+    if replicador.ativo:
+        replicacao = replicador.estado()
+        for r in replicacao:
+            r['sincronizado_em'] = formatar(r['sincronizado_em'])
+
+    return render_template('backups.html', estado=estado, agendador=agendador_backups, rodadas=rodadas,
+                           bancos=sorted(bancos.values(), key=lambda b: b['banco']),
+                           estatisticas=armazem_backups.estatisticas(), replicacao=replicacao)
+
+
+@system_bp.route('/replicacao/status')
+@limiter.exempt
+@login_required
+def status_replicacao():
+    """Atraso da réplica standby por banco, em JSON (monitoramento)."""
+    from replication import replicador
+    if not eh_admin():
+        return jsonify({'erro': 'Acesso negado'}), 403
+    if not replicador.ativo:
+        return jsonify({'ativa': False, 'bancos': []})
+    bancos = replicador.estado()
+    atrasos = [b['atraso'] for b in bancos if b['atraso'] is not None]
+    return jsonify({'ativa': True, 'atraso_maximo': max(atrasos, default=0.0), 'bancos': bancos})
+
+
+@system_bp.route('/backups/executar', methods=['POST'])
+@limiter.limit(LIMITE_TAREFA_PESADA)
+@login_required
+def executar_backup_incremental():
+    from backup_scheduler import agendador_backups
+    if not eh_admin():
+        flash('Acesso negado.', 'danger')
+        return redirect(url_for('main.index'))
+    tarefa_id = agendador_backups.executar_agora(session['user_id'])
+    if not tarefa_id:
+        flash('Já existe uma rodada de backup em andamento.', 'warning')
+        return redirect(url_for('system.backups'))
+    return redirect(url_for('system.ver_tarefa', tarefa_id=tarefa_id))
+
+
+@system_bp.route('/notifications/recentes')
+@login_required
+def recent_notifications():
+    """Últimas notificações do usuário (carregadas ao abrir o menu do sino)."""
+    notificacoes = (Notificacao.query
+                    .filter_by(usuario_id=session['user_id'])
+                    .order_by(Notificacao.data_criacao.desc())
+                    .limit(5).all())
+    return jsonify([{
+        'mensagem': n.mensagem,
+        'lida': n.lida,
+        'data': n.data_criacao.strftime('%d/%m/%Y %H:%M') if n.data_criacao else '',
+        'url': url_for('system.read_notification', id=n.id),
+    } for n in notificacoes])
+
 
 @system_bp.route('/notifications/read/<int:id>')
 @login_required
@@ -73,4 +251,40 @@ def mark_all_notifications_as_read():
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Erro ao marcar notificações como lidas: {e}")
-    return redirect(request.referrer or url_for('main.index'))
\ No newline at end of file
+    return redirect(request.referrer or url_for('main.index'))
+
+@system_bp.route('/importar', methods=['GET', 'POST'])
+@admin_required
+def importar_catalogo():
+    """Importa produtos, setores ou fornecedores de CSV/XLSX para a unidade atual."""
+    from catalog_importer import ENTIDADES, ImportacaoErro, importar_arquivo
+    from routes.helpers import get_unit_db
+
+    if 'unit_id' not in session:
+        return redirect(url_for('main.selecionar_unidade'))
+
+    resultado = None
+    if request.method == 'POST':
+        entidade = request.form.get('entidade', '')
+        arquivo = request.files.get('arquivo')
+        unit_db = get_unit_db()
+
+        if entidade not in ENTIDADES:
+            flash('Selecione o tipo de cadastro a importar.', 'danger')
+        elif not arquivo or not arquivo.filename:
+            flash('Selecione um arquivo .csv ou .xlsx.', 'danger')
+        elif not unit_db:
+            flash('Erro ao conectar com o banco da unidade', 'danger')
+        else:
+            try:
+                resultado = importar_arquivo(unit_db, entidade, arquivo.stream, arquivo.filename,
+                                             usuario_id=session['user_id'])
+                flash(f"Importação concluída: {resultado['inseridos']} inseridos, "
+                      f"{resultado['atualizados']} atualizados, {resultado['ignorados']} ignorados.", 'success')
+            except ImportacaoErro as e:
+                flash(str(e), 'danger')
+            except Exception as e:
+                current_app.logger.error(f"Falha ao importar catálogo: {e}")
+                flash('Erro ao importar o arquivo. Nenhum registro foi gravado.', 'danger')
+
+    return render_template('importar_catalogo.html', entidades=list(ENTIDADES), resultado=resultado)
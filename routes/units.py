@@ -2,9 +2,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 import os
 import re
-import shutil
-from datetime import datetime, timezone
 from routes.helpers import admin_required
+from backup_store import armazem_backups
 
 units_bp = Blueprint('units', __name__, url_prefix='/unidades')
 
@@ -13,7 +12,8 @@ units_bp = Blueprint('units', __name__, url_prefix='/unidades')
 def listar_unidades():
     """Lista todas as unidades"""
     from flask import current_app
-    from app import Unidade
+    from app import db, Unidade
+    from models import usuario_unidade
     from database_config import get_all_units
     
     if 'user_id' not in session:
@@ -33,6 +33,12 @@ def listar_unidades():
                 'ativa': u.ativa,
             }
 
+        # Usuários com acesso por unidade (agregado direto no índice da unidade)
+        usuarios_por_unidade = dict(db.session.execute(
+            db.select(usuario_unidade.c.unidade_id, db.func.count())
+            .group_by(usuario_unidade.c.unidade_id)
+        ).all())
+
         # Montar lista unificada como dicts simples (evita problemas de sessão SQLAlchemy no Jinja2)
         unidades = []
         for uid, cfg in sorted(todas.items(), key=lambda x: x[1].get('name', '')):
@@ -45,6 +51,7 @@ def listar_unidades():
                     'database': cfg.get('database', ''),
                     'ativa': 1,
                 })
+            unidades[-1]['usuarios'] = usuarios_por_unidade.get(uid, 0)
 
         current_app.logger.info(f"[listar_unidades] total={len(unidades)}")
         return render_template('listar_unidades.html', unidades=unidades)
@@ -61,6 +68,7 @@ def novo_unidade():
     from app import db, Unidade
     from database_config import DATABASES
     from database_manager import db_manager
+    from unit_template import modelo_unidade
     
     if request.method == 'POST':
         unit_id = request.form.get('unit_id', '').strip()
@@ -115,7 +123,8 @@ def novo_unidade():
         }
 
         try:
-            db_manager.init_database(unit_id)
+            # Cópia do banco modelo (schema atual e sementes) em vez do DDL
+            modelo_unidade.provisionar(unit_id)
             flash('Unidade criada com sucesso e banco inicializado.', 'success')
             
             # Admin automaticamente tem acesso a qualquer unidade
@@ -193,8 +202,8 @@ def editar_unidade(unit_id):
 def excluir_unidade(unit_id):
     """Excluir unidade"""
     from app import db, Unidade, Usuario
+    from models import usuario_unidade
     from database_config import DATABASES
-    import json
     
     unidade = Unidade.query.get_or_404(unit_id)
     from app import db_path
@@ -206,11 +215,9 @@ def excluir_unidade(unit_id):
             if arquivo:
                 src = os.path.join(instance_dir, arquivo)
                 if os.path.exists(src):
-                    backups_dir = os.path.join(instance_dir, 'backups')
-                    os.makedirs(backups_dir, exist_ok=True)
-                    ts = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
-                    dst = os.path.join(backups_dir, f"{unit_id}_{ts}.db")
-                    shutil.copy2(src, dst)
+                    # Snapshot no armazém incremental: só os blocos que ainda
+                    # não estão em backups anteriores são gravados
+                    armazem_backups.salvar(unit_id, src, etiqueta='exclusao')
 
                     if request.form.get('remover_arquivo') == 'on':
                         try:
@@ -220,22 +227,21 @@ def excluir_unidade(unit_id):
 
             db.session.delete(unidade)
 
-            usuarios = Usuario.query.all()
-            for u in usuarios:
-                try:
-                    unidades = u.get_unidades_acesso()
-                    if unit_id in unidades:
-                        unidades.remove(unit_id)
-                        u.unidades_acesso = json.dumps(unidades) if unidades else None
-                except Exception:
-                    pass
+            # Revoga o acesso pelo índice da unidade; a versão das permissões
+            # dos usuários afetados muda junto, no mesmo commit
+            com_acesso = db.select(usuario_unidade.c.usuario_id).where(usuario_unidade.c.unidade_id == unit_id)
+            db.session.execute(
+                db.update(Usuario).where(Usuario.id.in_(com_acesso))
+                .values(versao_permissoes=Usuario.versao_permissoes + 1)
+            )
+            db.session.execute(usuario_unidade.delete().where(usuario_unidade.c.unidade_id == unit_id))
 
             db.session.commit()
 
             if unit_id in DATABASES:
                 del DATABASES[unit_id]
 
-            flash('Unidade excluída. Backup criado em instance/backups/.', 'success')
+            flash('Unidade excluída. Snapshot guardado no armazém de backups (scripts/restaurar_backup.py).', 'success')
             return redirect(url_for('users.tabela'))
 
         except Exception as e:
@@ -1,8 +1,9 @@
 # Rotas de Gerenciamento de Usuários
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
-from routes.helpers import admin_required
+from routes.helpers import admin_required, invalidar_permissoes, eh_admin
+from server_sessions import revogar_sessoes_usuario
 
 users_bp = Blueprint('users', __name__)
 
@@ -47,7 +48,7 @@ def editar(id):
     unidades = None
     permissoes_atual = json.loads(usuario.permissoes_menu) if usuario.permissoes_menu else {}
 
-    if session.get('user_tipo') != 'admin' and session.get('user_id') != usuario.id:
+    if not eh_admin() and session.get('user_id') != usuario.id:
         flash('Acesso negado.', 'danger')
         return redirect(url_for('main.index'))
 
@@ -73,11 +74,13 @@ def editar(id):
         if nova_senha:
             usuario.senha = generate_password_hash(nova_senha)
 
-        if session.get('user_tipo') == 'admin':
+        tipo_alterado = False
+        if eh_admin():
+            tipo_alterado = request.form.get('tipo', usuario.tipo) != usuario.tipo
             usuario.tipo = request.form.get('tipo', usuario.tipo)
             
             unidades = request.form.getlist('unidades')
-            usuario.unidades_acesso = json.dumps(unidades) if unidades else None
+            usuario.set_unidades_acesso(unidades)
             
             pode_cadastrar = request.form.get('pode_cadastrar')
             usuario.pode_cadastrar = 1 if pode_cadastrar == '1' or pode_cadastrar == 'on' else 0
@@ -98,19 +101,21 @@ def editar(id):
             
             usuario.permissoes_menu = json.dumps(todas_permissoes)
             permissoes_atual = todas_permissoes
-            
-            if session.get('user_id') == usuario.id:
-                session['permissoes_menu'] = todas_permissoes
+            # Vale já na próxima requisição do usuário, sem novo login
+            invalidar_permissoes(usuario)
 
         try:
             db.session.commit()
+            # O tipo fica na sessão: encerra as sessões abertas do usuário
+            if tipo_alterado and usuario.id != session.get('user_id'):
+                revogar_sessoes_usuario(current_app, usuario.id)
             flash('Usuário atualizado com sucesso!', 'success')
             return redirect(url_for('users.tabela'))
         except Exception as e:
             db.session.rollback()
             flash('Erro ao atualizar usuário!', 'danger')
 
-    if session.get('user_tipo') == 'admin':
+    if eh_admin():
         unidades = get_all_units()
 
     return render_template('editar.html', 
@@ -151,10 +156,6 @@ def novo_usuario():
         
         senha_hash = generate_password_hash(senha)
         
-        unidades_acesso = None
-        if unidades:
-            unidades_acesso = json.dumps(unidades)
-        
         permissoes_menu = {}
         if tipo == 'admin':
             permissoes_menu = {
@@ -177,13 +178,14 @@ def novo_usuario():
             matricula=matricula if matricula else None,
             senha=senha_hash, 
             tipo=tipo, 
-            unidades_acesso=unidades_acesso, 
             pode_cadastrar=int(pode_cadastrar),
             permissoes_menu=json.dumps(permissoes_menu)
         )
         
         try:
             db.session.add(novo_usuario)
+            db.session.flush()
+            novo_usuario.set_unidades_acesso(unidades)
             db.session.commit()
             flash('Usuário cadastrado com sucesso!', 'success')
             return redirect(url_for('users.usuarios'))
@@ -223,8 +225,10 @@ def excluir(id):
         return redirect(url_for('users.usuarios'))
     
     try:
+        usuario.set_unidades_acesso([])
         db.session.delete(usuario)
         db.session.commit()
+        revogar_sessoes_usuario(current_app, id)
         flash('Usuário excluído com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,34 @@
+"""Atualiza a base analítica consolidada (instance/analytics.db).
+
+Uso:
+    python scripts/atualizar_analytics.py              # todas as unidades ativas
+    python scripts/atualizar_analytics.py <unit_id>... # apenas as unidades informadas
+
+A carga é incremental (só movimentações novas ou excluídas desde a última
+execução), então pode ser agendada (cron) com frequência.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from analytics import atualizar
+
+
+def main():
+    inicio = time.perf_counter()
+    resultados = atualizar(sys.argv[1:] or None)
+    if not resultados:
+        print('Nenhuma unidade ativa.')
+    for unit_id, resultado in resultados.items():
+        if 'erro' in resultado:
+            print(f"{unit_id}: ERRO {resultado['erro']}")
+        else:
+            print(f"{unit_id}: {resultado['movimentacoes']} movimentações, {resultado['exclusoes']} exclusões, "
+                  f"{resultado['produtos']} produtos ({resultado['segundos']}s)")
+    print(f'Concluído em {time.perf_counter() - inicio:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Backup incremental dos bancos no armazém de blocos (instance/backups/armazem).
+
+Uso:
+    python scripts/backup_incremental.py                   # banco central e todas as unidades
+    python scripts/backup_incremental.py <banco>...        # 'central' ou ids de unidade
+    python scripts/backup_incremental.py --sem-retencao    # não aplica a política de retenção
+
+Só os blocos alterados desde os snapshots anteriores são gravados. Depois
+do backup, a retenção padrão (backup_store.RETENCAO_PADRAO) remove os
+snapshots antigos e os blocos que ficaram sem uso.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from backup_store import armazem_backups, bancos_para_backup
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    retencao = '--sem-retencao' not in sys.argv[1:]
+
+    inicio = time.perf_counter()
+    for banco in args or bancos_para_backup():
+        try:
+            s = armazem_backups.salvar(banco)
+        except FileNotFoundError as e:
+            print(f'{banco}: ERRO {e}')
+            continue
+        print(f"{banco}: snapshot {s['id']} ({s['tamanho'] / 1024 / 1024:.1f} MB), {s['blocos_novos']} de "
+              f"{s['blocos']} blocos novos, {s['bytes_gravados'] / 1024:.0f} KB gravados ({s['duracao']}s)")
+
+    if retencao:
+        snapshots, objetos = armazem_backups.aplicar_retencao()
+        print(f'Retenção: {snapshots} snapshots e {objetos} blocos removidos')
+
+    e = armazem_backups.estatisticas()
+    print(f"Armazém: {e['snapshots']} snapshots, {e['bytes_logicos'] / 1024 / 1024:.1f} MB lógicos "
+          f"em {e['bytes_gravados'] / 1024 / 1024:.1f} MB gravados")
+    print(f'Concluído em {time.perf_counter() - inicio:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Mede o tempo de backup em função do tamanho do banco.
+
+Uso:
+    python scripts/benchmark_backup.py [tamanho_mb...]   # padrão: 10 50 200
+
+Para cada tamanho cria um banco sintético de movimentações em uma pasta
+temporária e compara a cópia completa (backup antigo) com o armazém
+incremental: primeiro snapshot, snapshot após um "dia" de uso (0,1% das
+linhas alteradas e outro tanto acrescentado) e restauração. Nada é gravado em instance/.
+"""
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from backup import copiar_banco
+from backup_store import ArmazemBackups
+
+# Bytes aproximados por linha sintética
+BYTES_POR_LINHA = 200
+
+
+def criar_banco(caminho, tamanho_mb):
+    conn = sqlite3.connect(caminho)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''CREATE TABLE movimentacoes (
+        id INTEGER PRIMARY KEY, produto_id INTEGER, tipo TEXT, quantidade INTEGER,
+        data_movimentacao TEXT, observacao TEXT)''')
+    linhas = tamanho_mb * 1024 * 1024 // BYTES_POR_LINHA
+    aleatorio = random.Random(42)
+    conn.executemany(
+        'INSERT INTO movimentacoes (produto_id, tipo, quantidade, data_movimentacao, observacao) VALUES (?, ?, ?, ?, ?)',
+        ((aleatorio.randrange(5000), aleatorio.choice(('entrada', 'saida')), aleatorio.randrange(1, 100),
+          f'2024-{aleatorio.randrange(1, 13):02d}-{aleatorio.randrange(1, 29):02d}',
+          os.urandom(60).hex()) for _ in range(linhas))
+    )
+    conn.commit()
+    conn.close()
+    return linhas
+
+
+def alterar(caminho, linhas, fracao=0.001):
+    """Atualiza uma fração das linhas e acrescenta outra igual no fim."""
+    conn = sqlite3.connect(caminho)
+    aleatorio = random.Random(7)
+    quantidade = max(1, int(linhas * fracao))
+    conn.executemany('UPDATE movimentacoes SET quantidade = quantidade + 1 WHERE id = ?',
+                     ((aleatorio.randrange(1, linhas + 1),) for _ in range(quantidade)))
+    conn.executemany('INSERT INTO movimentacoes (produto_id, tipo, quantidade, observacao) VALUES (?, ?, ?, ?)',
+                     ((1, 'saida', 1, os.urandom(60).hex()) for _ in range(quantidade)))
+    conn.commit()
+    conn.close()
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    tamanhos = [int(a) for a in sys.argv[1:]] or [10, 50, 200]
+    pasta = tempfile.mkdtemp(prefix='benchmark_backup_')
+    try:
+        print(f"{'MB':>6} {'cópia':>8} {'1º snap':>8} {'incr.':>8} {'grav. incr.':>12} {'restaurar':>10}")
+        for tamanho_mb in tamanhos:
+            banco = os.path.join(pasta, f'unidade_{tamanho_mb}.db')
+            linhas = criar_banco(banco, tamanho_mb)
+            armazem = ArmazemBackups(os.path.join(pasta, f'armazem_{tamanho_mb}'))
+
+            t_copia, _ = cronometrar(copiar_banco, banco, os.path.join(pasta, 'copia.db'))
+            t_primeiro, _ = cronometrar(armazem.salvar, 'bench', banco)
+            alterar(banco, linhas)
+            t_incremental, snapshot = cronometrar(armazem.salvar, 'bench', banco)
+            t_restaurar, _ = cronometrar(armazem.restaurar, snapshot['id'], os.path.join(pasta, 'restaurado.db'))
+
+            real_mb = snapshot['tamanho'] / 1024 / 1024
+            gravado = f"{snapshot['bytes_gravados'] / 1024 / 1024:.1f} MB"
+            print(f'{real_mb:6.0f} {t_copia:7.2f}s {t_primeiro:7.2f}s {t_incremental:7.2f}s '
+                  f'{gravado:>12} {t_restaurar:9.2f}s')
+            for nome in ('copia.db', 'restaurado.db', os.path.basename(banco)):
+                for sufixo in ('', '-wal', '-shm'):
+                    if os.path.exists(os.path.join(pasta, nome + sufixo)):
+                        os.remove(os.path.join(pasta, nome + sufixo))
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Classifica os produtos das unidades em ABC (volume) e XYZ (regularidade).
+
+Uso:
+    python scripts/classificar_produtos.py [unit_id|all] [dias_historico]
+
+As classes ficam gravadas em produtos.classe_abc/classe_xyz e podem ser usadas
+como filtro na listagem de produtos e nos relatórios por período.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from classification import classificar_unidade
+from database_config import get_all_units
+from database_manager import db_manager
+
+
+def main():
+    alvo = sys.argv[1] if len(sys.argv) > 1 else 'all'
+    dias_historico = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    unidades = list(get_all_units().keys()) if alvo == 'all' else [alvo]
+    if not unidades:
+        print('Nenhuma unidade cadastrada.')
+        return
+
+    for unit_id in unidades:
+        inicio = time.perf_counter()
+        try:
+            conn = db_manager.get_connection(unit_id, use_cache=False)
+        except ValueError as e:
+            print(f'{unit_id}: {e}')
+            continue
+        try:
+            resultado = classificar_unidade(conn, dias_historico=dias_historico)
+        except ValueError as e:
+            print(f'{unit_id}: {e}')
+            continue
+        finally:
+            conn.close()
+        abc = ' '.join(f'{c}={n}' for c, n in resultado['abc'].items())
+        xyz = ' '.join(f'{c}={n}' for c, n in resultado['xyz'].items())
+        print(f"{unit_id}: {resultado['produtos']} produtos ({abc} | {xyz}) em {time.perf_counter() - inicio:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
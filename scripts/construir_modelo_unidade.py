@@ -0,0 +1,55 @@
+"""Gera o banco modelo usado na criação de unidades (instance/modelos).
+
+Uso:
+    python scripts/construir_modelo_unidade.py            # gera se a versão atual ainda não existir
+    python scripts/construir_modelo_unidade.py --forcar   # reconstrói a versão atual
+
+O modelo tem o schema da unidade já migrado e, se houver, os arquivos
+setores, fornecedores e produtos (.csv ou .xlsx) da pasta de sementes
+(UNIDADE_SEMENTES_DIR, padrão instance/modelos/sementes). Mudar o schema ou
+as sementes gera uma nova versão; as anteriores são apagadas.
+"""
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from dotenv import load_dotenv
+
+from catalog_importer import ImportacaoErro
+from unit_template import arquivos_semente, modelo_unidade
+
+
+def main():
+    load_dotenv()
+    argumentos = sys.argv[1:]
+    if any(a not in ('--forcar',) for a in argumentos):
+        print(__doc__)
+        sys.exit(1)
+
+    sementes = arquivos_semente(modelo_unidade.sementes_dir)
+    print(f'Sementes ({modelo_unidade.sementes_dir}): '
+          f"{', '.join(os.path.basename(c) for _, c in sementes) or 'nenhuma'}")
+
+    inicio = time.perf_counter()
+    try:
+        caminho = modelo_unidade.construir(forcar='--forcar' in argumentos)
+    except (OSError, ImportacaoErro) as e:
+        print(f'Erro: {e}')
+        sys.exit(1)
+
+    conn = sqlite3.connect(caminho)
+    try:
+        contagens = {tabela: conn.execute(f'SELECT COUNT(*) FROM {tabela}').fetchone()[0]
+                     for tabela in ('setores', 'fornecedores', 'produtos')}
+    finally:
+        conn.close()
+    print(f'Modelo {modelo_unidade.versao()}: {caminho} '
+          f'({os.path.getsize(caminho) // 1024} KiB, {time.perf_counter() - inicio:.2f}s)')
+    print('  ' + ', '.join(f'{tabela}: {n}' for tabela, n in contagens.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-import sqlite3, sys, os, json
+import sqlite3, sys, os
 
 if len(sys.argv) < 2:
     print('Uso: python grant_units.py <email> [unit1,unit2,...|all]')
@@ -40,15 +40,18 @@ else:
         sys.exit(1)
 
 # Atualizar usuário
-cur.execute('SELECT id,nome,email,unidades_acesso FROM usuarios WHERE email=?', (email,))
+cur.execute('SELECT id,nome,email FROM usuarios WHERE email=?', (email,))
 user = cur.fetchone()
 if not user:
     print('Usuário não encontrado:', email)
     conn.close()
     sys.exit(1)
 
-unidades_json = json.dumps(selected)
-cur.execute('UPDATE usuarios SET unidades_acesso=? WHERE email=?', (unidades_json, email))
+cur.execute('DELETE FROM usuario_unidade WHERE usuario_id=?', (user['id'],))
+cur.executemany('INSERT INTO usuario_unidade (usuario_id, unidade_id) VALUES (?, ?)',
+                [(user['id'], u) for u in selected])
+# Invalida as permissões em cache da aplicação
+cur.execute('UPDATE usuarios SET versao_permissoes = versao_permissoes + 1 WHERE id=?', (user['id'],))
 conn.commit()
 print(f'Atualizado usuário {email} com unidades: {selected}')
 conn.close()
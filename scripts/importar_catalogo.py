@@ -0,0 +1,50 @@
+"""Importa produtos, setores ou fornecedores de um arquivo CSV/XLSX para uma unidade.
+
+Uso:
+    python scripts/importar_catalogo.py <unit_id> <produtos|setores|fornecedores> <arquivo>
+
+O arquivo precisa de uma coluna "nome". Registros já cadastrados (mesmo nome
+ou, para fornecedores, mesmo CNPJ) são atualizados; os demais são inseridos.
+XLSX requer o pacote openpyxl.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from catalog_importer import ENTIDADES, ImportacaoErro, importar_arquivo
+from database_manager import db_manager
+
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[2] not in ENTIDADES:
+        print(__doc__)
+        sys.exit(1)
+    unit_id, entidade, caminho = sys.argv[1:]
+
+    try:
+        conn = db_manager.get_connection(unit_id, use_cache=False)
+    except ValueError as e:
+        print(f'{unit_id}: {e}')
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    try:
+        with open(caminho, 'rb') as arquivo:
+            resultado = importar_arquivo(conn, entidade, arquivo, caminho)
+    except (OSError, ImportacaoErro) as e:
+        print(f'Erro: {e}')
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    for mensagem in resultado['erros']:
+        print(f'  ! {mensagem}')
+    print(f"{unit_id}/{entidade}: {resultado['inseridos']} inseridos, "
+          f"{resultado['atualizados']} atualizados, {resultado['ignorados']} ignorados "
+          f"em {time.perf_counter() - inicio:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
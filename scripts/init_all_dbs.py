@@ -4,6 +4,7 @@ Execute:
     python scripts/init_all_dbs.py
 """
 from database_manager import db_manager
+from unit_template import modelo_unidade
 from database_config import DATABASES
 
 def main():
@@ -13,7 +14,8 @@ def main():
 
     for unit_id in DATABASES.keys():
         print(f'Inicializando banco da unidade: {unit_id} ...')
-        db_manager.init_database(unit_id)
+        # Arquivo novo sai do banco modelo; existente só é migrado
+        modelo_unidade.provisionar(unit_id)
         print(f'Unidade {unit_id} pronta.')
 
     print('Todas as bases inicializadas com sucesso.')
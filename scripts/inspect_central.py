@@ -1,4 +1,4 @@
-import sqlite3, sys, os, json
+import sqlite3, sys, os
 
 email = sys.argv[1] if len(sys.argv) > 1 else None
 base = os.path.abspath(os.path.dirname(__file__))
@@ -34,17 +34,16 @@ except Exception as e:
 if email:
     print(f"\n--- USUARIO: {email} ---")
     try:
-        cur.execute('SELECT id,nome,email,tipo,unidades_acesso,ativo FROM usuarios WHERE email=?',(email,))
+        cur.execute('''
+            SELECT id,nome,email,tipo,ativo,
+                   (SELECT group_concat(unidade_id) FROM usuario_unidade WHERE usuario_id = usuarios.id) AS unidades
+            FROM usuarios WHERE email=?
+        ''',(email,))
         rows = cur.fetchall()
         if rows:
             for r in rows:
                 d = dict(r)
-                # tentar decodificar unidades_acesso se for JSON
-                try:
-                    if d.get('unidades_acesso'):
-                        d['unidades_acesso'] = json.loads(d['unidades_acesso'])
-                except Exception:
-                    pass
+                d['unidades'] = d['unidades'].split(',') if d['unidades'] else []
                 print(d)
         else:
             print('Nenhum usuário com esse email')
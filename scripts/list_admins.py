@@ -1,4 +1,4 @@
-import sqlite3, os, json
+import sqlite3, os
 
 base = os.path.abspath(os.path.dirname(__file__))
 db_path = os.path.normpath(os.path.join(base, '..', 'instance', 'central.db'))
@@ -10,17 +10,17 @@ if not os.path.exists(db_path):
 conn = sqlite3.connect(db_path)
 conn.row_factory = sqlite3.Row
 cur = conn.cursor()
-cur.execute("SELECT id,nome,email,tipo,unidades_acesso,ativo FROM usuarios WHERE tipo='admin'")
+cur.execute('''
+    SELECT id,nome,email,tipo,ativo,
+           (SELECT group_concat(unidade_id) FROM usuario_unidade WHERE usuario_id = usuarios.id) AS unidades
+    FROM usuarios WHERE tipo='admin'
+''')
 rows = cur.fetchall()
 if not rows:
     print('Nenhum admin encontrado')
 else:
     for r in rows:
         d = dict(r)
-        try:
-            if d.get('unidades_acesso'):
-                d['unidades_acesso'] = json.loads(d['unidades_acesso'])
-        except Exception:
-            pass
+        d['unidades'] = d['unidades'].split(',') if d['unidades'] else []
         print(d)
 conn.close()
@@ -27,8 +27,8 @@ if row:
     cur.execute('UPDATE usuarios SET nome=?, senha=?, tipo=?, ativo=1 WHERE email=?', ("Administrador", senha_hash, 'admin', email))
     print('Usuário existente atualizado como admin:', email)
 else:
-    cur.execute('INSERT INTO usuarios (nome,email,senha,tipo,unidades_acesso,ativo) VALUES (?,?,?,?,?,?)', (
-        'Administrador', email, senha_hash, 'admin', '[]', 1
+    cur.execute('INSERT INTO usuarios (nome,email,senha,tipo,ativo) VALUES (?,?,?,?,?)', (
+        'Administrador', email, senha_hash, 'admin', 1
     ))
     print('Usuário admin criado:', email)
 
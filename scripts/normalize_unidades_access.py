@@ -1,48 +1,75 @@
-import sqlite3, os, json
+"""Migra a antiga coluna JSON usuarios.unidades_acesso para a tabela usuario_unidade.
 
-base = os.path.abspath(os.path.dirname(__file__))
-db_path = os.path.normpath(os.path.join(base, '..', 'instance', 'central.db'))
+Uso:
+    python scripts/normalize_unidades_access.py [--remover-coluna]
 
-if not os.path.exists(db_path):
-    print('Banco central não encontrado:', db_path)
-    exit(1)
+A atualização de schema do banco central já copia os valores em JSON válido;
+este script trata também os formatos antigos (listas Python, texto vazio) e
+lista as unidades que não existem mais. Com --remover-coluna, apaga a coluna
+JSON depois da migração.
+"""
+import ast
+import json
+import os
+import sys
 
-conn = sqlite3.connect(db_path)
-cur = conn.cursor()
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
 
-# Buscar todos os usuários
-cur.execute('SELECT id, nome, email, unidades_acesso FROM usuarios')
-rows = cur.fetchall()
+from database_manager import db_manager
 
-for row in rows:
-    user_id, nome, email, unidades_acesso = row
-    print(f'Processando {email}: {unidades_acesso}')
 
-    if unidades_acesso is None or unidades_acesso.strip() == '':
-        # Se vazio, definir como lista vazia
-        new_value = '[]'
-    else:
-        # Tentar parsear e re-serializar como JSON válido
+def ler_unidades(valor):
+    """Lista de IDs a partir do valor gravado (JSON ou lista Python)."""
+    if valor is None or not valor.strip():
+        return []
+    for parser in (json.loads, ast.literal_eval):
         try:
-            # Tentar JSON
-            parsed = json.loads(unidades_acesso)
-            new_value = json.dumps(parsed)
-        except:
-            try:
-                # Tentar ast.literal_eval
-                import ast
-                parsed = ast.literal_eval(unidades_acesso)
-                if isinstance(parsed, list):
-                    new_value = json.dumps(parsed)
-                else:
-                    new_value = '[]'
-            except:
-                # Se falhar, definir como lista vazia
-                new_value = '[]'
-
-    print(f'  -> {new_value}')
-    cur.execute('UPDATE usuarios SET unidades_acesso = ? WHERE id = ?', (new_value, user_id))
-
-conn.commit()
-conn.close()
-print('Normalização concluída!')
+            lista = parser(valor)
+        except (ValueError, SyntaxError):
+            continue
+        if isinstance(lista, (list, tuple)):
+            return [str(u) for u in lista]
+        return []
+    return []
+
+
+def main():
+    remover_coluna = '--remover-coluna' in sys.argv[1:]
+
+    conn = db_manager.get_connection(None, use_cache=False)
+    try:
+        db_manager.upgrade_central_schema(conn)
+        cur = conn.cursor()
+        colunas = [r[1] for r in cur.execute('PRAGMA table_info(usuarios)')]
+        if 'unidades_acesso' not in colunas:
+            print('Coluna unidades_acesso já removida; nada a migrar.')
+            return
+
+        existentes = {r[0] for r in cur.execute('SELECT id FROM unidades')}
+        usuarios = cur.execute('SELECT id, email, unidades_acesso FROM usuarios').fetchall()
+
+        linhas = []
+        for usuario_id, email, valor in usuarios:
+            unidades = ler_unidades(valor)
+            invalidas = [u for u in unidades if u not in existentes]
+            if invalidas:
+                print(f'{email}: unidades inexistentes ignoradas: {invalidas}')
+            linhas.extend((usuario_id, u) for u in unidades if u in existentes)
+
+        cur.executemany('INSERT OR IGNORE INTO usuario_unidade (usuario_id, unidade_id) VALUES (?, ?)', linhas)
+        inseridas = cur.rowcount
+        cur.execute('UPDATE usuarios SET versao_permissoes = versao_permissoes + 1')
+        if remover_coluna:
+            cur.execute('ALTER TABLE usuarios DROP COLUMN unidades_acesso')
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(f'{len(usuarios)} usuários verificados, {inseridas} acessos novos em usuario_unidade.')
+    if remover_coluna:
+        print('Coluna unidades_acesso removida.')
+    print('Normalização concluída!')
+
+
+if __name__ == '__main__':
+    main()
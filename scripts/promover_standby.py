@@ -0,0 +1,45 @@
+"""Promove a cópia standby (REPLICA_DIR) a banco em uso.
+
+Uso:
+    python scripts/promover_standby.py <banco>...   # 'central' ou ids de unidade
+    python scripts/promover_standby.py --todos
+
+Pare o servidor antes. O banco atual de cada item é renomeado para
+*.antes_promocao_<data> na pasta instance e a cópia standby, conferida
+com PRAGMA quick_check, passa a ser o banco em uso.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from dotenv import load_dotenv
+
+from replication import replicador
+
+
+def main():
+    load_dotenv()
+    replicador.configurar(os.getenv('REPLICA_DIR'))
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if not replicador.ativo or not (args or '--todos' in sys.argv[1:]):
+        print(__doc__)
+        sys.exit(1)
+
+    estado = {r['banco']: r for r in replicador.estado()}
+    bancos = list(estado) if '--todos' in sys.argv[1:] else args
+    falhas = 0
+    for banco in bancos:
+        try:
+            destino = replicador.promover(banco)
+        except Exception as e:
+            print(f'{banco}: ERRO {e}')
+            falhas += 1
+            continue
+        atraso = estado.get(banco, {}).get('atraso')
+        print(f'{banco}: promovido para {destino}' + (f' (atraso da réplica: {atraso}s)' if atraso else ''))
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Recalcula o estoque mínimo sugerido (previsão de demanda) das unidades.
+
+Uso:
+    python scripts/recalcular_estoque_minimo.py [unit_id|all] [metodo]
+
+metodo: media_movel (padrão) ou suavizacao_exponencial
+As sugestões ficam gravadas em produtos.estoque_minimo_sugerido e devem ser
+revisadas/aplicadas por um administrador em /produtos/estoque-minimo.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from database_config import get_all_units
+from database_manager import db_manager
+from forecasting import recalcular_estoque_minimo
+
+
+def main():
+    alvo = sys.argv[1] if len(sys.argv) > 1 else 'all'
+    metodo = sys.argv[2] if len(sys.argv) > 2 else None
+
+    unidades = list(get_all_units().keys()) if alvo == 'all' else [alvo]
+    if not unidades:
+        print('Nenhuma unidade cadastrada.')
+        return
+
+    for unit_id in unidades:
+        inicio = time.perf_counter()
+        try:
+            conn = db_manager.get_connection(unit_id, use_cache=False)
+        except ValueError as e:
+            print(f'{unit_id}: {e}')
+            continue
+        try:
+            total = recalcular_estoque_minimo(conn, metodo=metodo)
+        finally:
+            conn.close()
+        print(f'{unit_id}: {total} produtos em {time.perf_counter() - inicio:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
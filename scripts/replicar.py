@@ -0,0 +1,71 @@
+"""Replica os bancos para o standby (REPLICA_DIR).
+
+Uso:
+    python scripts/replicar.py               # um ciclo: envia as páginas alteradas
+    python scripts/replicar.py --continuo    # em laço (um processo por vez, via lease)
+    python scripts/replicar.py --status      # atraso da réplica por banco
+
+Com REPLICA_DIR definido o próprio servidor já replica em segundo plano;
+este script serve para a carga inicial, para rodar a replicação fora dos
+workers web ou para monitorar o atraso.
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from dotenv import load_dotenv
+
+from replication import INTERVALO_REPLICACAO, replicador
+
+
+def status():
+    linhas = replicador.estado()
+    if not linhas:
+        print('Nenhum banco replicado ainda.')
+    for r in linhas:
+        atraso = 'origem ausente' if r['atraso'] is None else f"{r['atraso']:.1f}s"
+        print(f"{r['banco']:<24} atraso {atraso:>10}  estado de "
+              f"{datetime.fromtimestamp(r['sincronizado_em']):%d/%m/%Y %H:%M:%S}  "
+              f"{r['tamanho'] / 1024 / 1024:.1f} MB")
+
+
+def ciclo():
+    inicio = time.perf_counter()
+    for r in replicador.ciclo():
+        print(f"{r['banco']}: {r['paginas_enviadas']} páginas, {r['bytes_enviados'] / 1024:.0f} KB ({r['duracao']}s)")
+    print(f'Ciclo concluído em {time.perf_counter() - inicio:.2f}s')
+
+
+def main():
+    load_dotenv()
+    replicador.configurar(os.getenv('REPLICA_DIR'), int(os.getenv('REPLICACAO_INTERVALO', INTERVALO_REPLICACAO)))
+    if not replicador.ativo:
+        print('Defina REPLICA_DIR (pasta do standby).')
+        sys.exit(1)
+
+    if '--status' in sys.argv[1:]:
+        status()
+    elif '--continuo' in sys.argv[1:]:
+        print(f'Replicando para {replicador.diretorio} a cada {replicador.intervalo}s (Ctrl+C para sair)')
+        try:
+            while True:
+                if replicador.lease.renovar() or replicador.lease.adquirir():
+                    ciclo()
+                time.sleep(replicador.intervalo)
+        except KeyboardInterrupt:
+            replicador.parar()
+    else:
+        if not (replicador.lease.renovar() or replicador.lease.adquirir()):
+            print('Outro processo está replicando agora.')
+            sys.exit(1)
+        try:
+            ciclo()
+        finally:
+            replicador.lease.liberar()
+
+
+if __name__ == '__main__':
+    main()
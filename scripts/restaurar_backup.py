@@ -0,0 +1,110 @@
+"""Restaura um banco a partir do armazém de backups incrementais.
+
+Uso:
+    python scripts/restaurar_backup.py <banco> --listar
+    python scripts/restaurar_backup.py <banco> [snapshot_id | AAAA-MM-DDTHH:MM] [--destino arquivo.db]
+    python scripts/restaurar_backup.py <banco> [snapshot_id | AAAA-MM-DDTHH:MM] --substituir
+
+<banco> é 'central' ou o id da unidade (inclusive unidades já excluídas).
+Sem snapshot, usa o mais recente; com data/hora, o mais recente até ela.
+Por padrão o arquivo é remontado em instance/backups/restaurados/. Com
+--substituir, o estado atual do banco é guardado em um snapshot antes e o
+conteúdo restaurado é copiado sobre o banco em uso (API de backup do
+SQLite, as conexões abertas enxergam o novo conteúdo).
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from backup import INSTANCE_DIR
+from backup_store import SnapshotInvalido, armazem_backups, caminho_do_banco
+
+
+def listar(banco):
+    snapshots = armazem_backups.snapshots(banco)
+    if not snapshots:
+        print(f'Nenhum snapshot de {banco}.')
+    for s in snapshots:
+        print(f"{s['id']:>6}  {s['criado_em'][:19]}  {s['tamanho'] / 1024 / 1024:8.1f} MB  "
+              f"{s['blocos_novos']:>6} blocos novos  {s['etiqueta'] or ''}")
+
+
+def escolher_snapshot(banco, valor):
+    if valor is None:
+        return armazem_backups.localizar(banco)
+    if valor.isdigit():
+        return next((s for s in armazem_backups.snapshots(banco) if s['id'] == int(valor)), None)
+    return armazem_backups.localizar(banco, valor)
+
+
+def substituir(restaurado, destino):
+    """Copia o banco restaurado sobre o banco em uso."""
+    fonte = sqlite3.connect(restaurado)
+    try:
+        alvo = sqlite3.connect(destino, timeout=60.0)
+        try:
+            fonte.backup(alvo)
+        finally:
+            alvo.close()
+    finally:
+        fonte.close()
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+    banco = args[0]
+    if '--listar' in sys.argv[1:]:
+        listar(banco)
+        return
+
+    snapshot = escolher_snapshot(banco, args[1] if len(args) > 1 else None)
+    if snapshot is None:
+        print(f'Snapshot não encontrado para {banco}.')
+        sys.exit(1)
+
+    substituir_atual = '--substituir' in sys.argv[1:]
+    if substituir_atual:
+        fd, destino = tempfile.mkstemp(suffix='.db', prefix='restauracao_')
+        os.close(fd)
+    elif '--destino' in sys.argv[1:]:
+        destino = sys.argv[sys.argv.index('--destino') + 1]
+    else:
+        destino = os.path.join(INSTANCE_DIR, 'backups', 'restaurados', f"{banco}_{snapshot['id']}.db")
+
+    try:
+        armazem_backups.restaurar(snapshot['id'], destino)
+        conn = sqlite3.connect(destino)
+        try:
+            verificacao = conn.execute('PRAGMA quick_check').fetchone()[0]
+        finally:
+            conn.close()
+        if verificacao != 'ok':
+            raise SnapshotInvalido(f'quick_check: {verificacao}')
+    except SnapshotInvalido as e:
+        print(f'ERRO: {e}')
+        sys.exit(1)
+
+    print(f"Snapshot {snapshot['id']} de {snapshot['criado_em'][:19]} restaurado e verificado.")
+    if not substituir_atual:
+        print(f'Arquivo: {destino}')
+        return
+
+    try:
+        atual = caminho_do_banco(banco) or os.path.join(INSTANCE_DIR, snapshot['arquivo'])
+        if os.path.exists(atual):
+            anterior = armazem_backups.salvar(banco, atual, etiqueta='antes_restauracao')
+            print(f"Estado atual guardado no snapshot {anterior['id']}.")
+        substituir(destino, atual)
+        print(f'Banco {atual} substituído.')
+    finally:
+        os.remove(destino)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Sincroniza o catálogo mestre de produtos com as unidades assinantes.
+
+Uso:
+    python scripts/sincronizar_catalogo.py                  # todas as assinantes atrasadas
+    python scripts/sincronizar_catalogo.py assinar <unit_id>
+    python scripts/sincronizar_catalogo.py publicar <unit_id>
+
+`publicar` leva para o catálogo os produtos da unidade ainda sem SKU global
+(ligando por nome aos itens já existentes). Pode ser agendado (cron) para
+propagar alterações feitas diretamente no banco central.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+
+from catalog_sync import (assinar, conectar_central, publicar_produtos_unidade,
+                          sincronizar_assinantes, sincronizar_unidade)
+from database_manager import db_manager
+
+
+def main():
+    acao = sys.argv[1] if len(sys.argv) > 1 else 'sincronizar'
+    if acao in ('assinar', 'publicar') and len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    central = conectar_central()
+    try:
+        if acao == 'assinar':
+            assinar(central, sys.argv[2])
+            resultados = {sys.argv[2]: sincronizar_unidade(central, sys.argv[2])}
+        elif acao == 'publicar':
+            unit_conn = db_manager.get_connection(sys.argv[2], use_cache=False)
+            try:
+                criados, ligados = publicar_produtos_unidade(central, unit_conn)
+            finally:
+                unit_conn.close()
+            print(f'{sys.argv[2]}: {criados} itens criados no catálogo, {ligados} produtos ligados')
+            resultados = sincronizar_assinantes(central)
+        elif acao == 'sincronizar':
+            resultados = sincronizar_assinantes(central)
+        else:
+            print(__doc__)
+            sys.exit(1)
+    except ValueError as e:
+        print(f'Erro: {e}')
+        sys.exit(1)
+    finally:
+        central.close()
+
+    if not resultados:
+        print('Nenhuma unidade pendente de sincronização.')
+    for unit_id, resultado in resultados.items():
+        if 'erro' in resultado:
+            print(f"{unit_id}: ERRO {resultado['erro']}")
+        else:
+            print(f"{unit_id}: {resultado['inseridos']} inseridos, {resultado['atualizados']} atualizados "
+                  f"(versão {resultado['versao']})")
+    print(f'Concluído em {time.perf_counter() - inicio:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+# Sessões no Servidor (opcional, SESSION_BACKEND=sqlite)
+# O cookie leva só um identificador aleatório assinado; os dados da sessão
+# ficam em instance/sessions.db (chave primária = id) com um LRU em memória
+# na frente, então a leitura de uma sessão é O(1) e, no caso comum, nem toca
+# o disco. Excluir a linha revoga a sessão na hora (logout, usuário excluído
+# ou com tipo alterado).
+#
+# Com vários processos, cada gravação/revogação entra em sessoes_eventos; um
+# processo só lê esse log quando o PRAGMA data_version indica que outra
+# conexão escreveu no banco, e então descarta do LRU as sessões alteradas.
+# Sessões vencidas são apagadas em lotes, no máximo uma vez por intervalo.
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+SESSIONS_DB = os.path.join(BASE_DIR, 'instance', 'sessions.db')
+
+# Sessões mantidas em memória por processo
+SESSOES_EM_CACHE = 10000
+# Intervalo (s) entre limpezas de sessões vencidas e linhas apagadas por lote
+INTERVALO_LIMPEZA = 300
+LOTE_LIMPEZA = 500
+# Eventos mais antigos que isso (s) são apagados do log
+RETENCAO_EVENTOS = 3600
+
+
+class SessaoServidor(CallbackDict, SessionMixin):
+    """Sessão cujo conteúdo fica no servidor"""
+
+    def __init__(self, dados=None, sid=None, novo=False):
+        def ao_alterar(self):
+            self.modified = True
+        super().__init__(dados, ao_alterar)
+        self.sid = sid
+        self.new = novo
+        self.modified = False
+        # Identificador anterior a ser revogado (ver regenerar)
+        self.sid_anterior = None
+
+    def regenerar(self):
+        """Troca o identificador (login/logout), revogando o anterior."""
+        if not self.new and self.sid_anterior is None:
+            self.sid_anterior = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+
+class ArmazenamentoSessoes(SessionInterface):
+    """SessionInterface do Flask sobre SQLite com LRU em memória"""
+
+    serializer = session_json_serializer
+
+    def __init__(self, caminho=SESSIONS_DB, capacidade=SESSOES_EM_CACHE):
+        self.caminho = caminho
+        self.capacidade = capacidade
+        self.origem = uuid.uuid4().hex
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # sid -> (expira, dados serializados)
+        self._cache = OrderedDict()
+        self._ultimo_evento = 0
+        self._proxima_limpeza = 0
+        conn = self._conexao()
+        self._ultimo_evento = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM sessoes_eventos').fetchone()[0]
+
+    # ── Banco ──────────────────────────────────────────────────────────────
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+            conn = sqlite3.connect(self.caminho, timeout=30.0, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS sessoes (
+                    id TEXT PRIMARY KEY,
+                    usuario_id INTEGER,
+                    dados BLOB NOT NULL,
+                    expira REAL NOT NULL
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_sessoes_expira ON sessoes(expira);
+                CREATE INDEX IF NOT EXISTS idx_sessoes_usuario ON sessoes(usuario_id);
+                CREATE TABLE IF NOT EXISTS sessoes_eventos (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sessao_id TEXT NOT NULL,
+                    origem TEXT NOT NULL,
+                    momento REAL NOT NULL
+                );
+            ''')
+            self._local.conn = conn
+            # Força a leitura do log no primeiro uso desta conexão
+            self._local.data_version = None
+        return conn
+
+    def _sincronizar(self, conn):
+        """Descarta do LRU as sessões alteradas por outros processos."""
+        versao = conn.execute('PRAGMA data_version').fetchone()[0]
+        if versao == self._local.data_version:
+            return
+        self._local.data_version = versao
+        with self._lock:
+            eventos = conn.execute(
+                'SELECT seq, sessao_id, origem FROM sessoes_eventos WHERE seq > ? ORDER BY seq',
+                (self._ultimo_evento,)
+            ).fetchall()
+            if not eventos:
+                return
+            if eventos[0][0] > self._ultimo_evento + 1 and self._ultimo_evento:
+                # Parte do log já foi apagada: não dá para saber o que mudou
+                self._cache.clear()
+            for _, sid, origem in eventos:
+                if origem != self.origem:
+                    self._cache.pop(sid, None)
+            self._ultimo_evento = eventos[-1][0]
+
+    def _registrar_eventos(self, conn, sids):
+        agora = time.time()
+        conn.executemany(
+            'INSERT INTO sessoes_eventos (sessao_id, origem, momento) VALUES (?, ?, ?)',
+            [(sid, self.origem, agora) for sid in sids]
+        )
+
+    def _guardar_em_cache(self, sid, expira, dados):
+        with self._lock:
+            self._cache[sid] = (expira, dados)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.capacidade:
+                self._cache.popitem(last=False)
+
+    def _carregar(self, sid):
+        conn = self._conexao()
+        self._sincronizar(conn)
+        agora = time.time()
+        with self._lock:
+            em_cache = self._cache.get(sid)
+            if em_cache is not None:
+                self._cache.move_to_end(sid)
+        if em_cache is not None and em_cache[0] > agora:
+            return em_cache
+
+        # Ausente ou vencida no cache (a validade pode ter sido renovada por
+        # outro processo): vale o que estiver no banco
+        linha = conn.execute('SELECT expira, dados FROM sessoes WHERE id = ?', (sid,)).fetchone()
+        if linha is None or linha[0] <= agora:
+            with self._lock:
+                self._cache.pop(sid, None)
+            return None
+        self._guardar_em_cache(sid, linha[0], linha[1])
+        return linha
+
+    def limpar_vencidas(self, forcar=False):
+        """Apaga sessões vencidas em lotes. Retorna quantas foram apagadas."""
+        agora = time.time()
+        if not forcar and agora < self._proxima_limpeza:
+            return 0
+        self._proxima_limpeza = agora + INTERVALO_LIMPEZA
+        conn = self._conexao()
+        total = 0
+        while True:
+            with conn:
+                cursor = conn.execute('''
+                    DELETE FROM sessoes WHERE id IN (
+                        SELECT id FROM sessoes WHERE expira <= ? LIMIT ?
+                    )
+                ''', (agora, LOTE_LIMPEZA))
+            total += cursor.rowcount
+            if cursor.rowcount < LOTE_LIMPEZA:
+                break
+        with conn:
+            conn.execute('DELETE FROM sessoes_eventos WHERE momento < ?', (agora - RETENCAO_EVENTOS,))
+        return total
+
+    # ── Revogação ──────────────────────────────────────────────────────────
+    def revogar(self, sids):
+        """Apaga as sessões informadas (valem na próxima requisição)."""
+        sids = [s for s in sids if s]
+        if not sids:
+            return
+        conn = self._conexao()
+        with conn:
+            conn.executemany('DELETE FROM sessoes WHERE id = ?', [(s,) for s in sids])
+            self._registrar_eventos(conn, sids)
+        with self._lock:
+            for sid in sids:
+                self._cache.pop(sid, None)
+
+    def revogar_usuario(self, usuario_id):
+        """Encerra todas as sessões do usuário. Retorna quantas eram."""
+        conn = self._conexao()
+        sids = [r[0] for r in conn.execute('SELECT id FROM sessoes WHERE usuario_id = ?', (usuario_id,))]
+        self.revogar(sids)
+        return len(sids)
+
+    # ── SessionInterface ───────────────────────────────────────────────────
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='sessao-servidor', key_derivation='hmac')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                linha = self._carregar(sid)
+                if linha is not None:
+                    try:
+                        return SessaoServidor(self.serializer.loads(linha[1]), sid=sid)
+                    except ValueError:
+                        pass
+        return SessaoServidor(sid=secrets.token_urlsafe(32), novo=True)
+
+    def save_session(self, app, session, response):
+        nome = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        caminho = self.get_cookie_path(app)
+
+        if session.sid_anterior:
+            self.revogar([session.sid_anterior])
+            session.sid_anterior = None
+
+        if not session:
+            if not session.new:
+                self.revogar([session.sid])
+            if session.modified or not session.new:
+                response.delete_cookie(nome, domain=dominio, path=caminho,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        agora = time.time()
+        duracao = app.permanent_session_lifetime.total_seconds()
+        expira = agora + duracao
+        conn = self._conexao()
+
+        if session.modified or session.new:
+            dados = self.serializer.dumps(dict(session))
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO sessoes (id, usuario_id, dados, expira) VALUES (?, ?, ?, ?)',
+                             (session.sid, session.get('user_id'), dados, expira))
+                self._registrar_eventos(conn, [session.sid])
+            self._guardar_em_cache(session.sid, expira, dados)
+        else:
+            # Sem alteração: só renova a validade depois de meia duração, para
+            # não gravar a cada requisição
+            em_cache = self._cache.get(session.sid)
+            if em_cache is None or em_cache[0] - agora > duracao / 2:
+                return
+            with conn:
+                conn.execute('UPDATE sessoes SET expira = ? WHERE id = ?', (expira, session.sid))
+            self._guardar_em_cache(session.sid, expira, em_cache[1])
+
+        self.limpar_vencidas()
+        response.set_cookie(
+            nome, self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app), domain=dominio, path=caminho,
+            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+        )
+
+
+def regenerar_sessao(session):
+    """Troca o id da sessão no servidor; no cookie assinado não faz nada."""
+    if isinstance(session, SessaoServidor):
+        session.regenerar()
+
+
+def revogar_sessoes_usuario(app, usuario_id):
+    """Encerra as sessões do usuário quando o backend for o do servidor."""
+    if isinstance(app.session_interface, ArmazenamentoSessoes):
+        return app.session_interface.revogar_usuario(usuario_id)
+    return 0
@@ -0,0 +1,110 @@
+// Autocomplete de produtos para os formulários de movimentação
+// Uso: <input data-autocomplete-produto data-url="..." data-alvo="produto_id">
+// O <select> alvo (oculto) recebe uma única <option> com data-quantidade para
+// o produto escolhido e dispara 'change', mantendo os scripts da página.
+(function () {
+    var MIN_CARACTERES = 2;
+    var ATRASO_MS = 250;
+    var MENSAGEM = 'Selecione um produto da lista';
+
+    document.querySelectorAll('[data-autocomplete-produto]').forEach(function (input) {
+        var select = document.getElementById(input.dataset.alvo);
+        var url = input.dataset.url;
+        var bloquearSemEstoque = input.hasAttribute('data-bloquear-sem-estoque');
+        var timer = null;
+        var controller = null;
+
+        var lista = document.createElement('div');
+        lista.className = 'list-group position-absolute w-100 shadow-sm';
+        lista.style.zIndex = 1050;
+        lista.style.maxHeight = '320px';
+        lista.style.overflowY = 'auto';
+        input.parentNode.style.position = 'relative';
+        input.parentNode.appendChild(lista);
+        input.setCustomValidity(MENSAGEM);
+
+        function limparSelecao() {
+            select.innerHTML = '<option value=""></option>';
+            select.value = '';
+            input.setCustomValidity(MENSAGEM);
+            select.dispatchEvent(new Event('change'));
+        }
+
+        function escolher(produto) {
+            var texto = produto.nome + ' (Estoque: ' + produto.quantidade + ')';
+            var option = new Option(texto, produto.id, true, true);
+            option.dataset.quantidade = produto.quantidade;
+            select.innerHTML = '';
+            select.appendChild(option);
+            input.value = produto.nome;
+            input.setCustomValidity('');
+            lista.innerHTML = '';
+            select.dispatchEvent(new Event('change'));
+        }
+
+        function renderizar(resposta) {
+            lista.innerHTML = '';
+            var colunas = resposta.colunas;
+            if (!resposta.dados.length) {
+                var vazio = document.createElement('div');
+                vazio.className = 'list-group-item text-muted small';
+                vazio.textContent = 'Nenhum produto encontrado';
+                lista.appendChild(vazio);
+                return;
+            }
+            resposta.dados.forEach(function (linha) {
+                var produto = {};
+                colunas.forEach(function (coluna, i) { produto[coluna] = linha[i]; });
+
+                var item = document.createElement('button');
+                item.type = 'button';
+                item.className = 'list-group-item list-group-item-action d-flex justify-content-between';
+                item.textContent = produto.nome;
+                var badge = document.createElement('span');
+                badge.className = 'badge ' + (produto.quantidade === 0 ? 'bg-danger' : 'bg-secondary');
+                badge.textContent = produto.quantidade + ' ' + (produto.unidade_medida || 'un');
+                item.appendChild(badge);
+
+                if (bloquearSemEstoque && produto.quantidade === 0) {
+                    item.disabled = true;
+                } else {
+                    item.addEventListener('click', function () { escolher(produto); });
+                }
+                lista.appendChild(item);
+            });
+        }
+
+        function buscar(termo) {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            fetch(url + '?q=' + encodeURIComponent(termo), {
+                signal: controller.signal,
+                headers: { 'Accept': 'application/json' }
+            })
+                .then(function (r) { return r.json(); })
+                .then(renderizar)
+                .catch(function () {});
+        }
+
+        input.addEventListener('input', function () {
+            if (select.value) {
+                limparSelecao();
+            }
+            clearTimeout(timer);
+            var termo = input.value.trim();
+            if (termo.length < MIN_CARACTERES) {
+                lista.innerHTML = '';
+                return;
+            }
+            timer = setTimeout(function () { buscar(termo); }, ATRASO_MS);
+        });
+
+        document.addEventListener('click', function (e) {
+            if (!input.parentNode.contains(e.target)) {
+                lista.innerHTML = '';
+            }
+        });
+    });
+})();
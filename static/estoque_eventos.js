@@ -0,0 +1,49 @@
+// Atualização em tempo real do estoque (Server-Sent Events)
+// Elementos com data-estoque-quantidade="<produto_id>" recebem a nova quantidade;
+// elementos com data-contador-movimentacao="entrada|saida" somam o delta do
+// evento (-1 quando a movimentação foi excluída).
+(function () {
+    if (!window.EventSource) {
+        return;
+    }
+    var script = document.currentScript;
+    var url = script && script.dataset.url;
+    if (!url) {
+        return;
+    }
+
+    // Espera (ms) antes de reabrir o feed recusado pelo servidor (503: limite de assinantes)
+    var ESPERA_REABRIR = 30000;
+
+    function atualizar(e) {
+        var evento;
+        try {
+            evento = JSON.parse(e.data);
+        } catch (err) {
+            return;
+        }
+
+        document.querySelectorAll('[data-estoque-quantidade="' + evento.p + '"]').forEach(function (el) {
+            el.textContent = evento.q;
+        });
+
+        document.querySelectorAll('[data-contador-movimentacao="' + evento.t + '"]').forEach(function (el) {
+            el.textContent = (parseInt(el.textContent, 10) || 0) + (evento.d || 1);
+        });
+
+        document.dispatchEvent(new CustomEvent('estoque:evento', { detail: evento }));
+    }
+
+    function abrir() {
+        var fonte = new EventSource(url);
+        fonte.addEventListener('estoque', atualizar);
+        fonte.addEventListener('error', function () {
+            // Erros de rede reconectam sozinhos; uma resposta de erro fecha o EventSource
+            if (fonte.readyState === EventSource.CLOSED) {
+                setTimeout(abrir, ESPERA_REABRIR);
+            }
+        });
+    }
+
+    abrir();
+})();
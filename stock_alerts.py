@@ -0,0 +1,89 @@
+# Alertas de Estoque Baixo por Cruzamento de Limite
+# A cada movimentação, a quantidade antes e depois do UPDATE (na mesma
+# transação) é comparada com o estoque mínimo do produto: só o movimento que
+# cruza o limite (ou zera o estoque) gera alerta, sem reler a tabela de
+# produtos. Depois do commit o alerta vai para o serviço de notificações,
+# com chave de deduplicação ligada ao movimento que causou o cruzamento.
+import threading
+import time
+from collections import namedtuple
+
+from database_manager import db_manager
+from notifications import servico_notificacoes
+
+# Segundos que a lista de destinatários de uma unidade fica em memória
+DESTINATARIOS_TTL = 60
+
+Alerta = namedtuple('Alerta', 'tipo produto_id nome quantidade minimo origem')
+
+
+def verificar(produto_id, nome, antes, depois, minimo, origem):
+    """Retorna o Alerta do cruzamento ou None.
+
+    `origem` identifica o evento que alterou o saldo (ex.: 'mov:123') e entra
+    na chave de deduplicação.
+    """
+    if depois <= 0 < antes:
+        return Alerta('zerado', produto_id, nome, depois, minimo, origem)
+    if minimo is not None and depois <= minimo < antes:
+        return Alerta('baixo', produto_id, nome, depois, minimo, origem)
+    return None
+
+
+class AlertasEstoque:
+    """Envio dos alertas aos usuários com acesso à unidade"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._destinatarios = {}
+
+    def destinatarios(self, unit_id):
+        """IDs dos usuários ativos com acesso à unidade (admins incluídos)."""
+        agora = time.monotonic()
+        with self._lock:
+            em_cache = self._destinatarios.get(unit_id)
+            if em_cache and agora - em_cache[0] < DESTINATARIOS_TTL:
+                return em_cache[1]
+
+        central = db_manager.get_connection(None, use_cache=False)
+        try:
+            ids = {r[0] for r in central.execute('''
+                SELECT id FROM usuarios WHERE ativo = 1 AND tipo = 'admin'
+                UNION
+                SELECT u.id FROM usuario_unidade uu JOIN usuarios u ON u.id = uu.usuario_id
+                WHERE uu.unidade_id = ? AND u.ativo = 1
+            ''', (unit_id,))}
+        finally:
+            central.close()
+
+        with self._lock:
+            self._destinatarios[unit_id] = (agora, ids)
+        return ids
+
+    def limpar_cache(self, unit_id=None):
+        with self._lock:
+            if unit_id is None:
+                self._destinatarios.clear()
+            else:
+                self._destinatarios.pop(unit_id, None)
+
+    def emitir(self, unit_id, unit_nome, alertas, link=None):
+        """Enfileira os alertas (chamar depois do commit da movimentação)."""
+        alertas = [a for a in alertas if a is not None]
+        if not alertas:
+            return
+        destinatarios = self.destinatarios(unit_id)
+        for alerta in alertas:
+            if alerta.tipo == 'zerado':
+                mensagem = f'[{unit_nome}] Estoque zerado: {alerta.nome}'
+            else:
+                mensagem = (f'[{unit_nome}] Estoque baixo: {alerta.nome} '
+                            f'({alerta.quantidade} de mínimo {alerta.minimo})')
+            servico_notificacoes.enviar(
+                destinatarios, mensagem, link=link,
+                chave=f'estoque:{unit_id}:{alerta.produto_id}:{alerta.tipo}:{alerta.origem}'
+            )
+
+
+# Instância global
+alertas_estoque = AlertasEstoque()
@@ -0,0 +1,123 @@
+# Eventos de Estoque em Tempo Real (Server-Sent Events)
+# Cada alteração de estoque grava uma linha em `eventos_estoque` na mesma
+# transação da movimentação. Assinantes do mesmo processo são acordados na
+# hora (threading.Condition); os de outros workers percebem o evento na
+# próxima leitura periódica da tabela, que é local ao banco da unidade.
+import json
+import threading
+import time
+
+# Intervalo máximo (s) entre leituras da tabela quando nada é notificado
+POLL_INTERVALO = 2.0
+# Comentário SSE enviado periodicamente para manter a conexão aberta
+HEARTBEAT_INTERVALO = 15.0
+# Duração máxima de uma conexão; o EventSource reconecta com Last-Event-ID
+DURACAO_MAXIMA = 300.0
+# Assinantes simultâneos por processo (cada um ocupa uma thread e uma conexão
+# SQLite); acima disso a rota responde 503 e o cliente tenta de novo depois
+ASSINANTES_MAXIMOS = 50
+RETRY_LOTADO = 30000
+# Eventos mantidos na tabela (os mais antigos são removidos periodicamente)
+EVENTOS_RETIDOS = 10000
+LOTE_EVENTOS = 200
+
+
+class StockEventBus:
+    """Pub/sub em processo dos eventos de estoque por unidade"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._condicoes = {}
+        # Contador de notificações por unidade: evita perder um aviso que
+        # chegue entre a leitura da tabela e o wait()
+        self._sequencias = {}
+        self._assinantes = 0
+
+    def reservar(self):
+        """Ocupa uma vaga de assinante. Retorna False se o processo estiver no limite."""
+        with self._lock:
+            if self._assinantes >= ASSINANTES_MAXIMOS:
+                return False
+            self._assinantes += 1
+            return True
+
+    def liberar(self):
+        with self._lock:
+            self._assinantes -= 1
+
+    def _condicao(self, unit_id):
+        with self._lock:
+            if unit_id not in self._condicoes:
+                self._condicoes[unit_id] = threading.Condition()
+            return self._condicoes[unit_id]
+
+    def registrar(self, conn, produto_id, tipo):
+        """Grava o evento com a quantidade atual do produto (sem commit).
+
+        Deve ser chamado depois do UPDATE em produtos e antes do commit, para
+        que evento e movimentação sejam confirmados juntos. A exclusão de uma
+        movimentação usa o tipo 'exclusao_<tipo original>'.
+        """
+        cursor = conn.execute('''
+            INSERT INTO eventos_estoque (produto_id, quantidade, tipo)
+            SELECT id, quantidade, ? FROM produtos WHERE id = ?
+        ''', (tipo, produto_id))
+        evento_id = cursor.lastrowid
+        if evento_id and evento_id % 1000 == 0:
+            conn.execute('DELETE FROM eventos_estoque WHERE id <= ?', (evento_id - EVENTOS_RETIDOS,))
+        return evento_id
+
+    def notificar(self, unit_id):
+        """Acorda os assinantes locais da unidade (chamar após o commit)."""
+        condicao = self._condicao(unit_id)
+        with condicao:
+            self._sequencias[unit_id] = self._sequencias.get(unit_id, 0) + 1
+            condicao.notify_all()
+
+    def ultimo_id(self, conn):
+        row = conn.execute('SELECT MAX(id) FROM eventos_estoque').fetchone()
+        return row[0] or 0
+
+    def escutar(self, unit_id, conn, ultimo_id):
+        """Gerador de mensagens SSE a partir do evento `ultimo_id` (exclusive).
+
+        `conn` é uma conexão exclusiva do assinante e é fechada ao final.
+        """
+        condicao = self._condicao(unit_id)
+        inicio = ultimo_envio = time.monotonic()
+        try:
+            yield 'retry: 3000\n\n'
+            while time.monotonic() - inicio < DURACAO_MAXIMA:
+                sequencia = self._sequencias.get(unit_id, 0)
+                eventos = conn.execute('''
+                    SELECT id, produto_id, quantidade, tipo FROM eventos_estoque
+                    WHERE id > ? ORDER BY id LIMIT ?
+                ''', (ultimo_id, LOTE_EVENTOS)).fetchall()
+
+                if eventos:
+                    partes = []
+                    for evento in eventos:
+                        # Exclusão: tipo original com delta -1 (contadores da página)
+                        tipo = evento['tipo']
+                        delta = -1 if tipo.startswith('exclusao_') else 1
+                        dados = json.dumps({'p': evento['produto_id'], 'q': evento['quantidade'],
+                                            't': tipo[len('exclusao_'):] if delta < 0 else tipo, 'd': delta},
+                                           separators=(',', ':'))
+                        partes.append(f"id: {evento['id']}\nevent: estoque\ndata: {dados}\n\n")
+                    ultimo_id = eventos[-1]['id']
+                    ultimo_envio = time.monotonic()
+                    yield ''.join(partes)
+                    if len(eventos) == LOTE_EVENTOS:
+                        continue
+                elif time.monotonic() - ultimo_envio >= HEARTBEAT_INTERVALO:
+                    ultimo_envio = time.monotonic()
+                    yield ': ping\n\n'
+
+                with condicao:
+                    condicao.wait_for(lambda: self._sequencias.get(unit_id, 0) != sequencia, POLL_INTERVALO)
+        finally:
+            conn.close()
+
+
+# Instância global do barramento
+event_bus = StockEventBus()
@@ -0,0 +1,143 @@
+# Banco Modelo das Unidades
+# Uma unidade nova nasce da cópia de um arquivo modelo em instance/modelos,
+# em vez de rodar o DDL e as migrações a cada criação: o modelo já tem as
+# tabelas de _criar_tabelas_unidade migradas até SCHEMA_VERSAO_UNIDADE e,
+# opcionalmente, setores/produtos/fornecedores da pasta de sementes
+# (<entidade>.csv ou .xlsx, importados com catalog_importer).
+#
+# O nome do modelo leva a versão do schema e o hash das sementes
+# (unidade_v9.db, unidade_v9_1a2b3c4d.db); se qualquer um mudar, o modelo é
+# reconstruído no próximo uso e as versões antigas são apagadas. Toda
+# unidade criada a partir da mesma versão tem schema idêntico, e a versão de
+# origem fica na configuração `modelo_unidade` da unidade.
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+
+from catalog_importer import ENTIDADES, importar_arquivo
+from database_manager import SCHEMA_VERSAO_UNIDADE, db_manager
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+MODELOS_DIR = os.path.join(BASE_DIR, 'instance', 'modelos')
+# Sementes padrão (sobrescrito por UNIDADE_SEMENTES_DIR)
+SEMENTES_DIR = os.path.join(MODELOS_DIR, 'sementes')
+EXTENSOES_SEMENTE = ('.csv', '.xlsx')
+
+
+def arquivos_semente(sementes_dir):
+    """[(entidade, caminho)] das sementes existentes, em ordem de importação."""
+    arquivos = []
+    if not sementes_dir or not os.path.isdir(sementes_dir):
+        return arquivos
+    for entidade in ('setores', 'fornecedores', 'produtos'):
+        for extensao in EXTENSOES_SEMENTE:
+            caminho = os.path.join(sementes_dir, entidade + extensao)
+            if entidade in ENTIDADES and os.path.isfile(caminho):
+                arquivos.append((entidade, caminho))
+                break
+    return arquivos
+
+
+class ModeloUnidade:
+    """Banco modelo versionado e criação de unidades por cópia"""
+
+    def __init__(self, diretorio=MODELOS_DIR, sementes_dir=None):
+        self.diretorio = diretorio
+        self._sementes_dir = sementes_dir
+
+    @property
+    def sementes_dir(self):
+        # Lido a cada uso: o .env pode ser carregado depois do import
+        return self._sementes_dir or os.getenv('UNIDADE_SEMENTES_DIR') or SEMENTES_DIR
+
+    def versao(self):
+        """v<schema> mais o hash das sementes, quando houver."""
+        sementes = arquivos_semente(self.sementes_dir)
+        if not sementes:
+            return f'v{SCHEMA_VERSAO_UNIDADE}'
+        resumo = hashlib.sha256()
+        for entidade, caminho in sementes:
+            resumo.update(os.path.basename(caminho).encode())
+            with open(caminho, 'rb') as arquivo:
+                resumo.update(hashlib.sha256(arquivo.read()).digest())
+        return f'v{SCHEMA_VERSAO_UNIDADE}_{resumo.hexdigest()[:8]}'
+
+    def caminho(self, versao=None):
+        return os.path.join(self.diretorio, f'unidade_{versao or self.versao()}.db')
+
+    def construir(self, forcar=False):
+        """Gera o modelo da versão atual (se ainda não existir). Retorna o caminho."""
+        versao = self.versao()
+        destino = self.caminho(versao)
+        if os.path.exists(destino) and not forcar:
+            return destino
+
+        os.makedirs(self.diretorio, exist_ok=True)
+        temporario = f'{destino}.{os.getpid()}.tmp'
+        conn = sqlite3.connect(temporario)
+        try:
+            conn.row_factory = sqlite3.Row
+            db_manager._criar_tabelas_unidade(conn.cursor())
+            conn.commit()
+            db_manager.upgrade_unit_schema(conn)
+            for entidade, caminho in arquivos_semente(self.sementes_dir):
+                with open(caminho, 'rb') as arquivo:
+                    resultado = importar_arquivo(conn, entidade, arquivo, caminho)
+                logger.info('Modelo %s: %s %s', versao, entidade, resultado)
+            conn.execute('''
+                INSERT OR REPLACE INTO configuracoes (chave, valor, descricao)
+                VALUES ('modelo_unidade', ?, 'Versão do banco modelo que originou a unidade')
+            ''', (versao,))
+            conn.commit()
+            conn.execute('VACUUM')
+            conn.execute('PRAGMA journal_mode=DELETE')
+        except Exception:
+            conn.close()
+            os.remove(temporario)
+            raise
+        conn.close()
+        os.replace(temporario, destino)
+
+        # Modelos de versões anteriores não são mais usados
+        for nome in os.listdir(self.diretorio):
+            if nome.startswith('unidade_') and nome.endswith('.db') and os.path.join(self.diretorio, nome) != destino:
+                os.remove(os.path.join(self.diretorio, nome))
+        return destino
+
+    def criar_banco(self, destino):
+        """Cria o arquivo da unidade copiando o modelo. Retorna False (sem
+        tocar no arquivo) se ele já existir."""
+        if os.path.exists(destino):
+            return False
+        modelo = self.construir()
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporario = f'{destino}.{os.getpid()}.tmp'
+        shutil.copyfile(modelo, temporario)
+        try:
+            # link + unlink: não sobrescreve um arquivo criado nesse meio-tempo
+            os.link(temporario, destino)
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(temporario)
+        return True
+
+    def provisionar(self, unit_id):
+        """Banco pronto para a unidade: cópia do modelo para arquivo novo ou,
+        se o arquivo já existir (unidade recriada), init_database nele."""
+        from database_config import get_database_path
+        destino = get_database_path(unit_id)
+        if not destino:
+            raise ValueError(f'Banco de dados não encontrado para unidade: {unit_id}')
+        if self.criar_banco(destino):
+            return True
+        db_manager.init_database(unit_id)
+        return False
+
+
+# Instância global do modelo
+modelo_unidade = ModeloUnidade()